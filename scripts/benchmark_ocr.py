@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+benchmark_ocr.py
+Compares serial and process-pool OCR wall-clock time on one or more PDFs.
+The extraction cache is disabled so every run performs full rasterization and OCR.
+
+Usage:
+    python scripts/benchmark_ocr.py "Title Packet.pdf" --workers 8
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src import config_loader, ocr_service
+
+
+def time_ocr(pdf_path: Path, config: dict):
+    start = time.perf_counter()
+    text = ocr_service.extract_text_from_pdf_pages(pdf_path, config)
+    return time.perf_counter() - start, text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark serial vs. parallel OCR of PDF pages.")
+    parser.add_argument("pdfs", nargs="+", help="PDF files to OCR.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes for the parallel run.")
+    args = parser.parse_args()
+
+    base_config = dict(config_loader.load_config() or {})
+    base_config["extraction_cache_enabled"] = False
+
+    results = []
+    for pdf_name in args.pdfs:
+        pdf_path = Path(pdf_name)
+        serial_seconds, serial_text = time_ocr(pdf_path, {**base_config, "ocr_workers": 1})
+        parallel_seconds, parallel_text = time_ocr(pdf_path, {**base_config, "ocr_workers": args.workers})
+        results.append((pdf_path.name, serial_seconds, parallel_seconds, serial_text == parallel_text))
+
+    print("\n--- OCR Benchmark ---")
+    print(f"{'File':<40} {'Serial (s)':>10} {'Parallel (s)':>12} {'Speedup':>8} {'Same text':>9}")
+    for name, serial_seconds, parallel_seconds, same_text in results:
+        speedup = serial_seconds / parallel_seconds if parallel_seconds else 0.0
+        print(f"{name[:40]:<40} {serial_seconds:>10.1f} {parallel_seconds:>12.1f} {speedup:>7.1f}x {str(same_text):>9}")
+    print(f"Parallel runs used {args.workers} worker processes.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+benchmark_pdf_backends.py
+Compares the installed PDF text-extraction backends (see src/pdf_backends.py) on the same PDFs:
+pages per second, characters per page and the share of pages with usable text (text yield).
+With --workers N, each backend is also timed with page-parallel extraction.
+
+The results are saved to pdf_backend_results (.pdf_backend_benchmark.json by default), where
+`"pdf_backend": "auto"` reads them to pick the fastest backend. The extraction cache is not used.
+
+Usage:
+    python scripts/benchmark_pdf_backends.py "/deals/Smith Farm" --runs 3 --workers 4
+    python scripts/benchmark_pdf_backends.py --deals 2 --pages 40
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(REPO_ROOT / "scripts"))
+
+from make_synthetic_deals import add_size_arguments, make_deals, sizes_from_args
+from src import config_loader, pdf_backends
+from src.pdf_handler import MIN_TEXT_LENGTH_THRESHOLD
+
+
+def collect_pdfs(paths: List[str]) -> List[Path]:
+    pdfs: List[Path] = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            pdfs.extend(sorted(p for p in path.rglob("*") if p.suffix.lower() == ".pdf"))
+        elif path.suffix.lower() == ".pdf":
+            pdfs.append(path)
+    return pdfs
+
+
+def run_backend(backend: pdf_backends.PdfBackend, pdfs: List[Path], workers: int, runs: int) -> Dict:
+    """Extracts every PDF `runs` times; returns the median timing and the text yield of the last run."""
+    timings, pages, characters, text_pages, failed = [], 0, 0, 0, 0
+    for _ in range(max(1, runs)):
+        pages = characters = text_pages = failed = 0
+        start = time.perf_counter()
+        for pdf_path in pdfs:
+            try:
+                page_texts = pdf_backends.extract_pdf_pages(pdf_path, backend, workers)
+            except Exception as e:
+                print(f"  {backend.label} failed on {pdf_path.name}: {e}")
+                failed += 1
+                continue
+            pages += len(page_texts)
+            characters += sum(len(text.strip()) for text in page_texts)
+            text_pages += sum(1 for text in page_texts if len(text.strip()) > MIN_TEXT_LENGTH_THRESHOLD)
+        timings.append(time.perf_counter() - start)
+    seconds = statistics.median(timings)
+    return {
+        "seconds": round(seconds, 3),
+        "pages": pages,
+        "pages_per_second": round(pages / seconds, 1) if seconds else 0.0,
+        "chars_per_page": round(characters / pages, 1) if pages else 0.0,
+        "text_page_share": round(text_pages / pages, 3) if pages else 0.0,
+        "failed_files": failed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the installed PDF text-extraction backends.")
+    parser.add_argument("paths", nargs="*", help="PDF files or folders (default: synthetic deal folders).")
+    parser.add_argument("--deals", type=int, default=2, help="Synthetic deals to generate when no paths are given.")
+    add_size_arguments(parser)
+    parser.add_argument("--runs", type=int, default=3, help="Timed runs per backend (the median is reported).")
+    parser.add_argument("--workers", type=int, default=1, help="Also time page-parallel extraction with this many processes.")
+    parser.add_argument("--no-save", action="store_true", help="Do not save the results used by pdf_backend 'auto'.")
+    parser.set_defaults(pages=40, photos=0)
+    args = parser.parse_args()
+
+    os.chdir(REPO_ROOT)
+    config = config_loader.load_config() or {}
+    workdir = None
+    pdfs = collect_pdfs(args.paths)
+    if not args.paths:
+        workdir = Path(tempfile.mkdtemp(prefix="pdf_backend_bench_"))
+        pdfs = collect_pdfs([str(folder) for folder in make_deals(workdir, args.deals, sizes_from_args(args), args.seed)])
+    if not pdfs:
+        print("No PDFs found.")
+        sys.exit(1)
+
+    installed = pdf_backends.available_backends()
+    missing = [name for name in pdf_backends.BACKENDS if name not in installed]
+    results: Dict[str, Dict] = {}
+    parallel: Dict[str, Dict] = {}
+    for name in installed:
+        backend = pdf_backends.BACKENDS[name]()
+        print(f"Benchmarking {backend.label} on {len(pdfs)} PDFs...")
+        results[name] = run_backend(backend, pdfs, 1, args.runs)
+        if args.workers > 1:
+            parallel[name] = run_backend(backend, pdfs, args.workers, args.runs)
+
+    print("\n--- PDF Backend Benchmark ---")
+    print(f"{len(pdfs)} PDFs, {max(r['pages'] for r in results.values())} pages, median of {args.runs} runs")
+    print(f"{'Backend':<12} {'Pages/s':>9} {'Chars/page':>11} {'Text pages':>11} {'Failed':>7}" + (f" {'Parallel p/s':>13}" if parallel else ""))
+    for name, result in results.items():
+        row = (f"{pdf_backends.BACKENDS[name].label:<12} {result['pages_per_second']:>9.1f} {result['chars_per_page']:>11.0f} "
+               f"{result['text_page_share']:>10.0%} {result['failed_files']:>7}")
+        if parallel:
+            row += f" {parallel[name]['pages_per_second']:>13.1f}"
+        print(row)
+    if parallel:
+        print(f"(Parallel: {args.workers} worker processes; PDFs under {pdf_backends.PARALLEL_MIN_PAGES * 2} pages are extracted serially.)")
+    if missing:
+        print(f"Not installed: {', '.join(f'{name} (pip install {pdf_backends.BACKENDS[name].package})' for name in missing)}")
+    print(f"'auto' picks: {pdf_backends.choose_fastest(results, installed)}")
+    if not args.no_save:
+        path = pdf_backends.save_benchmark_results(
+            results, config, date=datetime.now().isoformat(timespec="seconds"), pdfs=len(pdfs), runs=args.runs
+        )
+        print(f"Saved results to {path}")
+    print("-----------------------------")
+
+    if workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
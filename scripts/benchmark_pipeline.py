@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+benchmark_pipeline.py
+End-to-end benchmark: generates synthetic deal folders, starts the local OpenAI stub and runs
+the proposal workflow (process_folder, variable extraction, render) plus photo description
+for every deal. Reports per-stage latency percentiles from the telemetry spans, throughput and
+peak memory, and checks them against a thresholds file so CI can fail on regressions.
+
+Usage:
+    python scripts/benchmark_pipeline.py --deals 5 --latency-ms 300
+    python scripts/benchmark_pipeline.py --deals 2 --pages 2 --photos 3 --output bench.json
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(REPO_ROOT / "scripts"))
+BENCHMARK_API_KEY = "benchmark-stub-key"
+# Every client (including the CRS parser's, which reads the environment at import) talks to the stub
+os.environ["OPENAI_API_KEY"] = BENCHMARK_API_KEY
+
+from make_synthetic_deals import add_size_arguments, make_deal, sizes_from_args
+from openai_stub_server import start_stub_server
+from src import config_loader, llm_service, proposal_pipeline, telemetry
+from src.proposal_pipeline import TEMPLATE_FILENAMES
+
+DEFAULT_THRESHOLDS_PATH = REPO_ROOT / "scripts" / "benchmark_thresholds.json"
+PERCENTILES = (50, 90, 99)
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png")
+# Keep the benchmark measuring the work itself, not cache hits from a previous run
+BENCHMARK_CONFIG = {
+    "llm_cache_enabled": False,
+    "extraction_cache_enabled": False,
+    "folder_manifest_enabled": False,
+    "stream_responses": False,
+}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Linear-interpolated percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def peak_rss_mb() -> Dict[str, float]:
+    """Peak resident memory of this process and of its (OCR) worker processes, in MB."""
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024 # ru_maxrss is bytes on macOS, KB on Linux
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / divisor, 1),
+    }
+
+
+def stage_latencies(spans: List[Dict]) -> Dict[str, Dict]:
+    durations: Dict[str, List[float]] = {}
+    for r in spans:
+        durations.setdefault(r["name"], []).append(r["duration_seconds"])
+    return {
+        name: {"count": len(values), **{f"p{pct}": round(percentile(values, pct), 4) for pct in PERCENTILES}}
+        for name, values in sorted(durations.items())
+    }
+
+
+def run_deal(llm, config: Dict, folder: Path, template_filename: str, weeks: int) -> Dict:
+    """Runs one deal through the pipeline. Never raises; failures are reported in the result."""
+    with telemetry.span("deal", folder=folder.name):
+        try:
+            result = proposal_pipeline.build_proposal(llm, config, folder, template_filename, weeks)
+            image_paths = sorted(p for p in folder.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+            if image_paths:
+                with telemetry.span("photo_description", images=len(image_paths)):
+                    llm.generate_description_from_photos(image_paths, folder)
+            return {"folder": folder.name, "status": "ok", "file_errors": len(result["error_summary"])}
+        except Exception as e:
+            print(f"Error: Deal {folder.name} failed: {e}")
+            return {"folder": folder.name, "status": "error", "error": str(e)}
+
+
+def check_thresholds(report: Dict, thresholds: Dict) -> List[str]:
+    """Returns a description of every threshold the report violates."""
+    violations = []
+    for stage, limit in thresholds.get("max_stage_p90_seconds", {}).items():
+        measured = report["stages"].get(stage, {}).get("p90")
+        if measured is not None and measured > limit:
+            violations.append(f"{stage} p90 {measured:.3f}s exceeds {limit}s")
+    min_rate = thresholds.get("min_deals_per_hour")
+    if min_rate is not None and report["throughput"]["deals_per_hour"] < min_rate:
+        violations.append(f"throughput {report['throughput']['deals_per_hour']:.0f} deals/hour is below {min_rate}")
+    max_rss = thresholds.get("max_peak_rss_mb")
+    if max_rss is not None and report["peak_rss_mb"]["self"] > max_rss:
+        violations.append(f"peak RSS {report['peak_rss_mb']['self']} MB exceeds {max_rss} MB")
+    max_failed = thresholds.get("max_failed_deals")
+    if max_failed is not None and report["failed_deals"] > max_failed:
+        violations.append(f"{report['failed_deals']} deals failed (allowed: {max_failed})")
+    return violations
+
+
+def print_report(report: Dict):
+    print("\n--- Pipeline Benchmark ---")
+    print(f"{'Stage':<22} {'Count':>6} {'p50 (s)':>9} {'p90 (s)':>9} {'p99 (s)':>9}")
+    for name, stage in report["stages"].items():
+        print(f"{name[:22]:<22} {stage['count']:>6} {stage['p50']:>9.3f} {stage['p90']:>9.3f} {stage['p99']:>9.3f}")
+    throughput = report["throughput"]
+    print(f"\n{report['deals']} deals ({report['files']} files, {report['pdf_pages']} PDF pages, {report['photos']} photos) "
+          f"in {report['wall_seconds']:.1f}s with {report['workers']} workers, stub latency {report['latency_ms']:g} ms")
+    print(f"Throughput: {throughput['deals_per_hour']:.0f} deals/hour, {throughput['files_per_second']:.1f} files/s, "
+          f"{throughput['pdf_pages_per_second']:.1f} PDF pages/s")
+    tokens = report["tokens"]
+    cached_share = tokens["cached_tokens"] / tokens["prompt_tokens"] if tokens["prompt_tokens"] else 0.0
+    print(f"Tokens: {tokens['prompt_tokens']:,} prompt ({tokens['cached_tokens']:,} cached, {cached_share:.0%}), "
+          f"{tokens['completion_tokens']:,} completion")
+    print(f"Peak RSS: {report['peak_rss_mb']['self']} MB (worker processes: {report['peak_rss_mb']['children']} MB)")
+    if report["file_errors"]:
+        print(f"{report['file_errors']} files could not be processed (scanned PDFs need Tesseract and Poppler for OCR).")
+    print("--------------------------")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark against a local OpenAI stub.")
+    parser.add_argument("--deals", type=int, default=3, help="Number of synthetic deal folders.")
+    add_size_arguments(parser)
+    parser.add_argument("--latency-ms", type=float, default=300, help="Stub server delay per request.")
+    parser.add_argument("--workers", type=int, default=1, help="Deals processed concurrently.")
+    parser.add_argument("--template", choices=sorted(TEMPLATE_FILENAMES), default="1", help="Template menu choice.")
+    parser.add_argument("--weeks", type=int, default=4)
+    parser.add_argument("--thresholds", default=str(DEFAULT_THRESHOLDS_PATH), help="Thresholds JSON; pass '' to skip checks.")
+    parser.add_argument("--output", help="Write the report as JSON to this path.")
+    parser.add_argument("--workdir", help="Directory for the deal folders (default: a temporary directory).")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated deal folders.")
+    args = parser.parse_args()
+
+    os.chdir(REPO_ROOT) # Templates, prompts and config.json are resolved relative to the repo root
+    config = config_loader.load_config()
+    if not config:
+        sys.exit(1)
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="proposal_bench_"))
+    server, base_url = start_stub_server(args.latency_ms / 1000)
+    config = {**config, **BENCHMARK_CONFIG, "openai_base_url": base_url, "telemetry_dir": str(workdir / ".telemetry")}
+
+    print(f"Generating {args.deals} synthetic deals in {workdir}...")
+    sizes = sizes_from_args(args)
+    folders, counts = [], {"files": 0, "pdf_pages": 0, "photos": 0}
+    for deal_number in range(1, args.deals + 1):
+        folder = workdir / f"Deal {deal_number:03d}"
+        deal_counts = make_deal(folder, deal_number, sizes, args.seed)
+        folders.append(folder)
+        for key in counts:
+            counts[key] += deal_counts[key]
+
+    telemetry.configure(config)
+    llm = llm_service.LLMService(BENCHMARK_API_KEY, config)
+    template_filename = TEMPLATE_FILENAMES[args.template]
+    proposal_pipeline.run_template_indexer()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        results = list(executor.map(
+            telemetry.wrap(lambda folder: run_deal(llm, config, folder, template_filename, args.weeks)), folders
+        ))
+    wall_seconds = time.perf_counter() - start
+    server.shutdown()
+
+    spans = telemetry.records()
+    report = {
+        "deals": args.deals,
+        "workers": args.workers,
+        "latency_ms": args.latency_ms,
+        "sizes": sizes,
+        **counts,
+        "wall_seconds": round(wall_seconds, 3),
+        "failed_deals": sum(1 for r in results if r["status"] != "ok"),
+        "file_errors": sum(r.get("file_errors", 0) for r in results),
+        "stages": stage_latencies(spans),
+        "tokens": {key: sum(r.get(key, 0) for r in spans) for key in ("prompt_tokens", "cached_tokens", "completion_tokens")},
+        "throughput": {
+            "deals_per_hour": round(args.deals / wall_seconds * 3600, 1),
+            "files_per_second": round(counts["files"] / wall_seconds, 2),
+            "pdf_pages_per_second": round(counts["pdf_pages"] / wall_seconds, 2),
+        },
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(json.dumps(report, indent=2) + "\n")
+        print(f"Report written to {args.output}")
+    if not args.keep and not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.thresholds:
+        with open(args.thresholds, "r", encoding="utf-8") as f:
+            violations = check_thresholds(report, json.load(f))
+        for violation in violations:
+            print(f"THRESHOLD FAILED: {violation}")
+        if violations:
+            sys.exit(1)
+        print("All benchmark thresholds met.")
+
+
+if __name__ == "__main__":
+    main()
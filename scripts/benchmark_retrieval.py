@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+benchmark_retrieval.py
+Compares full-corpus variable extraction with retrieval mode (each variable group gets only its
+top-ranked passages) on the same deal folders: prompt tokens, LLM calls, latency, and how many
+variables both modes agree on.
+
+By default the folders are synthetic and the LLM is the local stub (tokens and latency only;
+the stub's answers are not meaningful). With --live, the configured OpenAI API is used, which
+also makes the agreement column meaningful.
+
+Usage:
+    python scripts/benchmark_retrieval.py --deals 3 --pages 20 --latency-ms 300
+    python scripts/benchmark_retrieval.py --live "/deals/Smith Farm" "/deals/Jones Estate"
+"""
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(REPO_ROOT / "scripts"))
+
+from make_synthetic_deals import add_size_arguments, make_deals, sizes_from_args
+from openai_stub_server import start_stub_server
+from src import config_loader, data_processor, llm_service, telemetry, variable_extractor
+from src.proposal_pipeline import TEMPLATE_FILENAMES, load_template_var_index
+
+BASELINE_MODE = "auto" # Full corpus (chunked only when it exceeds the budget)
+
+
+def run_mode(llm, config: Dict, doc_text: str, variable_index: List[Dict], mode: str) -> Dict:
+    telemetry.configure({**config, "telemetry_enabled": True, "telemetry_dir": config["telemetry_dir"]})
+    start = time.perf_counter()
+    values = variable_extractor.extract_variables(llm, doc_text, variable_index, {**config, "extraction_mode": mode})
+    seconds = time.perf_counter() - start
+    calls = [r for r in telemetry.records() if r["name"] == "llm_call"]
+    return {
+        "values": values,
+        "seconds": seconds,
+        "calls": len(calls),
+        "prompt_tokens": sum(r.get("prompt_tokens", 0) for r in calls),
+    }
+
+
+def _normalize(value) -> str:
+    return re.sub(r"\s+", " ", str(value)).strip().casefold()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare full-corpus and retrieval-based variable extraction.")
+    parser.add_argument("folders", nargs="*", help="Deal folders to compare (default: synthetic deals).")
+    parser.add_argument("--deals", type=int, default=3, help="Synthetic deals to generate when no folders are given.")
+    add_size_arguments(parser)
+    parser.add_argument("--latency-ms", type=float, default=300, help="Stub server delay per request.")
+    parser.add_argument("--template", choices=sorted(TEMPLATE_FILENAMES), default="1", help="Template menu choice.")
+    parser.add_argument("--live", action="store_true", help="Use the configured OpenAI API instead of the local stub.")
+    args = parser.parse_args()
+
+    os.chdir(REPO_ROOT)
+    config = config_loader.load_config()
+    if not config:
+        sys.exit(1)
+    workdir = Path(tempfile.mkdtemp(prefix="retrieval_bench_"))
+    config = {**config, "llm_cache_enabled": False, "stream_responses": False, "telemetry_dir": str(workdir / ".telemetry")}
+    server = None
+    if args.live:
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            print("Error: OPENAI_API_KEY is not set.")
+            sys.exit(1)
+    else:
+        server, config["openai_base_url"] = start_stub_server(args.latency_ms / 1000)
+        api_key = "benchmark-stub-key"
+    llm = llm_service.LLMService(api_key, config)
+    variable_index = load_template_var_index(TEMPLATE_FILENAMES[args.template])
+
+    folders = [Path(folder) for folder in args.folders]
+    if not folders:
+        folders = make_deals(workdir / "deals", args.deals, sizes_from_args(args), args.seed)
+
+    rows = []
+    for folder in folders:
+        doc_text, _, _ = data_processor.process_folder(folder, config)
+        baseline = run_mode(llm, config, doc_text, variable_index, BASELINE_MODE)
+        retrieval = run_mode(llm, config, doc_text, variable_index, "retrieval")
+        names = sorted(set(baseline["values"]) | set(retrieval["values"]))
+        agreed = sum(1 for name in names if _normalize(baseline["values"].get(name)) == _normalize(retrieval["values"].get(name)))
+        rows.append((folder.name, variable_extractor.estimate_tokens(doc_text), baseline, retrieval, agreed, len(names)))
+
+    print("\n--- Retrieval Benchmark ---")
+    print(f"{'Folder':<24} {'Corpus tok':>10} {'Full tok':>9} {'Retr. tok':>9} {'Reduction':>9} "
+          f"{'Full (s)':>8} {'Retr. (s)':>9} {'Calls':>7} {'Agree':>7}")
+    for name, corpus_tokens, baseline, retrieval, agreed, total in rows:
+        reduction = 1 - retrieval["prompt_tokens"] / baseline["prompt_tokens"] if baseline["prompt_tokens"] else 0.0
+        print(f"{name[:24]:<24} {corpus_tokens:>10,} {baseline['prompt_tokens']:>9,} {retrieval['prompt_tokens']:>9,} {reduction:>8.0%} "
+              f"{baseline['seconds']:>8.2f} {retrieval['seconds']:>9.2f} {baseline['calls']:>3}/{retrieval['calls']:<3} {agreed:>3}/{total:<3}")
+    full_tokens = sum(row[2]["prompt_tokens"] for row in rows)
+    retrieval_tokens = sum(row[3]["prompt_tokens"] for row in rows)
+    if full_tokens:
+        print(f"Total prompt tokens: {full_tokens:,} full corpus vs. {retrieval_tokens:,} retrieval "
+              f"({1 - retrieval_tokens / full_tokens:.0%} fewer).")
+    if not args.live:
+        print("(Stub answers are synthetic; use --live to compare extracted values.)")
+    print("---------------------------")
+
+    if server:
+        server.shutdown()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+benchmark_startup.py
+Measures CLI cold start: runs `python -X importtime main.py --help` in fresh interpreter
+processes and reports the wall time, the import time, which heavy optional subsystems were
+loaded (they should not be, for --help), and the slowest packages by self import time.
+The processing path (the pipeline modules plus the installed PDF, OCR and OpenAI libraries
+they load when a folder is processed) is timed the same way and reported separately.
+
+Each run is appended to a local history file (scripts/startup_history.jsonl by default, not
+tracked by git) with the commit and date, so startup can be tracked across releases on one
+machine. With --budget-ms, the script exits with status 1 when the median wall time of
+--help exceeds the budget.
+
+Usage:
+    python scripts/benchmark_startup.py --runs 7
+    python scripts/benchmark_startup.py --budget-ms 250 --no-record
+"""
+import argparse
+import json
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+HISTORY_PATH = REPO_ROOT / "scripts" / "startup_history.jsonl"
+STARTUP_BUDGET_MS = 300 # Median wall time of `main.py --help`, interpreter startup included
+HEAVY_PACKAGES = ("openai", "PyPDF2", "pdf2image", "PIL", "pytesseract", "tkinter")
+PROCESSING_MODULES = ("src.proposal_pipeline", "src.data_processor", "src.llm_service", "openai", "PyPDF2", "pdf2image", "PIL.Image", "pytesseract")
+TOP_PACKAGES = 10
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def parse_importtime(stderr: str) -> Tuple[float, Dict[str, float]]:
+    """Returns (total import ms, {root package: self ms}) from -X importtime output."""
+    total_us = 0
+    package_us: Dict[str, int] = {}
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = int(match.group(1)), int(match.group(2)), match.group(3), match.group(4)
+        if len(indent) <= 1: # Imported directly by the entry point (or the interpreter)
+            total_us += cumulative_us
+        root = module.split(".")[0]
+        package_us[root] = package_us.get(root, 0) + self_us
+    return total_us / 1000, {name: us / 1000 for name, us in package_us.items()}
+
+
+def measure_once(command: List[str]) -> Tuple[float, float, Dict[str, float]]:
+    """Runs one fresh interpreter. Returns (wall ms, import ms, {package: self ms})."""
+    start = time.perf_counter()
+    completed = subprocess.run(command, cwd=REPO_ROOT, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    if completed.returncode != 0:
+        print(completed.stderr[-2000:], file=sys.stderr)
+        raise SystemExit(f"Startup command failed with status {completed.returncode}: {' '.join(command)}")
+    import_ms, packages = parse_importtime(completed.stderr)
+    return wall_ms, import_ms, packages
+
+
+def processing_command() -> List[str]:
+    """Imports the processing path; optional libraries that are not installed are skipped."""
+    code = (
+        "import importlib, importlib.util\n"
+        f"for name in {PROCESSING_MODULES!r}:\n"
+        "    if importlib.util.find_spec(name.split('.')[0]):\n"
+        "        importlib.import_module(name)\n"
+    )
+    return [sys.executable, "-X", "importtime", "-c", code]
+
+
+def measure(command: List[str], runs: int) -> Dict:
+    """Median wall and import ms over `runs` fresh interpreters, with per-package medians."""
+    walls, imports, package_runs = [], [], []
+    for _ in range(max(1, runs)):
+        wall_ms, import_ms, packages = measure_once(command)
+        walls.append(wall_ms)
+        imports.append(import_ms)
+        package_runs.append(packages)
+    names = set().union(*package_runs)
+    packages = {name: statistics.median(run.get(name, 0.0) for run in package_runs) for name in names}
+    return {
+        "walls": walls,
+        "wall_ms": statistics.median(walls),
+        "import_ms": statistics.median(imports),
+        "top": sorted(packages.items(), key=lambda item: -item[1])[:TOP_PACKAGES],
+        "heavy_loaded": [name for name in HEAVY_PACKAGES if name in names],
+    }
+
+
+def print_top(top: List[Tuple[str, float]]):
+    print("Slowest packages (self import time):")
+    for name, ms in top:
+        print(f"  {name:<24} {ms:>8.1f} ms")
+
+
+def git_commit() -> Optional[str]:
+    try:
+        completed = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True)
+        return completed.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def last_history_entry(path: Path) -> Optional[Dict]:
+    if not path.is_file():
+        return None
+    lines = [line for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+    return json.loads(lines[-1]) if lines else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure CLI cold-start time and its per-package import breakdown.")
+    parser.add_argument("--runs", type=int, default=5, help="Measured runs (after one discarded warm-up run).")
+    parser.add_argument("--budget-ms", type=float, default=None, help=f"Fail when the median wall time exceeds this (default: {STARTUP_BUDGET_MS}).")
+    parser.add_argument("--history", default=str(HISTORY_PATH), help="JSONL file the result is appended to.")
+    parser.add_argument("--no-record", action="store_true", help="Do not append this run to the history file.")
+    parser.add_argument("--label", help="Optional label stored with the history entry (e.g. a release tag).")
+    args = parser.parse_args()
+
+    command = [sys.executable, "-X", "importtime", "main.py", "--help"]
+    interpreter_command = [sys.executable, "-c", "pass"]
+    measure_once(command) # Warm the OS file cache and bytecode caches
+    measure_once(processing_command())
+
+    interpreter_ms = statistics.median(measure_once(interpreter_command)[0] for _ in range(max(1, args.runs)))
+    cli = measure(command, args.runs)
+    processing = measure(processing_command(), args.runs)
+    wall_ms, import_ms, heavy_loaded = cli["wall_ms"], cli["import_ms"], cli["heavy_loaded"]
+    budget_ms = args.budget_ms if args.budget_ms is not None else STARTUP_BUDGET_MS
+
+    print("\n--- Startup Benchmark (main.py --help) ---")
+    print(f"Wall time: median {wall_ms:.0f} ms, min {min(cli['walls']):.0f} ms over {len(cli['walls'])} runs "
+          f"(bare interpreter: {interpreter_ms:.0f} ms)")
+    print(f"Import time: median {import_ms:.0f} ms")
+    print(f"Heavy subsystems loaded: {', '.join(heavy_loaded) if heavy_loaded else 'none'}")
+    print_top(cli["top"])
+    print("\n--- Processing path imports ---")
+    print(f"Wall time: median {processing['wall_ms']:.0f} ms; import time: median {processing['import_ms']:.0f} ms")
+    print(f"Heavy subsystems loaded: {', '.join(processing['heavy_loaded']) or 'none'}")
+    print_top(processing["top"])
+
+    history_path = Path(args.history)
+    previous = last_history_entry(history_path)
+    if previous:
+        delta = wall_ms - previous["wall_ms"]
+        print(f"Previous run ({previous.get('commit') or 'unknown commit'}, {previous['date'][:10]}): "
+              f"{previous['wall_ms']:.0f} ms wall ({delta:+.0f} ms)")
+    if not args.no_record:
+        entry = {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "label": args.label,
+            "python": platform.python_version(),
+            "runs": len(cli["walls"]),
+            "wall_ms": round(wall_ms, 1),
+            "import_ms": round(import_ms, 1),
+            "interpreter_ms": round(interpreter_ms, 1),
+            "heavy_loaded": heavy_loaded,
+            "top_packages": {name: round(ms, 1) for name, ms in cli["top"]},
+            "processing_wall_ms": round(processing["wall_ms"], 1),
+            "processing_import_ms": round(processing["import_ms"], 1),
+        }
+        history_path.parent.mkdir(parents=True, exist_ok=True)
+        with history_path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+        print(f"Recorded in {history_path}")
+
+    within = wall_ms <= budget_ms
+    print(f"Budget: {budget_ms:.0f} ms -> {'OK' if within else 'EXCEEDED'}")
+    print("------------------------------------------")
+    if not within:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+benchmark_template_render.py
+Renders thousands of proposals with the compiled template engine and with the previous
+render function (read the file, re.sub with a per-match callback) and compares throughput.
+
+Usage:
+    python scripts/benchmark_template_render.py --renders 5000
+"""
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src import template_engine
+from src.proposal_pipeline import TEMPLATE_DIR, TEMPLATE_FILENAMES
+
+
+def legacy_render_template(template, values):
+    """The render function previously used by main.py, kept here as the baseline."""
+    import re
+    def replacer(match):
+        key = match.group(1).strip()
+        return str(values.get(key, f"[MISSING:{key}]") )
+    return re.sub(r"{{\s*([a-zA-Z0-9_]+)\s*}}", replacer, template)
+
+
+def legacy_render_file(template_path: Path, values: dict) -> str:
+    with open(template_path, "r") as f:
+        template_content = f.read()
+    return legacy_render_template(template_content, values)
+
+
+def sample_values(template_path: Path, deal_number: int) -> dict:
+    """Values for every placeholder except one, so the missing-variable path is exercised too."""
+    names = list(dict.fromkeys(re.findall(r"{{\s*([a-zA-Z0-9_]+)\s*}}", template_path.read_text())))
+    return {name: f"{name} value for deal {deal_number}" for name in names[:-1]}
+
+
+def time_renders(render, template_path: Path, value_sets) -> float:
+    start = time.perf_counter()
+    for values in value_sets:
+        render(template_path, values)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compiled vs. regex template rendering.")
+    parser.add_argument("--renders", type=int, default=5000, help="Proposals rendered per template.")
+    args = parser.parse_args()
+
+    def compiled_render(template_path, values):
+        compiled = template_engine.load_template(template_path)
+        return compiled.render(values), compiled.missing(values)
+
+    print("\n--- Template Render Benchmark ---")
+    print(f"{'Template':<55} {'Legacy (ms)':>11} {'Compiled (ms)':>13} {'Speedup':>8} {'Same text':>9}")
+    for template_filename in TEMPLATE_FILENAMES.values():
+        template_path = TEMPLATE_DIR / template_filename
+        value_sets = [sample_values(template_path, i) for i in range(args.renders)]
+        same_text = all(
+            legacy_render_file(template_path, values) == compiled_render(template_path, values)[0]
+            for values in value_sets[:10]
+        )
+        legacy_seconds = time_renders(legacy_render_file, template_path, value_sets)
+        compiled_seconds = time_renders(compiled_render, template_path, value_sets)
+        speedup = legacy_seconds / compiled_seconds if compiled_seconds else 0.0
+        print(f"{template_filename[:55]:<55} {legacy_seconds * 1000:>11.1f} {compiled_seconds * 1000:>13.1f} {speedup:>7.1f}x {str(same_text):>9}")
+    print(f"Each template rendered {args.renders} times per engine.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+load_test_service.py
+Load test for the local proposal service: submits proposal jobs for synthetic deal folders
+from several client threads, polls each job until it finishes, and reports completed requests
+per minute, end-to-end latency percentiles and how often the bounded queue pushed back (503).
+
+By default the service runs in this process against the local OpenAI stub. With --url, jobs
+are sent to an already running service (python main.py --serve) on the same machine.
+
+Usage:
+    python scripts/load_test_service.py --requests 40 --concurrency 8 --latency-ms 300
+    python scripts/load_test_service.py --url http://127.0.0.1:8780 --requests 20
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(REPO_ROOT / "scripts"))
+os.environ["OPENAI_API_KEY"] = os.environ.get("OPENAI_API_KEY") or "benchmark-stub-key"
+
+from benchmark_pipeline import BENCHMARK_CONFIG, percentile
+from make_synthetic_deals import add_size_arguments, make_deals, sizes_from_args
+from openai_stub_server import start_stub_server
+
+POLL_SECONDS = 0.1
+
+
+def _request(method: str, url: str, body: Optional[Dict] = None) -> Tuple[int, Dict, Dict]:
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    request = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, json.loads(response.read() or b"{}"), dict(response.headers)
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"{}"), dict(e.headers)
+
+
+def run_job(base_url: str, deal: Dict, counters: Dict, lock: threading.Lock) -> Dict:
+    """Submits one job (retrying while the queue is full) and polls it to completion."""
+    start = time.perf_counter()
+    while True:
+        status, body, headers = _request("POST", f"{base_url}/jobs", deal)
+        if status != 503:
+            break
+        with lock:
+            counters["rejected"] += 1
+        time.sleep(min(float(headers.get("Retry-After", 1)), 1.0))
+    if status != 202:
+        return {"status": "rejected", "error": body.get("error"), "seconds": time.perf_counter() - start}
+    job_id = body["id"]
+    while True:
+        time.sleep(POLL_SECONDS)
+        _, job, _ = _request("GET", f"{base_url}/jobs/{job_id}")
+        if job.get("status") in ("done", "failed"):
+            return {"status": job["status"], "seconds": time.perf_counter() - start}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the local proposal service.")
+    parser.add_argument("--requests", type=int, default=20, help="Proposal jobs to submit.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Client threads submitting jobs.")
+    parser.add_argument("--url", help="Base URL of a running service (default: start one in-process).")
+    parser.add_argument("--latency-ms", type=float, default=300, help="Stub server delay per request (in-process service only).")
+    parser.add_argument("--service-workers", type=int, default=2, help="Service worker threads (in-process service only).")
+    parser.add_argument("--queue-size", type=int, default=4, help="Service queue capacity (in-process service only).")
+    parser.add_argument("--template", default="2", help="Template menu choice for every job.")
+    add_size_arguments(parser)
+    parser.set_defaults(pages=2, scanned_pdfs=0, photos=0)
+    args = parser.parse_args()
+
+    os.chdir(REPO_ROOT)
+    workdir = Path(tempfile.mkdtemp(prefix="service_load_"))
+    # One folder per job, so concurrent jobs never write into the same folder
+    folders = make_deals(workdir, args.requests, sizes_from_args(args), args.seed)
+
+    base_url, server, service, stub = args.url, None, None, None
+    if not base_url:
+        from src import config_loader, llm_service, proposal_service, telemetry
+        stub, stub_url = start_stub_server(args.latency_ms / 1000)
+        config = {
+            **config_loader.load_config(), **BENCHMARK_CONFIG, "openai_base_url": stub_url,
+            "telemetry_dir": str(workdir / ".telemetry"),
+            "service_workers": args.service_workers, "service_queue_size": args.queue_size,
+        }
+        telemetry.configure(config)
+        llm = llm_service.LLMService(os.environ["OPENAI_API_KEY"], config)
+        service, server = proposal_service.start_service(llm, config, "127.0.0.1", 0)
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    counters = {"rejected": 0}
+    lock = threading.Lock()
+    deals = [{"folder": str(folder), "template": args.template, "weeks": 4} for folder in folders]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as executor:
+        results = list(executor.map(lambda deal: run_job(base_url, deal, counters, lock), deals))
+    wall_seconds = time.perf_counter() - start
+    _, health, _ = _request("GET", f"{base_url}/health")
+
+    completed = [r for r in results if r["status"] == "done"]
+    latencies = [r["seconds"] for r in completed]
+    print("\n--- Service Load Test ---")
+    print(f"{len(results)} jobs from {args.concurrency} clients in {wall_seconds:.1f}s: "
+          f"{len(completed)} done, {sum(1 for r in results if r['status'] == 'failed')} failed, "
+          f"{sum(1 for r in results if r['status'] == 'rejected')} invalid")
+    print(f"Throughput: {len(completed) / wall_seconds * 60:.1f} requests/minute")
+    if latencies:
+        print(f"Latency (submit to done): p50 {percentile(latencies, 50):.2f}s, p90 {percentile(latencies, 90):.2f}s, "
+              f"max {max(latencies):.2f}s")
+    print(f"Queue-full rejections (503, retried): {counters['rejected']}; "
+          f"service: {health.get('workers')} workers, queue capacity {health.get('queue_capacity')}")
+    print("-------------------------")
+
+    if server:
+        server.shutdown()
+        service.stop()
+        stub.shutdown()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+make_synthetic_deals.py
+Generates synthetic deal folders for benchmarking: text PDFs, image-only (scanned) PDFs,
+a CRS-style property report, photo sets and text files. Output is deterministic for a seed.
+
+Usage:
+    python scripts/make_synthetic_deals.py /tmp/deals --deals 5 --pages 8 --photos 12
+"""
+import argparse
+import random
+from pathlib import Path
+from typing import Dict, List
+
+from PIL import Image, ImageDraw, ImageFont
+
+FIRST_NAMES = ["John", "Mary", "Robert", "Linda", "James", "Patricia", "William", "Barbara"]
+LAST_NAMES = ["Smith", "Brock", "Johnson", "Williams", "Davis", "Miller", "Wilson", "Moore"]
+STREETS = ["Main St", "Hillsboro Pike", "Franklin Rd", "Old Hickory Blvd", "Nolensville Pike", "Charlotte Ave"]
+CITIES = [("Nashville", "TN", "37201"), ("Franklin", "TN", "37064"), ("Murfreesboro", "TN", "37130"), ("Columbia", "TN", "38401")]
+FILLER_WORDS = (
+    "property acreage zoning survey easement deed listing agreement appraisal frontage utilities barn "
+    "pasture timber residence garage acres road access flood zone boundary closing title escrow auction"
+).split()
+
+DEFAULT_SIZES = {"text_pdfs": 2, "scanned_pdfs": 1, "photos": 8, "text_files": 2, "pages": 6}
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_text_pdf(path: Path, pages: List[List[str]]):
+    """Writes a minimal PDF with one Helvetica text stream per page (extractable with PyPDF2)."""
+    objects: Dict[int, bytes] = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    page_ids = []
+    next_id = 4
+    for lines in pages:
+        page_id, content_id = next_id, next_id + 1
+        next_id += 2
+        stream = "BT /F1 10 Tf 13 TL 50 760 Td\n" + "\n".join(f"({_pdf_escape(line)}) Tj T*" for line in lines) + "\nET"
+        data = stream.encode("latin-1", "replace")
+        objects[content_id] = b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream"
+        objects[page_id] = (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(page_id)
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids).encode()
+    objects[2] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_ids)
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(output)
+        output += b"%d 0 obj\n" % object_id + objects[object_id] + b"\nendobj\n"
+    xref_offset = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for object_id in sorted(objects):
+        output += b"%010d 00000 n \n" % offsets[object_id]
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    path.write_bytes(bytes(output))
+
+
+def write_scanned_pdf(path: Path, pages: List[List[str]], rng: random.Random):
+    """Writes an image-only PDF (text rendered into 150 dpi page images, with light scanner noise)."""
+    font = ImageFont.load_default(size=22)
+    images = []
+    for lines in pages:
+        image = Image.new("L", (1275, 1650), 255)
+        draw = ImageDraw.Draw(image)
+        for row, line in enumerate(lines):
+            draw.text((90, 100 + row * 30), line, fill=20, font=font)
+        for _ in range(400):
+            x, y = rng.randrange(1275), rng.randrange(1650)
+            draw.point((x, y), fill=rng.randrange(120, 200))
+        images.append(image)
+    images[0].save(path, "PDF", resolution=150, save_all=True, append_images=images[1:])
+    for image in images:
+        image.close()
+
+
+def write_photo(path: Path, rng: random.Random, size=(2400, 1800)):
+    """Writes a camera-sized JPEG of a tinted gradient with random rectangles."""
+    base = Image.linear_gradient("L").resize(size).convert("RGB")
+    tint = Image.new("RGB", size, (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    image = Image.blend(base, tint, 0.5)
+    draw = ImageDraw.Draw(image)
+    for _ in range(25):
+        x0, y0 = rng.randrange(size[0]), rng.randrange(size[1])
+        x1, y1 = x0 + rng.randrange(50, 600), y0 + rng.randrange(50, 600)
+        draw.rectangle((x0, y0, x1, y1), fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    image.save(path, "JPEG", quality=90)
+    image.close()
+
+
+def _paragraph_lines(rng: random.Random, lines: int) -> List[str]:
+    return [" ".join(rng.choice(FILLER_WORDS) for _ in range(12)).capitalize() + "." for _ in range(lines)]
+
+
+def make_deal(folder: Path, deal_number: int, sizes: Dict, seed: int = 0) -> Dict:
+    """Creates one deal folder. Returns counts of what was written."""
+    rng = random.Random(seed * 1000 + deal_number)
+    folder.mkdir(parents=True, exist_ok=True)
+    first, spouse, last = rng.choice(FIRST_NAMES), rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    street = f"{rng.randrange(100, 9999)} {rng.choice(STREETS)}"
+    city, state, zip_code = rng.choice(CITIES)
+    pages = int(sizes["pages"])
+
+    write_text_pdf(folder / f"CRS Property Report - {last}.pdf", [[
+        "CRS Property Report",
+        f"Owner Name: {last.upper()} {first.upper()} ETUX {spouse.upper()}",
+        "Mailing Address:",
+        street,
+        f"{city}, {state} {zip_code}",
+        f"Parcel ID: {rng.randrange(100, 999)}-{rng.randrange(10, 99)}-{rng.randrange(1000, 9999)}",
+        f"Property Address: {street}",
+        "County: Davidson",
+        f"Acres: {rng.randrange(1, 200)}.{rng.randrange(10, 99)}",
+    ] + _paragraph_lines(rng, 20)])
+    for i in range(int(sizes["text_pdfs"])):
+        write_text_pdf(folder / f"Listing Packet {i + 1}.pdf", [_paragraph_lines(rng, 50) for _ in range(pages)])
+    for i in range(int(sizes["scanned_pdfs"])):
+        write_scanned_pdf(folder / f"Scanned Survey {i + 1}.pdf", [_paragraph_lines(rng, 30) for _ in range(pages)], rng)
+    for i in range(int(sizes["text_files"])):
+        (folder / f"notes_{i + 1}.txt").write_text(
+            f"Call notes for {first} {last}, {street}, {city}.\n\n" + "\n".join(_paragraph_lines(rng, 40)), encoding="utf-8"
+        )
+    for i in range(int(sizes["photos"])):
+        write_photo(folder / f"photo_{i + 1:03d}.jpg", rng)
+    return {
+        "files": 1 + sum(int(sizes[k]) for k in ("text_pdfs", "scanned_pdfs", "text_files", "photos")),
+        "pdf_pages": 1 + pages * (int(sizes["text_pdfs"]) + int(sizes["scanned_pdfs"])),
+        "photos": int(sizes["photos"]),
+    }
+
+
+def make_deals(output_dir: Path, deals: int, sizes: Dict, seed: int = 0) -> List[Path]:
+    folders = []
+    for deal_number in range(1, deals + 1):
+        folder = output_dir / f"Deal {deal_number:03d}"
+        make_deal(folder, deal_number, sizes, seed)
+        folders.append(folder)
+    return folders
+
+
+def add_size_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--pages", type=int, default=DEFAULT_SIZES["pages"], help="Pages per text and scanned PDF.")
+    parser.add_argument("--text-pdfs", type=int, default=DEFAULT_SIZES["text_pdfs"], help="Text PDFs per deal.")
+    parser.add_argument("--scanned-pdfs", type=int, default=DEFAULT_SIZES["scanned_pdfs"], help="Image-only PDFs per deal (need OCR).")
+    parser.add_argument("--photos", type=int, default=DEFAULT_SIZES["photos"], help="Photos per deal.")
+    parser.add_argument("--text-files", type=int, default=DEFAULT_SIZES["text_files"], help="Text files per deal.")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def sizes_from_args(args) -> Dict:
+    return {key: getattr(args, key) for key in DEFAULT_SIZES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic deal folders for benchmarking.")
+    parser.add_argument("output_dir", help="Directory to create the deal folders in.")
+    parser.add_argument("--deals", type=int, default=3)
+    add_size_arguments(parser)
+    args = parser.parse_args()
+    folders = make_deals(Path(args.output_dir), args.deals, sizes_from_args(args), args.seed)
+    print(f"Created {len(folders)} deal folders in {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+openai_stub_server.py
+A local OpenAI-compatible chat completions server for benchmarks. It answers every request
+after a configurable latency, supports streaming (SSE with a final usage chunk) and
+json_schema response formats, and reports token usage estimated from the request size.
+Provider prompt caching is simulated: a request whose leading 1024+ tokens (in 128-token
+steps) match an earlier request reports that prefix as cached_tokens.
+
+Usage:
+    python scripts/openai_stub_server.py --port 8765 --latency-ms 300
+    # then set "openai_base_url": "http://127.0.0.1:8765/v1" in config.json
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+
+CHARS_PER_TOKEN = 4
+PHOTO_DESCRIPTION = (
+    "Lot 1: Oak dining table with six ladder-back chairs, light wear consistent with age.\n"
+    "Lot 2: Pair of brass table lamps with linen shades.\n"
+    "Lot 3: Craftsman 10-inch table saw on rolling stand.\n"
+)
+PROPOSAL_TEXT = "Thank you for the opportunity to present this auction proposal. " * 40
+CACHE_MIN_PREFIX_TOKENS = 1024
+CACHE_PREFIX_STEP_TOKENS = 128
+
+
+def _content_tokens(content) -> int:
+    if isinstance(content, str):
+        return len(content) // CHARS_PER_TOKEN
+    tokens = 0
+    for part in content or []:
+        if part.get("type") == "text":
+            tokens += len(part["text"]) // CHARS_PER_TOKEN
+        else:
+            tokens += 765 # Roughly a high-detail image tile set
+    return tokens
+
+
+class PrefixCache:
+    """Remembers prompt prefixes at cache-block boundaries, like a provider-side prompt cache."""
+
+    def __init__(self):
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def cached_tokens(self, body: Dict) -> int:
+        """Returns the tokens of the longest previously seen prefix of this request, and records its prefixes."""
+        # The response schema and messages are hashed in request order, as the provider sees them
+        text = json.dumps(body.get("response_format")) + json.dumps(body.get("messages", []))
+        step = CACHE_PREFIX_STEP_TOKENS * CHARS_PER_TOKEN
+        digest = hashlib.sha256(text[:CACHE_MIN_PREFIX_TOKENS * CHARS_PER_TOKEN - step].encode("utf-8"))
+        cached = 0
+        boundaries = []
+        for end in range(CACHE_MIN_PREFIX_TOKENS * CHARS_PER_TOKEN, len(text) + 1, step):
+            digest.update(text[end - step:end].encode("utf-8"))
+            boundaries.append(digest.hexdigest())
+        with self._lock:
+            for index, key in enumerate(boundaries):
+                if key in self._seen:
+                    cached = CACHE_MIN_PREFIX_TOKENS + index * CACHE_PREFIX_STEP_TOKENS
+            self._seen.update(boundaries)
+        return cached
+
+
+def _answer(body: Dict) -> str:
+    """Builds a plausible response for the request: schema-shaped JSON, photo text or proposal text."""
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        names = response_format["json_schema"]["schema"].get("required", [])
+        return json.dumps({name: {"value": f"Synthetic {name.replace('_', ' ')}", "confidence": 0.9} for name in names})
+    messages = body.get("messages", [])
+    user_content = messages[-1]["content"] if messages else ""
+    if not isinstance(user_content, str):
+        return PHOTO_DESCRIPTION
+    if "JSON" in user_content or "json" in user_content:
+        return json.dumps({"owner_name": "Synthetic Owner", "client_city": "Nashville"})
+    return PROPOSAL_TEXT
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency_seconds = 0.0
+    stream_chunk_seconds = 0.0
+    prefix_cache = PrefixCache()
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(self.latency_seconds)
+        content = _answer(body)
+        prompt_tokens = sum(_content_tokens(m.get("content")) for m in body.get("messages", []))
+        completion_tokens = max(1, len(content) // CHARS_PER_TOKEN)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": min(prompt_tokens, self.prefix_cache.cached_tokens(body))},
+        }
+        model = body.get("model", "stub")
+        if body.get("stream"):
+            self._stream(model, content, usage)
+            return
+        payload = json.dumps({
+            "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _stream(self, model: str, content: str, usage: Dict):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        def send(chunk: Dict):
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        base = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+        for i in range(0, len(content), 40):
+            send({**base, "choices": [{"index": 0, "delta": {"content": content[i:i + 40]}, "finish_reason": None}]})
+            time.sleep(self.stream_chunk_seconds)
+        send({**base, "choices": [], "usage": usage})
+        self.wfile.write(b"data: [DONE]\n\n")
+
+
+def start_stub_server(latency_seconds: float = 0.0, port: int = 0, stream_chunk_seconds: float = 0.0) -> Tuple[ThreadingHTTPServer, str]:
+    """Starts the stub in a background thread. Returns (server, base URL for openai_base_url)."""
+    handler = type("ConfiguredStubHandler", (StubHandler,), {
+        "latency_seconds": latency_seconds, "stream_chunk_seconds": stream_chunk_seconds, "prefix_cache": PrefixCache(),
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible stub server.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=300, help="Delay before each response.")
+    parser.add_argument("--stream-chunk-ms", type=float, default=5, help="Delay between streamed chunks.")
+    args = parser.parse_args()
+    server, base_url = start_stub_server(args.latency_ms / 1000, args.port, args.stream_chunk_ms / 1000)
+    print(f"OpenAI stub listening at {base_url} (latency {args.latency_ms:g} ms). Press Ctrl+C to stop.")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
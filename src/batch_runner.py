@@ -0,0 +1,128 @@
+"""
+batch_runner.py
+Headless batch mode: generates proposals for many deal folders from a manifest, without
+any interactive prompts, using a worker pool.
+
+Manifest format (JSON):
+    {
+      "defaults": {"template": "2", "weeks": 4, "user_values": {"retainer": "1500"}},
+      "deals": [
+        {"folder": "/deals/Smith Farm", "user_values": {"buyers_premium_percentage": "10"}},
+        {"folder": "/deals/Jones Estate", "template": "3", "weeks": 6}
+      ]
+    }
+A bare list of deals is also accepted. "template" may be a menu choice ("1"-"3") or a template filename.
+"""
+import json
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src import proposal_pipeline, telemetry, template_indexer
+
+BATCH_WORKERS = 2
+DEAL_RESULT_FILENAME = "generated_proposal_result.json" # "generated_proposal" prefix keeps it out of folder processing
+
+
+def load_manifest(manifest_path: Path) -> List[Dict]:
+    """Loads the manifest and applies its defaults to every deal."""
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if isinstance(manifest, list):
+        manifest = {"deals": manifest}
+    defaults = manifest.get("defaults", {})
+    deals = []
+    for entry in manifest.get("deals", []):
+        deal = {**defaults, **entry}
+        deal["user_values"] = {**defaults.get("user_values", {}), **entry.get("user_values", {})}
+        deals.append(deal)
+    return deals
+
+
+def run_deal(llm, config: Dict, deal: Dict) -> Dict:
+    """Generates the proposal for one deal. Never raises; failures are recorded in the result."""
+    folder = deal.get("folder", "")
+    result = {"folder": folder, "status": "error", "template": None, "weeks": deal.get("weeks"), "warnings": []}
+    start = time.perf_counter()
+    try:
+        folder_path = Path(folder).expanduser()
+        if not folder or not folder_path.is_dir():
+            raise ValueError(f"Not a valid directory: '{folder}'")
+        template_filename = proposal_pipeline.resolve_template_filename(deal.get("template", ""))
+        if not template_filename:
+            raise ValueError(f"Unknown template: '{deal.get('template')}'")
+        template_path = proposal_pipeline.TEMPLATE_DIR / template_filename
+        if not template_path.is_file():
+            raise FileNotFoundError(f"Template file not found: {template_path}")
+        try:
+            weeks = int(deal.get("weeks"))
+        except (TypeError, ValueError):
+            raise ValueError(f"'weeks' must be an integer, got '{deal.get('weeks')}'")
+        result["template"] = template_filename
+        if template_indexer.has_template_changed(template_path, template_indexer.get_template_var_index_path(template_filename)):
+            result["warnings"].append("The template has changed since the last variable index was generated.")
+
+        print(f"\n=== Batch: processing deal folder {folder_path} ({template_filename}, {weeks} weeks) ===")
+        outcome = proposal_pipeline.build_proposal(llm, config, folder_path, template_filename, weeks, deal.get("user_values"))
+        result.update(outcome)
+        result["status"] = "ok"
+    except Exception as e:
+        print(f"!!! Batch: deal {folder} failed: {e} !!!")
+        result["error"] = f"{type(e).__name__}: {e}"
+        result["traceback"] = traceback.format_exc()
+    result["elapsed_seconds"] = round(time.perf_counter() - start, 2)
+
+    # Per-deal result next to the generated proposal
+    try:
+        folder_path = Path(folder).expanduser()
+        if folder and folder_path.is_dir():
+            with open(folder_path / DEAL_RESULT_FILENAME, "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=2)
+    except Exception as e:
+        print(f"Warning: Could not write deal result for {folder}: {e}")
+    return result
+
+
+def run_batch(llm, config: Dict, manifest_path: Path, workers: Optional[int] = None, report_path: Optional[Path] = None) -> Dict:
+    """Processes every deal in the manifest with a worker pool and writes a batch report. Returns the report."""
+    deals = load_manifest(manifest_path)
+    workers = max(1, int(workers or config.get("batch_workers", BATCH_WORKERS)))
+    started_at = datetime.now()
+    start = time.perf_counter()
+    print(f"Batch: {len(deals)} deals from {manifest_path} with {min(workers, max(1, len(deals)))} workers.")
+    # Bring every template index up to date once, before the workers start
+    proposal_pipeline.run_template_indexer()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(telemetry.wrap(lambda deal: run_deal(llm, config, deal)), deals))
+
+    elapsed = time.perf_counter() - start
+    succeeded = sum(1 for r in results if r["status"] == "ok")
+    report = {
+        "manifest": str(manifest_path),
+        "started_at": started_at.isoformat(timespec="seconds"),
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "elapsed_seconds": round(elapsed, 2),
+        "workers": workers,
+        "deals_total": len(results),
+        "deals_succeeded": succeeded,
+        "deals_failed": len(results) - succeeded,
+        "proposals_per_hour": round(succeeded / elapsed * 3600, 1) if elapsed > 0 else 0.0,
+        "deals": results,
+    }
+    if report_path is None:
+        report_path = Path(f"batch_report_{started_at.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print("\n--- Batch Summary ---")
+    for r in results:
+        detail = r.get("output_path") if r["status"] == "ok" else r.get("error")
+        missing = f" ({len(r.get('missing_variables', []))} missing variables)" if r.get("missing_variables") else ""
+        print(f"  [{r['status']}] {r['folder']}: {detail}{missing}")
+    print(f"{succeeded}/{len(results)} proposals generated in {elapsed:.1f}s ({report['proposals_per_hour']} proposals/hour).")
+    print(f"Batch report written to {report_path}")
+    return report
@@ -0,0 +1,145 @@
+"""
+corpus_normalizer.py
+Cleans the extracted documents before they are consolidated and sent to the LLM.
+
+Three passes, in order:
+  1. Whitespace: runs of spaces/tabs collapse to one space, lines are stripped, and more than
+     one blank line in a row collapses to one (OCR output is full of both).
+  2. Boilerplate: running headers and footers are removed from PDFs. Only the first and last
+     few lines of each page are candidates, and a line must recur at a page edge on most pages
+     (only page numbers are ignored when comparing); its first occurrence is kept. Body lines
+     are never touched, and text without page breaks is left as is.
+  3. Duplicates: a document whose normalized text equals an earlier one, or whose word
+     shingles overlap an earlier one's by at least the near-duplicate threshold, is dropped.
+     Documents are compared in filename order, so the first copy is the one kept.
+"""
+import hashlib
+import re
+from typing import Dict, List, Optional, Tuple
+
+from src import telemetry
+from src.pdf_handler import PAGE_SEPARATOR, strip_page_separators
+from src.variable_extractor import estimate_tokens
+
+CORPUS_NORMALIZATION_ENABLED = True
+NEAR_DUPLICATE_THRESHOLD = 0.9 # Jaccard similarity of word shingles
+SHINGLE_WORDS = 5
+BOILERPLATE_EDGE_LINES = 3 # Lines at the top and bottom of each page that may be a header/footer
+BOILERPLATE_MIN_PAGE_SHARE = 0.6 # A header/footer must recur on at least this share of the pages...
+BOILERPLATE_MIN_PAGES = 3 # ...and on at least this many pages
+BOILERPLATE_MAX_CHARS = 120
+
+_HORIZONTAL_SPACE = re.compile(r"[ \t\f\v\u00a0]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+_DIGITS = re.compile(r"\d+")
+_PAGE_NUMBER = re.compile(r"\bpage\s*\d+(\s*(of|/)\s*\d+)?\b|^\W{0,3}\d{1,4}(\s*(of|/)\s*\d{1,4})?\W{0,3}$", re.IGNORECASE)
+_WORD = re.compile(r"\w+")
+
+
+def collapse_whitespace(text: str) -> str:
+    lines = [_HORIZONTAL_SPACE.sub(" ", line).strip() for line in text.replace("\r\n", "\n").replace("\r", "\n").split("\n")]
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+
+def _boilerplate_key(line: str) -> str:
+    # Page numbers ("Page 3 of 12", "- 3 -") differ on every page; any other line must match exactly,
+    # so numbered data ("Tract 1: ...", "Lot 101 ...") never looks like a running header
+    return _DIGITS.sub("#", line.casefold()) if _PAGE_NUMBER.search(line) else line.casefold()
+
+
+def _edge_indexes(lines: List[str]) -> List[int]:
+    """Indexes of the first and last non-empty lines of a page (at most a third of the page at each edge)."""
+    filled = [i for i, line in enumerate(lines) if line]
+    count = min(BOILERPLATE_EDGE_LINES, max(1, len(filled) // 3))
+    return sorted(set(filled[:count] + filled[-count:]))
+
+
+def strip_repeated_lines(text: str) -> Tuple[str, int]:
+    """
+    Collapses whitespace page by page and removes running headers/footers (see the module
+    docstring), keeping their first occurrence. Returns (text, lines removed).
+    """
+    pages = [collapse_whitespace(page).split("\n") for page in text.split(PAGE_SEPARATOR)]
+    min_pages = max(BOILERPLATE_MIN_PAGES, BOILERPLATE_MIN_PAGE_SHARE * len(pages))
+    removed = 0
+    if len(pages) >= BOILERPLATE_MIN_PAGES:
+        page_counts: Dict[str, int] = {}
+        for lines in pages:
+            for key in {_boilerplate_key(lines[i]) for i in _edge_indexes(lines) if len(lines[i]) <= BOILERPLATE_MAX_CHARS}:
+                page_counts[key] = page_counts.get(key, 0) + 1
+        repeated = {key for key, count in page_counts.items() if count >= min_pages}
+        seen = set()
+        for lines in pages:
+            for i in _edge_indexes(lines):
+                key = _boilerplate_key(lines[i])
+                if key not in repeated:
+                    continue
+                if key in seen:
+                    lines[i] = None
+                    removed += 1
+                else:
+                    seen.add(key)
+    page_texts = ["\n".join(line for line in lines if line is not None).strip() for lines in pages]
+    return _BLANK_LINES.sub("\n\n", "\n\n".join(page for page in page_texts if page)).strip(), removed
+
+
+def _shingles(text: str, size: int = SHINGLE_WORDS) -> set:
+    words = _WORD.findall(text.casefold())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def normalize_documents(documents: List[Tuple[str, str]], config: Optional[Dict] = None) -> List[str]:
+    """
+    Normalizes (filename, text) documents in order and drops duplicates.
+    Returns the texts to consolidate and prints how many tokens were removed.
+    """
+    config = config or {}
+    if not config.get("corpus_normalization_enabled", CORPUS_NORMALIZATION_ENABLED) or not documents:
+        return [strip_page_separators(text) for _, text in documents]
+    threshold = float(config.get("near_duplicate_threshold", NEAR_DUPLICATE_THRESHOLD))
+
+    with telemetry.span("normalize", documents=len(documents)) as span:
+        tokens_before = sum(estimate_tokens(text) for _, text in documents)
+        kept: List[str] = []
+        kept_names: List[str] = []
+        kept_hashes: Dict[str, str] = {}
+        kept_shingles: List[set] = []
+        boilerplate_lines = 0
+        dropped = []
+        for name, text in documents:
+            cleaned, removed = strip_repeated_lines(text)
+            boilerplate_lines += removed
+            if not cleaned:
+                dropped.append(f"{name} (empty after normalization)")
+                continue
+            digest = hashlib.sha256(cleaned.casefold().encode("utf-8")).hexdigest()
+            if digest in kept_hashes:
+                dropped.append(f"{name} (duplicate of {kept_hashes[digest]})")
+                continue
+            shingles = _shingles(cleaned)
+            similar = next((i for i, other in enumerate(kept_shingles) if _jaccard(shingles, other) >= threshold), None)
+            if similar is not None:
+                dropped.append(f"{name} (near-duplicate of {kept_names[similar]})")
+                continue
+            kept.append(cleaned)
+            kept_names.append(name)
+            kept_hashes[digest] = name
+            kept_shingles.append(shingles)
+        tokens_after = sum(estimate_tokens(text) for text in kept)
+        span.set(tokens_before=tokens_before, tokens_after=tokens_after, dropped_documents=len(dropped))
+
+    removed_tokens = tokens_before - tokens_after
+    share = removed_tokens / tokens_before if tokens_before else 0.0
+    print(f"Corpus normalization: ~{tokens_before:,} -> ~{tokens_after:,} tokens ({removed_tokens:,} removed, {share:.0%}); "
+          f"{boilerplate_lines} repeated header/footer lines stripped, {len(dropped)} documents dropped.")
+    for entry in dropped:
+        print(f"  Dropped {entry}")
+    return kept
@@ -1,12 +1,15 @@
 """
 crs_parser.py
-Module for extracting structured data from CRS Property Report PDFs using LLM-based extraction.
+Module for extracting structured data from CRS Property Report PDFs.
+Labeled fields (owner, mailing address, parcel data) are parsed with deterministic rules;
+only the template variables the rules cannot resolve are sent to the LLM.
 """
 import os
+import re
 import json
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Tuple
 from pathlib import Path
-from .llm_service import LLMService
+from . import llm_cache, variable_extractor
 
 # CONFIGURATION - update as needed for your environment
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
@@ -14,19 +17,237 @@ LLM_CONFIG = {"openai_model": "gpt-4o"}  # or your preferred model
 # Path to the variable index JSON (single source of truth)
 VAR_INDEX_PATH = Path(__file__).parent.parent / "template_var_indexes/real_estate_auction_proposal.json"
 PROMPT_PATH = Path(__file__).parent.parent / "prompts/information_extraction_prompt.txt"
+CRS_INSTRUCTIONS = (
+    "Special Instructions for CRS Property Reports:\n"
+    "- For owner_name, if the CRS lists a name like 'Brock Perry Lynn Etux Phyllis', convert this to 'Perry Lynn and Phyllis Brock'. The first part is the primary owner (first and middle names), and 'Etux' or 'Et Vir' means 'and [spouse first name]'. Place the last name at the end.\n"
+    "  Example: 'Smith John Etux Jane' → 'John and Jane Smith'\n"
+    "- For owner address fields (client_street_address, client_city, client_state, client_postal_code), always use the 'Mailing Address' line directly below the owner name in the CRS Property Report.\n"
+    "- If the owner is a company, map the company name to client_company and leave individual name fields blank.\n"
+    "- If there are multiple owners, list all of them in the owner_name field, separated by 'and'."
+)
 
+# --- Rule-based CRS parsing ---
+# Labels match only when followed by ":" or "#" (or nothing), so "Owner Occupied: Yes" is not an owner line.
+# Bare generic words ("Owner", "County") are not labels: they start too many unrelated lines.
+OWNER_LABELS = ["Owner Name(s)", "Owner Name", "Owner(s)", "Current Owner"]
+MAILING_ADDRESS_LABELS = ["Owner Mailing Address", "Mailing Address"]
+PARCEL_FIELD_LABELS = {
+    "parcel_id": ["Parcel ID", "Parcel Number", "Parcel #", "Map-Parcel", "Map/Parcel"],
+    "property_address": ["Property Address", "Site Address", "Location Address", "Physical Address"],
+    "county": ["County Name"],
+    "subdivision": ["Subdivision"],
+    "acreage": ["Calculated Acreage", "Deeded Acreage", "Deed Acres", "Acreage", "Acres"],
+    "land_use": ["Land Use", "Property Use", "Property Type"],
+    "zoning": ["Zoning"],
+    "year_built": ["Year Built"],
+    "total_appraised_value": ["Total Appraised Value", "Total Appraisal", "Appraised Value", "Total Market Value"],
+    "legal_description": ["Legal Description"],
+}
+KNOWN_LABEL_PATTERNS = [re.compile(rf"^\s*{re.escape(label)}(?![A-Za-z])", re.IGNORECASE)
+                        for label in OWNER_LABELS + MAILING_ADDRESS_LABELS + [l for labels in PARCEL_FIELD_LABELS.values() for l in labels]]
+COMPANY_MARKERS = {"LLC", "L.L.C.", "INC", "INC.", "CORP", "CORP.", "CORPORATION", "COMPANY", "CO", "CO.", "LP", "LLP",
+                   "LTD", "TRUST", "TRUSTEE", "TRUSTEES", "BANK", "CHURCH", "PARTNERSHIP", "PARTNERS", "ASSOCIATION",
+                   "HOLDINGS", "PROPERTIES", "INVESTMENTS", "ENTERPRISES", "MINISTRIES", "FOUNDATION", "ESTATE"}
+SPOUSE_MARKER_PATTERN = re.compile(r"\bET\s*(?:UX|VIR)\b\.?", re.IGNORECASE)
+STREET_SUFFIXES = {"ST", "STREET", "RD", "ROAD", "DR", "DRIVE", "AVE", "AVENUE", "LN", "LANE", "HWY", "HIGHWAY", "PIKE",
+                   "CT", "COURT", "BLVD", "WAY", "CIR", "CIRCLE", "PL", "PLACE", "TRL", "TRAIL", "PKWY", "PARKWAY", "LOOP",
+                   "TER", "TERRACE", "CV", "COVE", "RUN", "XING", "ROW", "SQ"}
+UPPERCASE_WORDS = {"PO", "NE", "NW", "SE", "SW", "N", "S", "E", "W", "II", "III", "IV", "LLC", "LP", "LLP", "USA"}
+CITY_STATE_ZIP_PATTERN = re.compile(r"^(?P<city>[A-Za-z .'-]+?),?\s+(?P<state>[A-Za-z]{2})\.?\s+(?P<zip>\d{5}(?:-\d{4})?)$")
+STATE_ZIP_END_PATTERN = re.compile(r"\b[A-Za-z]{2}\.?\s+\d{5}(?:-\d{4})?$")
+PLACEHOLDER_VALUES = {"yes", "no", "y", "n", "n/a", "na", "none", "unknown", "-", "--", "0", "true", "false"}
+NUMERIC_FIELDS = {"parcel_id", "acreage", "total_appraised_value", "client_postal_code", "client_street_address"}
+ADDRESS_LINE_PATTERN = re.compile(r"^(\d+\S*\s+\S+|P\.?\s*O\.?\s*BOX\b)", re.IGNORECASE)
 
-def extract_variables_from_document(source_content: str, var_index_path: Optional[Path] = None, prompt_path: Optional[Path] = None) -> Optional[Dict]:
+
+def _format_word(word: str) -> str:
+    if word.upper() in UPPERCASE_WORDS:
+        return word.upper()
+    if re.fullmatch(r"\d+(ST|ND|RD|TH)", word, re.IGNORECASE):
+        return word.lower()
+    return "-".join(part[:1].upper() + part[1:].lower() for part in word.split("-"))
+
+
+def _format_words(text: str) -> str:
+    """Converts CRS all-caps text to readable capitalization ('SMITH JOHN' -> 'Smith John')."""
+    return " ".join(_format_word(word) for word in text.split())
+
+
+def _label_patterns(labels: List[str]) -> List[re.Pattern]:
+    # The label must end the line or be followed by ":"/"#"; labels that end in "#" may be followed by the value
+    return [re.compile(rf"^\s*{re.escape(label)}\s*(?:{':?' if label.endswith('#') else '[:#]'}\s*(.*)|$)", re.IGNORECASE)
+            for label in labels]
+
+
+def _find_labeled_line(lines: List[str], labels: List[str], exclude_labels: Optional[List[str]] = None) -> Tuple[Optional[int], str]:
+    """Returns (line index, value after the label) for the first line starting with one of the labels."""
+    patterns = _label_patterns(labels)
+    exclude_patterns = _label_patterns(exclude_labels or [])
+    for index in range(len(lines)):
+        if any(pattern.match(lines[index]) for pattern in exclude_patterns):
+            continue
+        for pattern in patterns:
+            match = pattern.match(lines[index])
+            if match:
+                return index, (match.group(1) or "").strip()
+    return None, ""
+
+
+def _is_label_line(line: str) -> bool:
+    if re.match(r"^\s*[A-Za-z][A-Za-z /#()-]{1,40}:", line):
+        return True
+    return any(pattern.match(line) for pattern in KNOWN_LABEL_PATTERNS)
+
+
+def normalize_owner_name(raw_owner: str) -> Tuple[str, str]:
+    """
+    Applies the CRS owner-name rules. Returns (owner_name, client_company).
+    'BROCK PERRY LYNN ETUX PHYLLIS' -> ('Perry Lynn and Phyllis Brock', '');
+    company owners return ('', company name).
+    """
+    raw_owner = re.sub(r"\s+", " ", raw_owner).strip(" ,;")
+    if not raw_owner:
+        return "", ""
+    tokens = {token.strip(",.").upper() for token in raw_owner.split()} | {token.upper() for token in raw_owner.split()}
+    if tokens & COMPANY_MARKERS:
+        return "", _format_words(raw_owner)
+
+    owners = []
+    for owner in re.split(r"\s*;\s*|\s+AND\s+(?=[A-Z]+\s+[A-Z]+)", raw_owner):
+        # 'LAST FIRST MIDDLE ETUX SPOUSE' or 'LAST FIRST & SPOUSE'
+        parts = SPOUSE_MARKER_PATTERN.split(owner, maxsplit=1)
+        if len(parts) == 1 and "&" in owner:
+            parts = owner.split("&", 1)
+        primary = parts[0].replace(",", " ").split()
+        if not primary:
+            continue
+        last_name, given_names = primary[0], primary[1:]
+        spouse = parts[1].replace(",", " ").split() if len(parts) > 1 else []
+        if given_names and spouse:
+            owners.append(f"{_format_words(' '.join(given_names))} and {_format_words(' '.join(spouse))} {_format_word(last_name)}")
+        elif given_names:
+            owners.append(f"{_format_words(' '.join(given_names))} {_format_word(last_name)}")
+        else:
+            owners.append(_format_word(last_name))
+    return " and ".join(owners), ""
+
+
+def is_plausible_value(field: str, value: str) -> bool:
+    """Sanity check for a rule-parsed value before it is allowed to override the LLM."""
+    value = value.strip()
+    if not value or ":" in value or value.casefold().strip(".") in PLACEHOLDER_VALUES:
+        return False
+    if field in NUMERIC_FIELDS:
+        return bool(re.search(r"\d", value))
+    if field == "year_built":
+        return bool(re.fullmatch(r"(1[6-9]|20)\d\d", value))
+    if field in ("owner_name", "client_company", "county", "client_city"):
+        # Names and places: mostly letters, and at least one word of two letters or more
+        return bool(re.search(r"[A-Za-z]{2,}", value)) and sum(c.isdigit() for c in value) <= len(value) // 4
+    return True
+
+
+def parse_mailing_address(address_lines: List[str]) -> Dict[str, str]:
+    """
+    Parses 'street, city, ST zip' (on one or two lines) into client address fields.
+    Fields that cannot be determined unambiguously are omitted.
+    """
+    text = ", ".join(line.strip(" ,") for line in address_lines if line.strip())
+    fields: Dict[str, str] = {}
+    match = re.match(r"^(?P<rest>.+?),?\s+(?P<state>[A-Za-z]{2})\.?\s+(?P<zip>\d{5}(?:-\d{4})?)$", text)
+    if not match:
+        return fields
+    fields["client_state"] = match.group("state").upper()
+    fields["client_postal_code"] = match.group("zip")
+    rest = match.group("rest").strip(" ,")
+    if "," in rest:
+        street, city = rest.rsplit(",", 1)
+    else:
+        # No comma: the street ends at the last street suffix (or the PO Box number)
+        words = rest.split()
+        split_at = None
+        for index, word in enumerate(words[:-1]):
+            if word.upper().strip(".") in STREET_SUFFIXES or (index > 0 and words[index - 1].upper() == "BOX" and word.isdigit()):
+                split_at = index + 1
+        if split_at is None:
+            return fields
+        street, city = " ".join(words[:split_at]), " ".join(words[split_at:])
+    fields["client_street_address"] = _format_words(street.strip(" ,"))
+    fields["client_city"] = _format_words(city.strip(" ,"))
+    return fields
+
+
+def parse_crs_report(text: str) -> Dict[str, str]:
+    """
+    Extracts labeled fields from CRS Property Report text without an LLM.
+    Returns only the fields that could be resolved: template variables (owner_name, client_company,
+    client_* address fields) plus parcel data (parcel_id, property_address, acreage, ...).
+    """
+    lines = [line.rstrip() for line in text.splitlines()]
+    fields: Dict[str, str] = {}
+
+    owner_index, owner_value = _find_labeled_line(lines, OWNER_LABELS, exclude_labels=MAILING_ADDRESS_LABELS)
+    mailing_index, mailing_value = _find_labeled_line(lines, MAILING_ADDRESS_LABELS)
+    if owner_index is not None:
+        owner_parts = [owner_value] if owner_value else []
+        # Additional owners may continue on the following unlabeled lines, up to the mailing address
+        for line in lines[owner_index + 1:]:
+            stripped = line.strip()
+            if not stripped or _is_label_line(line) or ADDRESS_LINE_PATTERN.match(stripped) or CITY_STATE_ZIP_PATTERN.match(stripped):
+                break
+            owner_parts.append(stripped)
+        if owner_parts:
+            owner_name, client_company = normalize_owner_name("; ".join(owner_parts))
+            fields["owner_name"] = owner_name
+            fields["client_company"] = client_company
+
+    # The mailing address is the labeled line (or the lines directly below the owner name)
+    address_lines: List[str] = []
+    candidates: List[str] = []
+    if mailing_index is not None:
+        address_lines = [mailing_value] if mailing_value else []
+        candidates = lines[mailing_index + 1:mailing_index + 3]
+    elif owner_index is not None:
+        following = lines[owner_index + 1:owner_index + 5]
+        for index, line in enumerate(following):
+            if ADDRESS_LINE_PATTERN.match(line.strip()):
+                candidates = following[index:index + 2]
+                break
+    for line in candidates:
+        if STATE_ZIP_END_PATTERN.search(", ".join(address_lines)):
+            break
+        line = line.strip()
+        if not line or _is_label_line(line):
+            break
+        address_lines.append(line)
+    fields.update(parse_mailing_address(address_lines))
+
+    for field, labels in PARCEL_FIELD_LABELS.items():
+        _, value = _find_labeled_line(lines, labels)
+        if value:
+            fields[field] = _format_words(value) if field in ("property_address", "county", "subdivision", "land_use") else value
+
+    # Rule values override the LLM's, so anything implausible is left to the LLM instead
+    implausible = [field for field, value in fields.items() if value and not is_plausible_value(field, value)]
+    for field in implausible:
+        print(f"Rule-based CRS parser: ignoring implausible {field} '{fields.pop(field)}'")
+    if "owner_name" in implausible:
+        fields.pop("client_company", None)
+    return fields
+
+
+
+def extract_variables_from_document(source_content: str, var_index_path: Optional[Path] = None, prompt_path: Optional[Path] = None, config: Optional[Dict] = None) -> Optional[Dict]:
     """
-    Extract template variables (as defined in the variable index JSON) from any document using LLMService.
+    Extract template variables (as defined in the variable index JSON) from a CRS or other document.
+    Labeled CRS fields are resolved with parse_crs_report first; only the remaining variables are sent to the LLM.
     :param source_content: The full text of the CRS or other source document(s).
     :param var_index_path: Path to the variable index JSON. Defaults to VAR_INDEX_PATH.
     :param prompt_path: Path to the extraction prompt. Defaults to PROMPT_PATH.
+    :param config: Optional application config (response cache settings etc.); LLM_CONFIG takes precedence.
     :return: Dict of extracted variable values, or None on failure.
     """
-    if not OPENAI_API_KEY:
-        raise RuntimeError("OPENAI_API_KEY environment variable not set.")
-    llm = LLMService(api_key=OPENAI_API_KEY, config=LLM_CONFIG)
+    llm_config = {**(config or {}), **LLM_CONFIG}
     if var_index_path is None:
         var_index_path = VAR_INDEX_PATH
     if prompt_path is None:
@@ -34,42 +255,71 @@ def extract_variables_from_document(source_content: str, var_index_path: Optiona
     # Load variable names from index, filtering for source == "extracted"
     with open(var_index_path, "r", encoding="utf-8") as f:
         var_index = json.load(f)
-    variable_names = [v["name"] for v in var_index if v.get("source") == "extracted"]
-    # Build the prompt: list variables explicitly, do NOT include the template
+    all_variable_names = [v["name"] for v in var_index if v.get("source") == "extracted"]
+
+    # Fast path: deterministic parsing of the labeled CRS fields
+    rule_fields: Dict[str, str] = {}
+    if llm_config.get("crs_rule_parser_enabled", True):
+        rule_fields = parse_crs_report(source_content)
+        print(f"Rule-based CRS parser resolved {len(rule_fields)} fields: {', '.join(rule_fields) or 'none'}")
+    variable_names = [name for name in all_variable_names if name not in rule_fields]
+    if not variable_names:
+        return rule_fields
+    if not llm_config.get("crs_llm_fallback", True):
+        print(f"Leaving {len(variable_names)} unresolved CRS variables to the main extraction step.")
+        return rule_fields
+
+    api_key = OPENAI_API_KEY
+    if not api_key and llm_cache.get_cache(llm_config).replay_only:
+        api_key = llm_cache.REPLAY_ONLY_API_KEY
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY environment variable not set.")
+    from .llm_service import LLMService # Only the LLM fallback needs the OpenAI client
+    llm = LLMService(api_key=api_key, config=llm_config)
+    print(f"Sending {len(variable_names)} unresolved variables to the LLM: {', '.join(variable_names)}")
+    system_prompt = (
+        "You are a professional real estate analyst. Your task is to extract detailed property information from documents. "
+        "Pay special attention to: Property details, financial information, legal documents, special features, location details. "
+        "Format all numbers consistently and include units."
+    )
+    if llm_config.get("structured_extraction", variable_extractor.STRUCTURED_EXTRACTION):
+        # Schema-constrained reply with per-field confidence; weak fields get one targeted follow-up
+        fields = variable_extractor.extract_fields_from_text(llm, source_content, variable_names, system_prompt, CRS_INSTRUCTIONS)
+        fields = variable_extractor.requery_low_confidence(
+            llm, source_content, fields, variable_names, llm_config, system_prompt, CRS_INSTRUCTIONS
+        )
+        llm_fields = {name: field["value"] for name, field in fields.items() if field["value"] is not None}
+        # Rule-based values take precedence over the LLM's
+        return {**llm_fields, **rule_fields}
+
+    # Build the prompt: list variables explicitly, do NOT include the template.
+    # Instructions come before the source documents so the prompt starts with a cacheable static prefix.
     variable_list_str = "\n".join([f"- {name}" for name in variable_names])
     user_prompt = (
-        f"Here is the list of required variables for the proposal (use these as JSON keys):\n"
-        f"{variable_list_str}\n\n"
-        f"Here are the source documents (potentially including a photo-based inventory description, agent bio, company bio, and client documents):\n\n"
-        f"{source_content}\n\n"
-        f"---\n"
-        f"Special Instructions for CRS Property Reports:\n"
-        f"- For owner_name, if the CRS lists a name like 'Brock Perry Lynn Etux Phyllis', convert this to 'Perry Lynn and Phyllis Brock'. The first part is the primary owner (first and middle names), and 'Etux' or 'Et Vir' means 'and [spouse first name]'. Place the last name at the end.\n"
-        f"  Example: 'Smith John Etux Jane' → 'John and Jane Smith'\n"
-        f"- For owner address fields (client_street_address, client_city, client_state, client_postal_code), always use the 'Mailing Address' line directly below the owner name in the CRS Property Report.\n"
-        f"- If the owner is a company, map the company name to client_company and leave individual name fields blank.\n"
-        f"- If there are multiple owners, list all of them in the owner_name field, separated by 'and'.\n"
+        f"{CRS_INSTRUCTIONS}\n"
         f"- If a value is definitively not found in the source documents for a specific variable, use the exact placeholder '[Information Not Found]'. Do not guess or make up information.\n"
         f"- Format the response as a JSON object where keys are variable names (no curly braces) and values are the extracted content or the placeholder.\n"
         f"- Ensure the output is ONLY the JSON object, with no preamble or explanation.\n"
-    )
-    system_prompt = (
-        "You are a professional real estate analyst. Your task is to extract detailed property information from documents. "
-        "Pay special attention to: Property details, financial information, legal documents, special features, location details. "
-        "Format all numbers consistently and include units."
+        f"---\n\n"
+        f"Here is the list of required variables for the proposal (use these as JSON keys):\n"
+        f"{variable_list_str}\n\n"
+        f"Here are the source documents (potentially including a photo-based inventory description, agent bio, company bio, and client documents):\n\n"
+        f"{source_content}\n"
     )
     # Call LLM
     extracted_json, _ = llm._call_openai_api(system_prompt, user_prompt, LLM_CONFIG["openai_model"])
     if not extracted_json:
         print("Failed to extract information from document.")
-        return None
+        return rule_fields or None
     try:
         # Clean up potential markdown fences if LLM adds them
         if extracted_json.startswith("```json"):
             extracted_json = extracted_json[7:]
         if extracted_json.endswith("```"):
             extracted_json = extracted_json[:-3]
-        return json.loads(extracted_json.strip())
+        llm_fields = json.loads(extracted_json.strip())
     except Exception as e:
         print(f"Failed to parse extracted JSON: {e}")
-        return None
+        return rule_fields or None
+    # Rule-based values take precedence over the LLM's
+    return {**llm_fields, **rule_fields}
@@ -4,22 +4,132 @@ import mimetypes
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional
 import json
+from concurrent.futures import ThreadPoolExecutor
 
-from src import pdf_handler, ocr_service, file_utils
+from src import pdf_handler, ocr_service, file_utils, llm_cache, folder_manifest, telemetry, corpus_normalizer
 from src.crs_parser import extract_variables_from_document  
 
 # Add more image types if needed
 SUPPORTED_IMAGE_EXTENSIONS = [".png", ".jpg", ".jpeg", ".tiff", ".bmp", ".gif"]
 # Add more text types if needed
 SUPPORTED_TEXT_EXTENSIONS = [".txt", ".md", ".py", ".csv", ".json", ".html", ".xml"]
+INGEST_WORKERS = 1 # Files processed concurrently by process_folder; 1 = one file at a time
 
-def process_folder(folder_path: Path) -> Tuple[str, List[Dict[str, str]], List[Path]]:
+def _is_generated_output(item: Path) -> bool:
+    return item.name.startswith("generated_proposal") or item.name.endswith("_output.md") or item.name.endswith("_proposal.md")
+
+def _process_file(item: Path, config: Optional[Dict] = None) -> Dict:
+    """Processes one file inside a telemetry span (see _extract_file)."""
+    with telemetry.span("file", file=item.name) as span:
+        result = _extract_file(item, config)
+        span.add(bytes=item.stat().st_size if item.exists() else 0)
+        span.set(status="image" if result["image_path"] is not None else "error" if result["error"] else "text")
+        return result
+
+def _extract_file(item: Path, config: Optional[Dict] = None) -> Dict:
+    """
+    Extracts text from a single file, or collects it as an image.
+
+    Returns:
+        A dict with keys "file" (name), "text" (extracted text or None),
+        "error" (error message or None) and "image_path" (Path or None).
+    """
+    print(f"\n--- Processing File: {item.name} ---")
+    file_path = item.absolute()
+    extracted_text: Optional[str] = None
+    error_info: Optional[str] = None
+    processed_as_image = False # Flag to track if we handled it as an image
+    file_ext = item.suffix.lower()
+    result = {"file": item.name, "text": None, "error": None, "image_path": None}
+
+    try:
+        # CRS PDF SPECIAL HANDLING
+        if item.name.lower().startswith("crs property report") and item.suffix.lower() == ".pdf":
+            print("Detected CRS Property Report PDF. Using CRS-specific parser.")
+            raw_text = pdf_handler.extract_text_from_pdf(file_path, config)
+            if raw_text:
+                crs_fields = extract_variables_from_document(pdf_handler.strip_page_separators(raw_text), config=config)
+                extracted_text = json.dumps(crs_fields, indent=2) if crs_fields else ""
+                print("CRS extracted fields:")
+                print(extracted_text)
+            else:
+                error_info = "Failed to extract text from CRS PDF."
+        else:
+            # Basic checks
+            if not os.access(file_path, os.R_OK):
+                error_info = "File is not readable (permissions?)."
+                print(f"Warning: {error_info}")
+            elif not file_path.stat().st_size > 0:
+                # Allow empty files, but log warning. Don't skip image files.
+                if item.suffix.lower() not in SUPPORTED_IMAGE_EXTENSIONS:
+                    error_info = "File is empty (0 bytes)."
+                    print(f"Warning: {error_info}")
+                else:
+                    # Images can be 0 bytes temporarily during sync etc., still collect path
+                    print(f"Notice: Image file {item.name} has 0 bytes, collecting path anyway.")
+
+            # Only proceed if no critical error yet (readable, or 0-byte image)
+            if error_info != "File is not readable (permissions?).":
+                # Determine file type and process
+                mime_type, _ = mimetypes.guess_type(file_path)
+                mime_type = mime_type or "" # Ensure mime_type is a string
+
+                print(f"Detected extension: {file_ext}, MIME type: {mime_type}")
+
+                if file_ext == '.pdf' or "pdf" in mime_type:
+                    extracted_text = pdf_handler.extract_text_from_pdf(file_path, config)
+                elif file_ext in SUPPORTED_IMAGE_EXTENSIONS or mime_type.startswith("image"):
+                    # Instead of OCR, collect the image path
+                    print(f"Collecting image file for analysis: {item.name}")
+                    result["image_path"] = file_path
+                    processed_as_image = True # Mark that we handled this as an image
+                elif file_ext in SUPPORTED_TEXT_EXTENSIONS or mime_type.startswith("text"):
+                    extracted_text = file_utils.extract_text_file(file_path)
+                elif error_info is None: # Only mark unsupported if no prior error
+                    error_info = f"Unsupported file type (ext: {file_ext}, mime: {mime_type}). Skipped."
+                    print(f"Notice: {error_info}")
+
+        # Consolidate results
+        if extracted_text:
+            print(f"Successfully processed and extracted text from {item.name}")
+            result["text"] = extracted_text
+        elif error_info:
+            result["error"] = error_info
+        # Handle case where text extraction failed (returned None) but wasn't an 'error_info' case
+        # And ensure it wasn't processed as an image (where None is expected)
+        elif not processed_as_image and (file_ext == '.pdf' or file_ext in SUPPORTED_TEXT_EXTENSIONS):
+            error_info = "Text extraction failed (check logs for details)."
+            print(f"Warning: {item.name} - {error_info}")
+            result["error"] = error_info
+
+    except llm_cache.LLMCacheMiss:
+        raise # Replay-only runs must fail rather than silently drop the CRS fields
+    except Exception as e:
+        # Catch unexpected errors during processing attempt
+        print(f"!!! Unexpected Error processing {item.name}: {str(e)} !!!")
+        import traceback
+        traceback.print_exc() # Print traceback for debugging
+        result["text"] = None
+        result["error"] = f"Unexpected error: {str(e)}"
+    finally:
+         print(f"--- Finished Processing File: {item.name} ---")
+    return result
+
+
+def process_folder(folder_path: Path, config: Optional[Dict] = None) -> Tuple[str, List[Dict[str, str]], List[Path]]:
     """
     Processes all supported files in a given folder, extracts text from text/PDF,
     collects image paths, and returns consolidated text, an error summary, and image paths.
+    Files are processed concurrently when the "ingest_workers" setting is greater than 1;
+    results are always consolidated in filename order so prompts stay reproducible.
+    Unless "folder_manifest_enabled" is false, unchanged files reuse the output recorded in
+    the folder's manifest from a previous run and only new or changed files are extracted.
+    The extracted texts are normalized (whitespace, repeated headers/footers) and duplicate
+    documents dropped before they are joined; see corpus_normalizer.
 
     Args:
         folder_path: The Path object representing the folder to process.
+        config: Optional configuration dict (ingest workers, folder manifest, corpus normalization, extraction cache and OCR settings).
 
     Returns:
         A tuple containing:
@@ -27,100 +137,77 @@ def process_folder(folder_path: Path) -> Tuple[str, List[Dict[str, str]], List[P
             - error_summary (List[Dict[str, str]]): Errors encountered during processing.
             - image_paths (List[Path]): List of paths to supported image files found.
     """
-    consolidated_texts = []
+    with telemetry.span("folder_scan", folder=str(folder_path)) as span:
+        all_extracted_text, error_summary, image_paths = _process_folder(folder_path, config)
+        span.add(bytes=len(all_extracted_text.encode("utf-8")))
+        span.set(images=len(image_paths), errors=len(error_summary))
+        return all_extracted_text, error_summary, image_paths
+
+
+def _process_folder(folder_path: Path, config: Optional[Dict] = None) -> Tuple[str, List[Dict[str, str]], List[Path]]:
     error_summary = []
     image_paths = [] # Initialize list for image paths
 
     print(f"\nProcessing files in folder: {folder_path}")
 
-    for item in folder_path.iterdir():
+    items = sorted(folder_path.iterdir(), key=lambda p: p.name)
+    files_to_process = []
+    for item in items:
+        if item.name == folder_manifest.MANIFEST_FILENAME:
+            continue
         # --- Skip output/previously generated files ---
-        if item.name.startswith("generated_proposal") or item.name.endswith("_output.md") or item.name.endswith("_proposal.md"):
+        if _is_generated_output(item):
             print(f"Skipping previously generated output file: {item.name}")
             continue
         if item.is_file():
-            print(f"\n--- Processing File: {item.name} ---")
-            file_path = item.absolute()
-            extracted_text: Optional[str] = None
-            error_info: Optional[str] = None
-            processed_as_image = False # Flag to track if we handled it as an image
-
-            try:
-                # CRS PDF SPECIAL HANDLING
-                if item.name.lower().startswith("crs property report") and item.suffix.lower() == ".pdf":
-                    print("Detected CRS Property Report PDF. Using CRS-specific parser.")
-                    raw_text = pdf_handler.extract_text_from_pdf(file_path)
-                    if raw_text:
-                        crs_fields = extract_variables_from_document(raw_text)
-                        extracted_text = json.dumps(crs_fields, indent=2) if crs_fields else ""
-                        print("CRS extracted fields:")
-                        print(extracted_text)
-                    else:
-                        error_info = "Failed to extract text from CRS PDF."
-                else:
-                    # Basic checks
-                    if not os.access(file_path, os.R_OK):
-                        error_info = "File is not readable (permissions?)."
-                        print(f"Warning: {error_info}")
-                    elif not file_path.stat().st_size > 0:
-                        # Allow empty files, but log warning. Don't skip image files.
-                        if item.suffix.lower() not in SUPPORTED_IMAGE_EXTENSIONS:
-                            error_info = "File is empty (0 bytes)."
-                            print(f"Warning: {error_info}")
-                        else:
-                            # Images can be 0 bytes temporarily during sync etc., still collect path
-                            print(f"Notice: Image file {item.name} has 0 bytes, collecting path anyway.")
-
-                    # Only proceed if no critical error yet (readable, or 0-byte image)
-                    if error_info != "File is not readable (permissions?).":
-                        # Determine file type and process
-                        file_ext = item.suffix.lower()
-                        mime_type, _ = mimetypes.guess_type(file_path)
-                        mime_type = mime_type or "" # Ensure mime_type is a string
-
-                        print(f"Detected extension: {file_ext}, MIME type: {mime_type}")
-
-                        if file_ext == '.pdf' or "pdf" in mime_type:
-                            extracted_text = pdf_handler.extract_text_from_pdf(file_path)
-                        elif file_ext in SUPPORTED_IMAGE_EXTENSIONS or mime_type.startswith("image"):
-                            # Instead of OCR, collect the image path
-                            print(f"Collecting image file for analysis: {item.name}")
-                            image_paths.append(file_path)
-                            processed_as_image = True # Mark that we handled this as an image
-                        elif file_ext in SUPPORTED_TEXT_EXTENSIONS or mime_type.startswith("text"):
-                            extracted_text = file_utils.extract_text_file(file_path)
-                        elif error_info is None: # Only mark unsupported if no prior error
-                            error_info = f"Unsupported file type (ext: {file_ext}, mime: {mime_type}). Skipped."
-                            print(f"Notice: {error_info}")
-
-                # Consolidate results
-                if extracted_text:
-                    print(f"Successfully processed and extracted text from {item.name}")
-                    consolidated_texts.append(extracted_text)
-                elif error_info:
-                    error_summary.append({"file": item.name, "error": error_info})
-                # Handle case where text extraction failed (returned None) but wasn't an 'error_info' case
-                # And ensure it wasn't processed as an image (where None is expected)
-                elif not processed_as_image and (file_ext == '.pdf' or file_ext in SUPPORTED_TEXT_EXTENSIONS):
-                    error_info = "Text extraction failed (check logs for details)."
-                    print(f"Warning: {item.name} - {error_info}")
-                    error_summary.append({"file": item.name, "error": error_info})
-
-            except Exception as e:
-                # Catch unexpected errors during processing attempt
-                print(f"!!! Unexpected Error processing {item.name}: {str(e)} !!!")
-                import traceback
-                traceback.print_exc() # Print traceback for debugging
-                error_summary.append({"file": item.name, "error": f"Unexpected error: {str(e)}"})
-                continue # Move to the next file
-            finally:
-                 print(f"--- Finished Processing File: {item.name} ---")
-
-    # Join all successfully extracted texts
+            files_to_process.append(item)
+
+    manifest = None
+    if (config or {}).get("folder_manifest_enabled", True):
+        manifest = folder_manifest.FolderManifest(folder_path, config)
+    results_by_name = {}
+    files_to_extract = []
+    for item in files_to_process:
+        reused = manifest.lookup(item) if manifest else None
+        if reused is not None:
+            print(f"Reusing previous output for unchanged file: {item.name}")
+            results_by_name[item.name] = reused
+        else:
+            files_to_extract.append(item)
+
+    workers = int((config or {}).get("ingest_workers", INGEST_WORKERS))
+    if workers > 1 and len(files_to_extract) > 1:
+        print(f"Processing {len(files_to_extract)} files with {min(workers, len(files_to_extract))} concurrent workers...")
+        with ThreadPoolExecutor(max_workers=min(workers, len(files_to_extract))) as executor:
+            # map() yields results in submission (filename) order regardless of completion order
+            extracted = list(executor.map(telemetry.wrap(lambda item: _process_file(item, config)), files_to_extract))
+    else:
+        extracted = [_process_file(item, config) for item in files_to_extract]
+    for item, result in zip(files_to_extract, extracted):
+        results_by_name[item.name] = result
+        if manifest:
+            manifest.record(item, result)
+    if manifest:
+        manifest.save(item.name for item in files_to_process)
+    results = [results_by_name[item.name] for item in files_to_process]
+
+    documents = []
+    for result in results:
+        if result["text"]:
+            documents.append((result["file"], result["text"]))
+        elif result["error"]:
+            error_summary.append({"file": result["file"], "error": result["error"]})
+        if result["image_path"] is not None:
+            image_paths.append(result["image_path"])
+
+    # Clean up whitespace, headers/footers and duplicate documents, then join the remaining texts
+    consolidated_texts = corpus_normalizer.normalize_documents(documents, config)
     all_extracted_text = "\n\n==== End of Document ====\n\n".join(consolidated_texts)
     
-    print(f"\nFinished processing folder. Processed {len(list(folder_path.iterdir()))} items.")
-    print(f"Successfully extracted text from {len(consolidated_texts)} files.")
+    print(f"\nFinished processing folder. Processed {len(items)} items.")
+    print(f"Successfully extracted text from {len(documents)} files.")
+    if manifest:
+        manifest.print_summary()
     if error_summary:
         print(f"Encountered errors in {len(error_summary)} files.")
     if image_paths:
@@ -0,0 +1,313 @@
+"""
+extraction_cache.py
+On-disk, content-addressed cache for per-page PDF text (direct extraction and OCR) and for
+re-encoded images.
+
+Entries are keyed by the SHA-256 of the source file, the extraction method
+("direct", "ocr", ...) and a digest of the settings that influence the output
+(DPI, OCR language, ...). Each page is stored as its own file so partially
+processed documents can be resumed. The cache is capped in size and evicts the
+least recently used entries first.
+
+Usage from the command line:
+    python -m src.extraction_cache --stats
+    python -m src.extraction_cache --invalidate "path/to/deed.pdf"
+    python -m src.extraction_cache --clear
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_CACHE_DIR = ".extraction_cache"
+DEFAULT_MAX_CACHE_MB = 512
+META_FILENAME = "meta.json"
+BLOB_FILENAME = "data.bin"
+EVICTION_TARGET_RATIO = 0.9  # Evict down to 90% of the cap to avoid evicting on every write
+
+_caches: Dict[Path, "ExtractionCache"] = {}
+_caches_lock = threading.Lock()
+
+
+def file_content_hash(file_path: Path, chunk_size: int = 1 << 20) -> str:
+    """Returns the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def settings_digest(settings: Optional[Dict]) -> str:
+    """Returns a short, stable digest of an extraction settings dict."""
+    encoded = json.dumps(settings or {}, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def resolve_path(path_value) -> Path:
+    """Resolves a configured path relative to the project root."""
+    path = Path(path_value).expanduser()
+    return path if path.is_absolute() else PROJECT_ROOT / path
+
+
+class ExtractionCache:
+    def __init__(self, cache_dir: Path, max_bytes: int, enabled: bool = True):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None  # Computed lazily on first write
+
+    def _entry_dir(self, file_hash: str, method: str, settings: Optional[Dict]) -> Path:
+        return self.cache_dir / file_hash[:2] / file_hash / f"{method}-{settings_digest(settings)}"
+
+    @staticmethod
+    def _page_filename(page_number: int) -> str:
+        return f"page_{page_number:05d}.txt"
+
+    def lookup(self, file_hash: str, method: str, settings: Optional[Dict]) -> Tuple[Optional[int], Dict[int, str]]:
+        """
+        Returns (page_count, {page_number: text}) for a cached document.
+        page_count is None when nothing is cached. Page numbers are 1-based.
+        """
+        if not self.enabled:
+            return None, {}
+        entry_dir = self._entry_dir(file_hash, method, settings)
+        meta_path = entry_dir / META_FILENAME
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None, {}
+        pages = {}
+        for page_number in range(1, meta.get("page_count", 0) + 1):
+            page_path = entry_dir / self._page_filename(page_number)
+            try:
+                with open(page_path, "r", encoding="utf-8") as f:
+                    pages[page_number] = f.read()
+            except FileNotFoundError:
+                continue
+        # Touch the entry so LRU eviction sees it as recently used
+        try:
+            os.utime(meta_path, None)
+        except OSError:
+            pass
+        return meta.get("page_count"), pages
+
+    def get_document(self, file_hash: str, method: str, settings: Optional[Dict]) -> Optional[List[str]]:
+        """Returns the ordered page texts if every page of the document is cached, else None."""
+        page_count, pages = self.lookup(file_hash, method, settings)
+        if page_count is None or len(pages) != page_count:
+            return None
+        return [pages[n] for n in range(1, page_count + 1)]
+
+    def put_page(self, file_hash: str, method: str, settings: Optional[Dict], page_number: int, text: str, page_count: int, source_name: str = ""):
+        """Stores the text of one page (1-based) and updates the entry metadata."""
+        if not self.enabled:
+            return
+        entry_dir = self._entry_dir(file_hash, method, settings)
+        entry_dir.mkdir(parents=True, exist_ok=True)
+        written = self._atomic_write(entry_dir / self._page_filename(page_number), text or "")
+        meta = {
+            "source_name": source_name,
+            "method": method,
+            "settings": settings or {},
+            "page_count": page_count,
+            "updated_at": time.time(),
+        }
+        written += self._atomic_write(entry_dir / META_FILENAME, json.dumps(meta, default=str))
+        self._add_written(written)
+
+    def get_blob(self, file_hash: str, method: str, settings: Optional[Dict]) -> Optional[Tuple[bytes, Dict]]:
+        """Returns (data, metadata) of a cached binary entry, or None."""
+        if not self.enabled:
+            return None
+        entry_dir = self._entry_dir(file_hash, method, settings)
+        meta_path = entry_dir / META_FILENAME
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            data = (entry_dir / BLOB_FILENAME).read_bytes()
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        try:
+            os.utime(meta_path, None)
+        except OSError:
+            pass
+        return data, meta
+
+    def put_blob(self, file_hash: str, method: str, settings: Optional[Dict], data: bytes, source_name: str = "", **details):
+        """Stores a binary entry (e.g. a re-encoded image); `details` are kept in its metadata."""
+        if not self.enabled:
+            return
+        entry_dir = self._entry_dir(file_hash, method, settings)
+        entry_dir.mkdir(parents=True, exist_ok=True)
+        written = self._atomic_write(entry_dir / BLOB_FILENAME, data)
+        meta = {"source_name": source_name, "method": method, "settings": settings or {}, "updated_at": time.time(), **details}
+        written += self._atomic_write(entry_dir / META_FILENAME, json.dumps(meta, default=str))
+        self._add_written(written)
+
+    def _add_written(self, written: int):
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_total_bytes()
+            else:
+                self._total_bytes += written
+            over_cap = self._total_bytes > self.max_bytes
+        if over_cap:
+            self.evict()
+
+    def put_document(self, file_hash: str, method: str, settings: Optional[Dict], pages: List[str], source_name: str = ""):
+        """Stores every page of a document."""
+        for page_number, text in enumerate(pages, start=1):
+            self.put_page(file_hash, method, settings, page_number, text, len(pages), source_name)
+
+    @staticmethod
+    def _atomic_write(path: Path, content) -> int:
+        """Replaces path with content; returns the change in its size (meta.json is rewritten on every page)."""
+        try:
+            previous_size = path.stat().st_size
+        except FileNotFoundError:
+            previous_size = 0
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        if isinstance(content, bytes):
+            tmp_path.write_bytes(content)
+        else:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(content)
+        os.replace(tmp_path, path)
+        return path.stat().st_size - previous_size
+
+    def _entries(self) -> List[Tuple[float, int, Path]]:
+        """Returns (last_used, size_bytes, entry_dir) for every cache entry."""
+        entries = []
+        if not self.cache_dir.is_dir():
+            return entries
+        for meta_path in self.cache_dir.glob(f"*/*/*/{META_FILENAME}"):
+            entry_dir = meta_path.parent
+            try:
+                last_used = meta_path.stat().st_mtime
+                size = sum(p.stat().st_size for p in entry_dir.iterdir() if p.is_file())
+            except OSError:
+                continue
+            entries.append((last_used, size, entry_dir))
+        return entries
+
+    def _scan_total_bytes(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self) -> int:
+        """Evicts least recently used entries until the cache is under its size cap. Returns entries removed."""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            target = int(self.max_bytes * EVICTION_TARGET_RATIO)
+            removed = 0
+            for _, size, entry_dir in entries:
+                if total <= target:
+                    break
+                self._remove_entry(entry_dir)
+                total -= size
+                removed += 1
+            self._total_bytes = total
+        if removed:
+            print(f"Extraction cache: evicted {removed} least recently used entries.")
+        return removed
+
+    def _remove_entry(self, entry_dir: Path):
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        # Clean up now-empty parent directories
+        for parent in (entry_dir.parent, entry_dir.parent.parent):
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+
+    def invalidate(self, file_hash: str, method: Optional[str] = None) -> int:
+        """Removes cached entries for a file (optionally only one method). Returns entries removed."""
+        file_dir = self.cache_dir / file_hash[:2] / file_hash
+        if not file_dir.is_dir():
+            return 0
+        removed = 0
+        with self._lock:
+            for entry_dir in list(file_dir.iterdir()):
+                if entry_dir.is_dir() and (method is None or entry_dir.name.startswith(f"{method}-")):
+                    self._remove_entry(entry_dir)
+                    removed += 1
+            self._total_bytes = None
+        return removed
+
+    def invalidate_file(self, file_path: Path, method: Optional[str] = None) -> int:
+        """Removes cached entries for the current contents of file_path."""
+        return self.invalidate(file_content_hash(file_path), method)
+
+    def clear(self):
+        """Removes every cache entry."""
+        with self._lock:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            self._total_bytes = 0
+
+    def stats(self) -> Dict:
+        entries = self._entries()
+        return {
+            "cache_dir": str(self.cache_dir),
+            "entries": len(entries),
+            "size_bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "enabled": self.enabled,
+        }
+
+
+def get_cache(config: Optional[Dict] = None) -> ExtractionCache:
+    """Returns the shared cache instance for the configured cache directory."""
+    config = config or {}
+    cache_dir = resolve_path(config.get("extraction_cache_dir", DEFAULT_CACHE_DIR))
+    max_bytes = int(config.get("extraction_cache_max_mb", DEFAULT_MAX_CACHE_MB) * 1024 * 1024)
+    enabled = bool(config.get("extraction_cache_enabled", True))
+    with _caches_lock:
+        cache = _caches.get(cache_dir)
+        if cache is None:
+            cache = ExtractionCache(cache_dir, max_bytes, enabled)
+            _caches[cache_dir] = cache
+        else:
+            cache.max_bytes = max_bytes
+            cache.enabled = enabled
+        return cache
+
+
+def main():
+    from src import config_loader
+
+    parser = argparse.ArgumentParser(description="Inspect or invalidate the PDF text/OCR extraction cache.")
+    parser.add_argument("--stats", action="store_true", help="Print cache size and entry count.")
+    parser.add_argument("--clear", action="store_true", help="Remove every cache entry.")
+    parser.add_argument("--invalidate", nargs="+", metavar="FILE", help="Remove cached entries for these files.")
+    parser.add_argument("--method", help="Only invalidate entries for this extraction method (e.g. 'ocr').")
+    args = parser.parse_args()
+
+    cache = get_cache(config_loader.load_config() or {})
+    if args.clear:
+        cache.clear()
+        print(f"Cleared extraction cache at {cache.cache_dir}")
+    if args.invalidate:
+        for file_name in args.invalidate:
+            try:
+                removed = cache.invalidate_file(Path(file_name), args.method)
+                print(f"Invalidated {removed} cache entries for {file_name}")
+            except FileNotFoundError:
+                print(f"Error: File not found: {file_name}")
+    if args.stats or not (args.clear or args.invalidate):
+        stats = cache.stats()
+        print(f"Cache directory: {stats['cache_dir']}")
+        print(f"Entries: {stats['entries']}")
+        print(f"Size: {stats['size_bytes'] / (1024 * 1024):.1f} MB of {stats['max_bytes'] / (1024 * 1024):.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+folder_manifest.py
+Per-deal-folder manifest for incremental re-processing.
+
+The manifest (.proposal_manifest.json in the deal folder) records the size, mtime, content
+hash and extracted-text location of every successfully processed file. Extracted text is
+stored under .proposal_extracted/ in the same folder. On a re-run, files whose size and mtime
+are unchanged (or whose content hash is unchanged) reuse their stored output; only new or
+changed files are extracted again. Changing the extraction settings invalidates the manifest.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from src import extraction_cache, ocr_service, pdf_backends
+
+MANIFEST_FILENAME = ".proposal_manifest.json"
+TEXT_DIRNAME = ".proposal_extracted"
+MANIFEST_VERSION = 2 # 2: stored PDF text keeps page separators
+
+
+def get_manifest_settings(config: Optional[Dict] = None) -> Dict:
+    """Settings that change what a file extracts to; a change invalidates every entry."""
+    config = config or {}
+    return {
+        "version": MANIFEST_VERSION,
+        "ocr": ocr_service.get_ocr_settings(config),
+        "pdf_backend": pdf_backends.resolve_backend_name(config),
+        "crs_rule_parser_enabled": bool(config.get("crs_rule_parser_enabled", True)),
+        "crs_llm_fallback": bool(config.get("crs_llm_fallback", True)),
+        "openai_model": config.get("openai_model"),
+    }
+
+
+class FolderManifest:
+    def __init__(self, folder_path: Path, config: Optional[Dict] = None):
+        self.folder_path = Path(folder_path)
+        self.path = self.folder_path / MANIFEST_FILENAME
+        self.text_dir = self.folder_path / TEXT_DIRNAME
+        self.settings_digest = extraction_cache.settings_digest(get_manifest_settings(config))
+        self.entries: Dict[str, Dict] = {}
+        self.reused = 0
+        self.extracted = 0
+        self._hashes: Dict[str, str] = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("settings_digest") == self.settings_digest:
+                self.entries = data.get("files", {})
+            else:
+                print("Folder manifest: extraction settings changed, re-extracting all files.")
+        except FileNotFoundError:
+            pass
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Warning: Could not read folder manifest {self.path}: {e}")
+
+    def _content_hash(self, item: Path) -> str:
+        if item.name not in self._hashes:
+            self._hashes[item.name] = extraction_cache.file_content_hash(item)
+        return self._hashes[item.name]
+
+    def lookup(self, item: Path) -> Optional[Dict]:
+        """Returns the stored processing result for an unchanged file, or None if it must be extracted."""
+        entry = self.entries.get(item.name)
+        if entry is None:
+            return None
+        stat = item.stat()
+        if (stat.st_size, stat.st_mtime_ns) != (entry["size"], entry["mtime_ns"]):
+            if stat.st_size != entry["size"] or self._content_hash(item) != entry["sha256"]:
+                return None
+            entry["mtime_ns"] = stat.st_mtime_ns # Touched but not modified
+        result = {"file": item.name, "text": None, "error": None, "image_path": None}
+        if entry.get("image"):
+            result["image_path"] = item.absolute()
+        else:
+            try:
+                result["text"] = (self.text_dir / entry["text_file"]).read_text(encoding="utf-8")
+            except (OSError, KeyError):
+                return None
+        self.reused += 1
+        return result
+
+    def record(self, item: Path, result: Dict):
+        """Stores a fresh processing result. Failed files are not recorded, so they are retried next run."""
+        self.extracted += 1
+        self.entries.pop(item.name, None)
+        if result["error"] or not (result["text"] or result["image_path"] is not None):
+            return
+        stat = item.stat()
+        entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": self._content_hash(item)}
+        if result["image_path"] is not None:
+            entry["image"] = True
+        else:
+            entry["text_file"] = f"{entry['sha256']}.txt"
+            try:
+                self.text_dir.mkdir(exist_ok=True)
+                (self.text_dir / entry["text_file"]).write_text(result["text"], encoding="utf-8")
+            except OSError as e:
+                print(f"Warning: Could not store extracted text for {item.name}: {e}")
+                return
+        self.entries[item.name] = entry
+
+    def save(self, present_names: Iterable[str]):
+        """Drops entries for files no longer in the folder, removes orphaned text and writes the manifest."""
+        present = set(present_names)
+        self.entries = {name: entry for name, entry in sorted(self.entries.items()) if name in present}
+        referenced = {entry.get("text_file") for entry in self.entries.values()}
+        try:
+            if self.text_dir.is_dir():
+                for text_path in self.text_dir.glob("*.txt"):
+                    if text_path.name not in referenced:
+                        text_path.unlink(missing_ok=True)
+            tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"settings_digest": self.settings_digest, "files": self.entries}, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Warning: Could not write folder manifest {self.path}: {e}")
+
+    def print_summary(self):
+        print(f"Folder manifest: {self.reused} files reused, {self.extracted} files re-extracted.")
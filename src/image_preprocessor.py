@@ -0,0 +1,130 @@
+"""
+image_preprocessor.py
+Downscales and re-encodes photos before they are uploaded to the multimodal API.
+
+Each image is EXIF-rotated, resized to fit within a maximum dimension, stripped of
+metadata and re-encoded as JPEG or WebP. When that is not smaller than the original (and
+the original needs no rotation and is a format the API accepts), the original is uploaded.
+The result is stored in the extraction cache by source content hash and settings, so
+repeated runs on the same folder reuse it and it counts toward the cache size cap.
+"""
+import io
+import mimetypes
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from src import extraction_cache
+
+IMAGE_MAX_DIMENSION = 1536 # Longest side in pixels after resizing
+IMAGE_FORMAT = "JPEG" # "JPEG" or "WEBP"
+IMAGE_QUALITY = 85
+UPLOAD_BANDWIDTH_MBPS = 20 # Assumed uplink speed for the upload-time-saved estimate
+IMAGE_CACHE_METHOD = "image"
+FORMAT_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+UPLOADABLE_MIME_TYPES = ("image/jpeg", "image/png", "image/webp", "image/gif") # Formats the API accepts; others are always re-encoded
+EXIF_ORIENTATION_TAG = 0x0112
+
+
+def get_image_settings(config: Optional[Dict] = None) -> Dict:
+    """Returns the settings that influence the re-encoded image (also part of the cache key)."""
+    config = config or {}
+    image_format = str(config.get("image_format", IMAGE_FORMAT)).upper()
+    if image_format not in FORMAT_MIME_TYPES:
+        print(f"Warning: Unsupported image_format '{image_format}', using {IMAGE_FORMAT}.")
+        image_format = IMAGE_FORMAT
+    return {
+        "max_dimension": int(config.get("image_max_dimension", IMAGE_MAX_DIMENSION)),
+        "format": image_format,
+        "quality": int(config.get("image_quality", IMAGE_QUALITY)),
+    }
+
+
+def _encode(image_path: Path, settings: Dict, resize: bool = True) -> Tuple[bytes, bool]:
+    """Returns (re-encoded bytes, whether the original needs an EXIF rotation to display upright)."""
+    with Image.open(image_path) as img:
+        rotated = img.getexif().get(EXIF_ORIENTATION_TAG, 1) != 1
+        # Apply the EXIF orientation before metadata is dropped
+        img = ImageOps.exif_transpose(img)
+        if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+            # Flatten transparency onto white; JPEG has no alpha channel
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.split()[-1])
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+        if resize:
+            img.thumbnail((settings["max_dimension"], settings["max_dimension"]), Image.LANCZOS)
+        buffer = io.BytesIO()
+        # No exif/icc arguments are passed, so metadata is not carried over
+        img.save(buffer, format=settings["format"], quality=settings["quality"], optimize=True)
+        return buffer.getvalue(), rotated
+
+
+class ImagePreprocessor:
+    def __init__(self, config: Optional[Dict] = None):
+        config = config or {}
+        self.enabled = bool(config.get("image_preprocess_enabled", True))
+        self.settings = get_image_settings(config)
+        self.upload_bandwidth_mbps = float(config.get("upload_bandwidth_mbps", UPLOAD_BANDWIDTH_MBPS))
+        self.cache = extraction_cache.get_cache(config)
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {"images": 0, "cache_hits": 0, "original_bytes": 0, "upload_bytes": 0}
+
+    def prepare(self, image_path: Path) -> Tuple[bytes, str]:
+        """Returns (image bytes to upload, MIME type) for an image file."""
+        original_bytes = image_path.stat().st_size
+        if not self.enabled:
+            mime_type = mimetypes.guess_type(image_path.name)[0]
+            if mime_type in UPLOADABLE_MIME_TYPES:
+                data = image_path.read_bytes()
+            else:
+                # BMP, TIFF, ... are rejected by the API, so they are converted even without preprocessing
+                data, _ = _encode(image_path, self.settings, resize=False)
+                mime_type = FORMAT_MIME_TYPES[self.settings["format"]]
+            self._record(original_bytes, len(data), cache_hit=False)
+            return data, mime_type
+
+        file_hash = extraction_cache.file_content_hash(image_path)
+        cached = self.cache.get_blob(file_hash, IMAGE_CACHE_METHOD, self.settings)
+        if cached is not None:
+            data, meta = cached
+            self._record(original_bytes, len(data), cache_hit=True)
+            return data, meta.get("mime_type", FORMAT_MIME_TYPES[self.settings["format"]])
+
+        data, rotated = _encode(image_path, self.settings)
+        mime_type = FORMAT_MIME_TYPES[self.settings["format"]]
+        original_mime_type = mimetypes.guess_type(image_path.name)[0]
+        if len(data) >= original_bytes and not rotated and original_mime_type in UPLOADABLE_MIME_TYPES:
+            # Already small (e.g. an optimized JPEG below the size limit): re-encoding would only lose quality
+            data, mime_type = image_path.read_bytes(), original_mime_type
+        self.cache.put_blob(file_hash, IMAGE_CACHE_METHOD, self.settings, data, image_path.name, mime_type=mime_type)
+        self._record(original_bytes, len(data), cache_hit=False)
+        return data, mime_type
+
+    def _record(self, original_bytes: int, upload_bytes: int, cache_hit: bool):
+        with self._lock:
+            self.stats["images"] += 1
+            self.stats["cache_hits"] += int(cache_hit)
+            self.stats["original_bytes"] += original_bytes
+            self.stats["upload_bytes"] += upload_bytes
+
+    def print_summary(self):
+        """Prints bytes and estimated upload time saved since the last reset."""
+        stats = self.stats
+        if not stats["images"]:
+            return
+        saved_bytes = stats["original_bytes"] - stats["upload_bytes"]
+        # Images are sent base64-encoded, which inflates the payload by 4/3
+        saved_seconds = saved_bytes * 4 / 3 * 8 / (self.upload_bandwidth_mbps * 1_000_000)
+        print("\n--- Image Preprocessing ---")
+        print(f"  Images: {stats['images']} ({stats['cache_hits']} from cache)")
+        print(f"  Original size: {stats['original_bytes'] / (1024 * 1024):.1f} MB, uploaded: {stats['upload_bytes'] / (1024 * 1024):.1f} MB")
+        print(f"  Saved: {saved_bytes / (1024 * 1024):.1f} MB (~{saved_seconds:.1f}s of upload time at {self.upload_bandwidth_mbps:g} Mbps)")
+        print("---------------------------")
@@ -0,0 +1,178 @@
+"""
+llm_cache.py
+Persistent on-disk cache for LLM chat completion responses.
+
+Responses are keyed by a SHA-256 of the model, system prompt, user prompt and request
+parameters. Entries expire after a TTL, the cache is capped in size (least recently used
+entries are evicted first), and hit/miss counters are kept for reporting. In replay-only
+mode a cache miss raises LLMCacheMiss instead of calling the API, so a pipeline can be
+re-run deterministically without network access.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from src.extraction_cache import resolve_path
+
+DEFAULT_CACHE_DIR = ".llm_cache"
+DEFAULT_TTL_HOURS = 168 # One week
+DEFAULT_MAX_CACHE_MB = 256
+EVICTION_TARGET_RATIO = 0.9
+REPLAY_ONLY_API_KEY = "replay-only" # Placeholder API key; no request leaves the process in replay-only mode
+
+_caches: Dict[Path, "LLMResponseCache"] = {}
+_caches_lock = threading.Lock()
+
+
+class LLMCacheMiss(RuntimeError):
+    """Raised in replay-only mode when a request has no cached response."""
+
+
+def request_key(model: str, system_prompt: str, user_prompt, params: Optional[Dict] = None) -> str:
+    """Returns the cache key for a chat completion request."""
+    payload = {
+        "model": model,
+        "system": system_prompt,
+        "user": user_prompt,
+        "params": params or {},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    def __init__(self, cache_dir: Path, ttl_seconds: float, max_bytes: int, enabled: bool = True, replay_only: bool = False):
+        self.cache_dir = Path(cache_dir)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.replay_only = replay_only
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Tuple[str, Optional[Dict]]]:
+        """Returns (content, usage dict) for a fresh cached response, or None. Counts hits and misses."""
+        entry = None
+        if self.enabled or self.replay_only:
+            entry_path = self._entry_path(key)
+            try:
+                with open(entry_path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                entry = None
+            # Replayed runs must be deterministic, so expiry is ignored in replay-only mode
+            if entry is not None and not self.replay_only and time.time() - entry.get("created_at", 0) > self.ttl_seconds:
+                entry_path.unlink(missing_ok=True)
+                entry = None
+            if entry is not None:
+                try:
+                    os.utime(entry_path, None) # Mark as recently used for LRU eviction
+                except OSError:
+                    pass
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if entry is None:
+            return None
+        return entry["content"], entry.get("usage")
+
+    def put(self, key: str, content: str, usage: Optional[Dict], model: str):
+        if not self.enabled:
+            return
+        entry_path = self._entry_path(key)
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = entry_path.with_name(f"{entry_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"model": model, "created_at": time.time(), "content": content, "usage": usage}, f)
+        os.replace(tmp_path, entry_path)
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_total_bytes()
+            else:
+                self._total_bytes += entry_path.stat().st_size
+            over_cap = self._total_bytes > self.max_bytes
+        if over_cap:
+            self.evict()
+
+    def _entries(self):
+        entries = []
+        if not self.cache_dir.is_dir():
+            return entries
+        for entry_path in self.cache_dir.glob("*/*.json"):
+            try:
+                stat = entry_path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+        return entries
+
+    def _scan_total_bytes(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self) -> int:
+        """Evicts least recently used responses until the cache is under its size cap."""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            target = int(self.max_bytes * EVICTION_TARGET_RATIO)
+            removed = 0
+            for _, size, entry_path in entries:
+                if total <= target:
+                    break
+                entry_path.unlink(missing_ok=True)
+                total -= size
+                removed += 1
+            self._total_bytes = total
+        if removed:
+            print(f"LLM cache: evicted {removed} least recently used responses.")
+        return removed
+
+    def clear(self):
+        with self._lock:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            self._total_bytes = 0
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "replay_only": self.replay_only,
+        }
+
+    def print_summary(self):
+        stats = self.stats()
+        if stats["hits"] or stats["misses"]:
+            mode = " (replay-only)" if self.replay_only else ""
+            print(f"LLM response cache{mode}: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)")
+
+
+def get_cache(config: Optional[Dict] = None) -> LLMResponseCache:
+    """Returns the shared response cache for the configured directory."""
+    config = config or {}
+    cache_dir = resolve_path(config.get("llm_cache_dir", DEFAULT_CACHE_DIR))
+    ttl_seconds = float(config.get("llm_cache_ttl_hours", DEFAULT_TTL_HOURS)) * 3600
+    max_bytes = int(float(config.get("llm_cache_max_mb", DEFAULT_MAX_CACHE_MB)) * 1024 * 1024)
+    enabled = bool(config.get("llm_cache_enabled", True))
+    replay_only = bool(config.get("llm_replay_only", False))
+    with _caches_lock:
+        cache = _caches.get(cache_dir)
+        if cache is None:
+            cache = LLMResponseCache(cache_dir, ttl_seconds, max_bytes, enabled, replay_only)
+            _caches[cache_dir] = cache
+        else:
+            cache.ttl_seconds, cache.max_bytes = ttl_seconds, max_bytes
+            cache.enabled, cache.replay_only = enabled, replay_only
+        return cache
@@ -1,22 +1,98 @@
 import os
 import json
+import random
+import sys
+import threading
+import time
 import openai
 import base64
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
 from pathlib import Path
-from datetime import datetime
-from typing import Optional, Dict, List, Any, Tuple
+from datetime import datetime, timezone
+from typing import Optional, Dict, List, Any, Tuple, TextIO, Callable
 from openai.types import CompletionUsage
 
+from src import llm_cache, telemetry
+from src.image_preprocessor import ImagePreprocessor
+
 PROMPT_DIR_ABS = Path(__file__).resolve().parent.parent / "prompts"
 PHOTO_DESC_PROMPT_FILENAME = "photo_description_prompt.txt"
 MAX_IMAGES_PER_BATCH = 5
+MULTIMODAL_MAX_CONCURRENCY = 4 # Image batches in flight at once
+MAX_RETRIES = 5 # Retries for rate-limited or transiently failing requests
+RETRY_BASE_DELAY_SECONDS = 1.0
+RETRY_MAX_DELAY_SECONDS = 60.0
+STREAM_RESPONSES = True # Stream proposal and photo description text to the console/output file as it is generated
+
+
+def format_usage(usage: CompletionUsage) -> str:
+    """Formats token usage, including prompt tokens served from the provider's prompt cache."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) or 0
+    return f"Prompt={usage.prompt_tokens} (cached {cached}), Completion={usage.completion_tokens}, Total={usage.total_tokens}"
+
+
+def _partial_path(path: Path) -> Path:
+    """Where streamed output is written until it is complete."""
+    return path.with_name(path.name + ".partial")
+
+
+class OrderedStreamWriter:
+    """
+    Writes text streamed by concurrent batches to the outputs in batch order.
+    Text from the batch currently being written goes straight through; batches that
+    run ahead are buffered until every earlier batch has finished.
+    """
+    def __init__(self, outputs: List[TextIO], separator: str = "\n\n"):
+        self.outputs = outputs
+        self.separator = separator
+        self._lock = threading.Lock()
+        self._current = 0
+        self._buffers: Dict[int, List[str]] = {}
+        self._finished = set()
+        self._started = set()
+
+    def _emit(self, index: int, text: str):
+        if index not in self._started:
+            if self._started:
+                text = self.separator + text
+            self._started.add(index)
+        for output in self.outputs:
+            output.write(text)
+            output.flush()
+
+    def write(self, index: int, text: str):
+        with self._lock:
+            if index == self._current:
+                self._emit(index, text)
+            else:
+                self._buffers.setdefault(index, []).append(text)
+
+    def finish(self, index: int):
+        """Marks a batch as complete and releases the buffered text of the batches after it."""
+        with self._lock:
+            self._finished.add(index)
+            while self._current in self._finished:
+                self._current += 1
+                pending = self._buffers.pop(self._current, None)
+                if pending:
+                    self._emit(self._current, "".join(pending))
+
 
 class LLMService:
     def __init__(self, api_key: str, config: Dict):
         if not api_key:
             raise ValueError("OpenAI API key is required.")
-        self.client = openai.OpenAI(api_key=api_key)
+        # openai_base_url points the client at any OpenAI-compatible server (e.g. the local benchmark stub)
+        self.client = openai.OpenAI(api_key=api_key, base_url=config.get("openai_base_url") or None)
         self.config = config
+        self.image_preprocessor = ImagePreprocessor(config)
+        self.response_cache = llm_cache.get_cache(config)
+        self.stream_responses = bool(config.get("stream_responses", STREAM_RESPONSES))
+        self.latency_log: List[Dict] = [] # One entry per streamed call: label, time to first token, total latency
+        self._latency_lock = threading.Lock()
         self._load_prompts()
 
     def _load_prompts(self):
@@ -65,21 +141,56 @@ class LLMService:
         with open(file_path, 'r', encoding='utf-8') as f:
             return f.read()
 
-    def _call_openai_api(self, system_prompt: str, user_prompt: str, model: str) -> Optional[Tuple[str, CompletionUsage]]:
-        """Helper function to call the OpenAI Chat Completion API. Returns content and usage."""
+    def _call_openai_api(self, system_prompt: str, user_prompt: str, model: str,
+                         stream_outputs: Optional[List[TextIO]] = None, **params) -> Optional[Tuple[str, CompletionUsage]]:
+        """
+        Helper function to call the OpenAI Chat Completion API. Returns content and usage.
+        Responses are served from the on-disk response cache when possible; in replay-only
+        mode a cache miss raises llm_cache.LLMCacheMiss instead of calling the API.
+        Extra keyword arguments are passed through to the API and are part of the cache key.
+        If stream_outputs is given, the response is streamed and written to each output as it arrives.
+        """
+        with telemetry.span("llm_call", model=model) as span:
+            span.add(bytes=len(system_prompt) + len(str(user_prompt)))
+            content, usage = self._request_completion(system_prompt, user_prompt, model, stream_outputs, **params)
+            telemetry.add_usage(span, usage)
+            return content, usage
+
+    def _request_completion(self, system_prompt: str, user_prompt: str, model: str,
+                            stream_outputs: Optional[List[TextIO]] = None, **params) -> Optional[Tuple[str, CompletionUsage]]:
+        """Serves a completion from the response cache or the API (see _call_openai_api)."""
+        cache_key = llm_cache.request_key(model, system_prompt, user_prompt, params)
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            content, usage_dict = cached
+            print("Using cached LLM response.")
+            telemetry.annotate(cache_hit=True)
+            for output in stream_outputs or []:
+                output.write(content)
+                output.flush()
+            return content, CompletionUsage(**usage_dict) if usage_dict else None
+        if self.response_cache.replay_only:
+            raise llm_cache.LLMCacheMiss(f"No cached LLM response for this request (model={model}); replay-only mode forbids API calls.")
+
         try:
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ]
-            )
-            content = response.choices[0].message.content
-            usage = response.usage
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ]
+            if stream_outputs:
+                def write(text):
+                    for output in stream_outputs:
+                        output.write(text)
+                        output.flush()
+                content, usage = self._stream_completion("completion", write, model=model, messages=messages, **params)
+            else:
+                response = self.client.chat.completions.create(model=model, messages=messages, **params)
+                content = response.choices[0].message.content
+                usage = response.usage
             if not content or not content.strip():
                  print("Warning: OpenAI API returned empty content.")
                  return None, usage
+            self.response_cache.put(cache_key, content, usage.model_dump() if usage else None, model)
             return content, usage
         except openai.APIConnectionError as e:
             print(f"OpenAI API Connection Error: {e}")
@@ -113,7 +224,7 @@ class LLMService:
         if template_with_vars:
             print("Successfully created template structure.")
             if usage:
-                print(f"  Token Usage: Prompt={usage.prompt_tokens}, Completion={usage.completion_tokens}, Total={usage.total_tokens}")
+                print(f"  Token Usage: {format_usage(usage)}")
         else:
             print("Error: Failed to create template structure from LLM.")
         return template_with_vars, usage
@@ -152,7 +263,7 @@ class LLMService:
             json.loads(extracted_info_json.strip()) # Try parsing
             print("Successfully extracted required information as valid JSON.")
             if usage:
-                print(f"  Token Usage: Prompt={usage.prompt_tokens}, Completion={usage.completion_tokens}, Total={usage.total_tokens}")
+                print(f"  Token Usage: {format_usage(usage)}")
             return extracted_info_json.strip(), usage
         except json.JSONDecodeError:
             print("Error: LLM response for extracted information is not valid JSON.")
@@ -161,8 +272,12 @@ class LLMService:
             print("--- LLM Response End ---")
             return None, usage
 
-    def generate_final_proposal(self, template_with_vars: str, extracted_info_json: str) -> Optional[Tuple[str, CompletionUsage]]:
-        """Generates the final proposal by filling the template. Returns markdown string and usage."""
+    def generate_final_proposal(self, template_with_vars: str, extracted_info_json: str,
+                                output_path: Optional[Path] = None) -> Optional[Tuple[str, CompletionUsage]]:
+        """
+        Generates the final proposal by filling the template. Returns markdown string and usage.
+        With streaming enabled the proposal is written to the console (and output_path, if given) as it is generated.
+        """
         print("\nStep 3: Generating final proposal...")
         user_prompt = self.prompts["final_generation_user"].format(
             template_with_vars=template_with_vars,
@@ -170,114 +285,271 @@ class LLMService:
         )
 
         model = self.config.get("openai_model", "gpt-4o")
-        final_proposal, usage = self._call_openai_api(
-            self.prompts["final_generation_system"],
-            user_prompt,
-            model
-        )
+        # The stream goes to a partial file that replaces output_path only once the proposal is complete
+        stream_path = _partial_path(output_path) if output_path and self.stream_responses else None
+        output_file = open(stream_path, "w", encoding="utf-8") if stream_path else None
+        final_proposal, usage = None, None
+        try:
+            final_proposal, usage = self._call_openai_api(
+                self.prompts["final_generation_system"],
+                user_prompt,
+                model,
+                stream_outputs=[sys.stdout] + ([output_file] if output_file else []) if self.stream_responses else None
+            )
+        finally:
+            if output_file:
+                output_file.close()
+                if final_proposal:
+                    os.replace(stream_path, output_path)
+                else:
+                    stream_path.unlink(missing_ok=True)
+        if final_proposal and output_path and not self.stream_responses:
+            with open(output_path, "w", encoding="utf-8") as f:
+                f.write(final_proposal)
         if final_proposal:
              print(f"Successfully generated final proposal content (Length: {len(final_proposal)}).")
              if usage:
-                 print(f"  Token Usage: Prompt={usage.prompt_tokens}, Completion={usage.completion_tokens}, Total={usage.total_tokens}")
+                 print(f"  Token Usage: {format_usage(usage)}")
         else:
              print("Error: Failed to generate final proposal from LLM.")
              
         return final_proposal, usage 
 
-    def _encode_image_to_base64(self, image_path: Path) -> Optional[str]:
-        """Reads an image file and encodes it to Base64."""
+    def _encode_image_to_base64(self, image_path: Path) -> Optional[Tuple[str, str]]:
+        """Downscales/re-encodes an image file and encodes it to Base64. Returns (base64 data, MIME type)."""
         try:
             print(f"Encoding image: {image_path.name}")
-            # Consider adding resizing logic here if needed
-            with open(image_path, "rb") as image_file:
-                return base64.b64encode(image_file.read()).decode('utf-8')
+            image_bytes, mime_type = self.image_preprocessor.prepare(image_path)
+            return base64.b64encode(image_bytes).decode('utf-8'), mime_type
         except FileNotFoundError:
             print(f"Warning: Image file not found during encoding: {image_path}")
         except Exception as e:
             print(f"Warning: Error encoding image {image_path.name}: {e}")
         return None
 
+    @staticmethod
+    def _retry_after_seconds(error: Exception) -> Optional[float]:
+        """Returns the server-requested retry delay from a rate-limit/status error, if any."""
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None)
+        if not headers:
+            return None
+        try:
+            if headers.get("retry-after-ms"):
+                return float(headers["retry-after-ms"]) / 1000
+            retry_after = headers.get("retry-after")
+            if not retry_after:
+                return None
+            try:
+                return float(retry_after)
+            except ValueError:
+                # retry-after may also be an HTTP date
+                return max(0.0, (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds())
+        except Exception:
+            return None
+
+    def _create_completion_with_retries(self, label: str, **request_kwargs):
+        """
+        Calls chat.completions.create, retrying rate-limit, connection and server errors with
+        exponential backoff (honoring retry-after). Re-raises the last error once retries are exhausted.
+        """
+        max_retries = int(self.config.get("max_retries", MAX_RETRIES))
+        # Retries are handled here, so disable the client's own retry loop for these calls
+        client = self.client.with_options(max_retries=0)
+        attempt = 0
+        while True:
+            try:
+                return client.chat.completions.create(**request_kwargs)
+            except (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError) as e:
+                if attempt >= max_retries:
+                    raise
+                delay = self._retry_after_seconds(e)
+                if delay is None:
+                    delay = RETRY_BASE_DELAY_SECONDS * (2 ** attempt) * (1 + random.random() * 0.25)
+                delay = min(delay, RETRY_MAX_DELAY_SECONDS)
+                attempt += 1
+                print(f"{type(e).__name__} during {label}; retrying in {delay:.1f}s (attempt {attempt}/{max_retries})...")
+                time.sleep(delay)
+
+    def _stream_completion(self, label: str, write: Callable[[str], None], **request_kwargs) -> Tuple[str, Optional[CompletionUsage]]:
+        """
+        Streams a chat completion, passing each piece of text to write() as it arrives.
+        Returns the full content and the usage reported in the final chunk, and records
+        time to first token and total latency in latency_log.
+        """
+        start = time.perf_counter()
+        first_token_seconds = None
+        parts = []
+        usage = None
+        stream = self._create_completion_with_retries(label, stream=True, stream_options={"include_usage": True}, **request_kwargs)
+        for chunk in stream:
+            if chunk.usage:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if text:
+                if first_token_seconds is None:
+                    first_token_seconds = time.perf_counter() - start
+                parts.append(text)
+                write(text)
+        total_seconds = time.perf_counter() - start
+        with self._latency_lock:
+            self.latency_log.append({"label": label, "ttft_seconds": first_token_seconds, "total_seconds": total_seconds})
+        telemetry.annotate(streamed=True, ttft_seconds=first_token_seconds)
+        ttft = f"{first_token_seconds:.2f}s" if first_token_seconds is not None else "n/a"
+        print(f"\n  Latency ({label}): first token {ttft}, total {total_seconds:.2f}s")
+        return "".join(parts), usage
+
+    def _send_image_batch(self,
+            batch_number: int,
+            total_batches: int,
+            system_prompt: str,
+            user_text_prompt: str,
+            batch_image_paths: List[Path],
+            model: str,
+            stream_writer: Optional[OrderedStreamWriter] = None
+    ) -> Tuple[Optional[str], Optional[CompletionUsage]]:
+        """
+        Encodes and sends one batch of images. Returns the description part and usage.
+        With a stream_writer the description is streamed into it as it is generated.
+        """
+        print(f"\nProcessing image batch {batch_number}/{total_batches} ({len(batch_image_paths)} images)...")
+
+        messages: List[Dict[str, Any]] = [
+            {"role": "system", "content": system_prompt}
+        ]
+        user_content: List[Dict[str, Any]] = []
+
+        # Add user text prompt
+        current_user_prompt = user_text_prompt + f"\n\nImages for this batch ({batch_number}):"
+        user_content.append({"type": "text", "text": current_user_prompt})
+
+        # Add image parts for the current batch
+        encoded_image_count = 0
+        image_digests = [] # The cache key uses content hashes of the prepared images, not the base64 payload
+        for img_path in batch_image_paths:
+            encoded_image = self._encode_image_to_base64(img_path)
+            if encoded_image:
+                base64_image, mime_type = encoded_image
+                image_digests.append(f"{mime_type}:{hashlib.sha256(base64_image.encode('ascii')).hexdigest()}")
+                telemetry.add(bytes=len(base64_image))
+                user_content.append({
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:{mime_type};base64,{base64_image}" 
+                    }
+                })
+                encoded_image_count += 1
+            else:
+                print(f"Skipping image {img_path.name} due to encoding error.")
+
+        if encoded_image_count == 0:
+            print(f"No images successfully encoded for batch {batch_number}. Skipping API call.")
+            return None, None
+
+        messages.append({"role": "user", "content": user_content})
+        max_tokens = 3000 # Adjust as needed for description length
+
+        cache_key = llm_cache.request_key(model, system_prompt, [current_user_prompt, image_digests], {"max_tokens": max_tokens})
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            content, usage_dict = cached
+            print(f"Using cached description for batch {batch_number}.")
+            telemetry.annotate(cache_hit=True)
+            if stream_writer is not None:
+                stream_writer.write(batch_number - 1, content)
+            return content.strip(), CompletionUsage(**usage_dict) if usage_dict else None
+        if self.response_cache.replay_only:
+            raise llm_cache.LLMCacheMiss(f"No cached LLM response for image batch {batch_number} (model={model}); replay-only mode forbids API calls.")
+
+        try:
+            print(f"Sending batch {batch_number} to OpenAI API ({encoded_image_count} images)...")
+            request_kwargs = dict(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens
+            )
+            if stream_writer is not None:
+                content, usage = self._stream_completion(
+                    f"image batch {batch_number}", lambda text: stream_writer.write(batch_number - 1, text), **request_kwargs
+                )
+            else:
+                response = self._create_completion_with_retries(f"image batch {batch_number}", **request_kwargs)
+                content = response.choices[0].message.content
+                usage = response.usage
+
+            if content:
+                print(f"Received description part for batch {batch_number}.")
+                self.response_cache.put(cache_key, content, usage.model_dump() if usage else None, model)
+                if usage:
+                    print(f"  Token Usage (Batch {batch_number}): {format_usage(usage)}")
+                return content.strip(), usage
+            print(f"Warning: OpenAI API returned empty content for batch {batch_number}.")
+            return None, usage
+
+        except openai.APIConnectionError as e:
+            print(f"OpenAI API Connection Error during batch {batch_number}: {e}")
+        except openai.RateLimitError as e:
+            print(f"OpenAI API Rate Limit Error during batch {batch_number} (retries exhausted): {e}")
+        except openai.APIStatusError as e:
+            print(f"OpenAI API Status Error during batch {batch_number}: {e.status_code} - {e.response}")
+        except Exception as e:
+            if "content length" in str(e).lower() or "request entity too large" in str(e).lower():
+                print(f"Error: API request failed for batch {batch_number}, likely due to large image sizes or too many images per batch. {e}")
+                print(f"Suggestion: Try reducing MAX_IMAGES_PER_BATCH (currently {len(batch_image_paths)}).")
+            else:
+                print(f"An unexpected error occurred calling OpenAI API for batch {batch_number}: {e}")
+        return None, None
+
     def _call_openai_multimodal_api(self,
             system_prompt: str, 
             user_text_prompt: str, 
             image_paths: List[Path], 
             model: str,
-            max_images_per_call: int = MAX_IMAGES_PER_BATCH
+            max_images_per_call: int = MAX_IMAGES_PER_BATCH,
+            max_concurrency: Optional[int] = None,
+            stream_writer: Optional[OrderedStreamWriter] = None
     ) -> Tuple[Optional[str], Optional[CompletionUsage]]:
-        """Calls OpenAI API with text and a list of images (handling multiple batches if necessary)."""
-        
-        all_content_parts = []
-        total_usage_dict = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
-        
-        # Process images in batches
-        for i in range(0, len(image_paths), max_images_per_call):
-            batch_image_paths = image_paths[i:i + max_images_per_call]
-            print(f"\nProcessing image batch {i // max_images_per_call + 1}/{ (len(image_paths) + max_images_per_call - 1)// max_images_per_call } ({len(batch_image_paths)} images)...")
-            
-            messages: List[Dict[str, Any]] = [
-                {"role": "system", "content": system_prompt}
-            ]
-            user_content: List[Dict[str, Any]] = []
-            
-            # Add user text prompt
-            current_user_prompt = user_text_prompt + f"\n\nImages for this batch ({i // max_images_per_call + 1}):"
-            user_content.append({"type": "text", "text": current_user_prompt})
-
-            # Add image parts for the current batch
-            encoded_image_count = 0
-            for img_path in batch_image_paths:
-                base64_image = self._encode_image_to_base64(img_path)
-                if base64_image:
-                    user_content.append({
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_image}" 
-                        }
-                    })
-                    encoded_image_count += 1
-                else:
-                    print(f"Skipping image {img_path.name} due to encoding error.")
-            
-            if encoded_image_count == 0:
-                print("No images successfully encoded for this batch. Skipping API call.")
-                continue
-            
-            messages.append({"role": "user", "content": user_content})
-            
+        """
+        Calls OpenAI API with text and a list of images, splitting them into batches.
+        Up to max_concurrency batches are in flight at once; descriptions are combined in batch order
+        (and streamed in batch order when a stream_writer is given).
+        """
+        if max_concurrency is None:
+            max_concurrency = int(self.config.get("multimodal_max_concurrency", MULTIMODAL_MAX_CONCURRENCY))
+        batches = [image_paths[i:i + max_images_per_call] for i in range(0, len(image_paths), max_images_per_call)]
+        if not batches:
+            return None, None
+
+        def send(indexed_batch):
+            index, batch_image_paths = indexed_batch
             try:
-                print(f"Sending batch {i // max_images_per_call + 1} to OpenAI API ({encoded_image_count} images)...")
-                response = self.client.chat.completions.create(
-                    model=model,
-                    messages=messages,
-                    max_tokens=3000 # Adjust as needed for description length
-                )
-                content = response.choices[0].message.content
-                usage = response.usage
+                with telemetry.span("llm_image_batch", model=model, batch=index + 1, images=len(batch_image_paths)) as span:
+                    content, usage = self._send_image_batch(index + 1, len(batches), system_prompt, user_text_prompt, batch_image_paths, model, stream_writer)
+                    telemetry.add_usage(span, usage)
+                    return content, usage
+            finally:
+                if stream_writer is not None:
+                    stream_writer.finish(index)
 
-                if content:
-                    all_content_parts.append(content.strip())
-                    print(f"Received description part for batch {i // max_images_per_call + 1}.")
-                    if usage:
-                        print(f"  Token Usage (Batch): Prompt={usage.prompt_tokens}, Completion={usage.completion_tokens}, Total={usage.total_tokens}")
-                        total_usage_dict["prompt_tokens"] += usage.prompt_tokens
-                        total_usage_dict["completion_tokens"] += usage.completion_tokens
-                        total_usage_dict["total_tokens"] += usage.total_tokens
-                else:
-                    print(f"Warning: OpenAI API returned empty content for batch {i // max_images_per_call + 1}.")
-
-            except openai.APIConnectionError as e:
-                print(f"OpenAI API Connection Error during batch {i // max_images_per_call + 1}: {e}")
-            except openai.RateLimitError as e:
-                print(f"OpenAI API Rate Limit Error during batch {i // max_images_per_call + 1}: {e}")
-            except openai.APIStatusError as e:
-                print(f"OpenAI API Status Error during batch {i // max_images_per_call + 1}: {e.status_code} - {e.response}")
-            except Exception as e:
-                if "content length" in str(e).lower() or "request entity too large" in str(e).lower():
-                    print(f"Error: API request failed for batch {i // max_images_per_call + 1}, likely due to large image sizes or too many images per batch. {e}")
-                    print(f"Suggestion: Try reducing MAX_IMAGES_PER_BATCH (currently {max_images_per_call}).")
-                else:
-                    print(f"An unexpected error occurred calling OpenAI API for batch {i // max_images_per_call + 1}: {e}")
-            # Continue to next batch even if one fails
+        workers = max(1, min(max_concurrency, len(batches)))
+        print(f"Dispatching {len(batches)} image batches with up to {workers} in flight...")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # map() returns results in batch order regardless of completion order
+            results = list(executor.map(telemetry.wrap(send), enumerate(batches)))
+
+        all_content_parts = []
+        total_usage_dict = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        cached_tokens = 0
+        for content, usage in results:
+            if content:
+                all_content_parts.append(content)
+            if usage:
+                total_usage_dict["prompt_tokens"] += usage.prompt_tokens
+                total_usage_dict["completion_tokens"] += usage.completion_tokens
+                total_usage_dict["total_tokens"] += usage.total_tokens
+                cached_tokens += getattr(usage.prompt_tokens_details, "cached_tokens", None) or 0
 
         if not all_content_parts:
             return None, None
@@ -286,7 +558,7 @@ class LLMService:
         final_content = "\n\n".join(all_content_parts)
         
         # Create a pseudo-Usage object for the total
-        final_usage = CompletionUsage(**total_usage_dict)
+        final_usage = CompletionUsage(**total_usage_dict, prompt_tokens_details={"cached_tokens": cached_tokens})
 
         return final_content, final_usage
 
@@ -304,13 +576,25 @@ class LLMService:
             
         model = self.config.get("openai_model", "gpt-4o")
 
-        generated_description, total_usage = self._call_openai_multimodal_api(
-            system_prompt=self.prompts["photo_description_system"],
-            user_text_prompt=self.prompts["photo_description_user"],
-            image_paths=image_paths,
-            model=model,
-            max_images_per_call=MAX_IMAGES_PER_BATCH
-        )
+        output_path = target_folder / "_photo_inventory_description.txt"
+        self.image_preprocessor.reset_stats()
+        # Streamed batches are written to the console and a partial description file in batch order as they
+        # arrive; the file is removed afterwards and the description saved only if generation succeeded
+        stream_path = _partial_path(output_path)
+        output_file = open(stream_path, "w", encoding="utf-8") if self.stream_responses else None
+        try:
+            generated_description, total_usage = self._call_openai_multimodal_api(
+                system_prompt=self.prompts["photo_description_system"],
+                user_text_prompt=self.prompts["photo_description_user"],
+                image_paths=image_paths,
+                model=model,
+                max_images_per_call=MAX_IMAGES_PER_BATCH,
+                stream_writer=OrderedStreamWriter([sys.stdout, output_file]) if output_file else None
+            )
+        finally:
+            if output_file:
+                output_file.close()
+                stream_path.unlink(missing_ok=True)
 
         # Report total usage
         if total_usage:
@@ -319,10 +603,10 @@ class LLMService:
             print(f"  Completion: {total_usage.completion_tokens}")
             print(f"  Total: {total_usage.total_tokens}")
             print("--------------------------------------------------------")
+        self.image_preprocessor.print_summary()
 
-        # Save the result
+        # Save the result (not the streamed text, which may include output of failed batches)
         if generated_description:
-            output_path = target_folder / "_photo_inventory_description.txt"
             try:
                 with open(output_path, "w", encoding="utf-8") as f:
                     f.write(generated_description)
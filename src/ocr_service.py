@@ -1,10 +1,94 @@
-import pytesseract
-from pdf2image import convert_from_path
-from PIL import Image
+import multiprocessing
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from src import extraction_cache, page_preprocessor, telemetry
+
+OCR_DPI = 200 # pdf2image default rasterization resolution
+OCR_LANG = "eng"
+OCR_GRAYSCALE = False
+OCR_WORKERS = 1 # 1 = serial OCR in this process; 0 = one worker per CPU core
+OCR_MAX_RASTER_MB = 256 # Upper bound on rasterized page images held in memory at once
+DEFAULT_PAGE_SIZE_PTS = (612.0, 792.0) # US Letter, used when pdfinfo cannot report a page size
+RASTER_OVERHEAD_FACTOR = 2 # pdf2image briefly holds the raw PPM data alongside each decoded image
+# pytesseract, pdf2image and PIL are imported inside the functions that OCR, so importing this
+# module (e.g. for get_ocr_settings) does not load them.
+OCR_DEPENDENCIES = {
+    "tesseract": "Tesseract OCR (Install via: brew install tesseract OR sudo apt-get install tesseract-ocr)",
+    "pdftoppm": "Poppler (Install via: brew install poppler OR sudo apt-get install poppler-utils)",
+}
+
+_missing_ocr_dependencies: Optional[List[str]] = None
+# Held while a document is rasterized and OCR'd. process_folder extracts files in threads, so this
+# keeps one raster budget (ocr_max_raster_mb) and one OCR worker pool for the whole process.
+_ocr_slot = threading.Lock()
+
+def check_ocr_dependencies() -> List[str]:
+    """
+    Checks once per process that the Tesseract and Poppler binaries are on the PATH, printing
+    install hints the first time something is missing. Returns the missing dependencies.
+    """
+    global _missing_ocr_dependencies
+    if _missing_ocr_dependencies is None:
+        _missing_ocr_dependencies = [hint for binary, hint in OCR_DEPENDENCIES.items() if not shutil.which(binary)]
+        if _missing_ocr_dependencies:
+            print("\n--- ERROR: Missing External Dependencies for OCR ---", file=sys.stderr)
+            for dep in _missing_ocr_dependencies:
+                print(f" - {dep}", file=sys.stderr)
+            print("Scanned pages and images cannot be OCR'd until these are installed and in your system PATH.", file=sys.stderr)
+            print("-----------------------------------------------------", file=sys.stderr)
+    return _missing_ocr_dependencies
+
+def get_ocr_settings(config: Optional[Dict] = None) -> Dict:
+    """Returns the settings that influence OCR output (also used as part of the cache key)."""
+    config = config or {}
+    return {
+        "dpi": config.get("ocr_dpi", OCR_DPI),
+        "lang": config.get("ocr_lang", OCR_LANG),
+        "grayscale": bool(config.get("ocr_grayscale", OCR_GRAYSCALE)),
+        "pages": page_preprocessor.get_page_settings(config),
+    }
+
+def get_ocr_workers(config: Optional[Dict] = None) -> int:
+    """Returns the number of OCR worker processes to use."""
+    workers = int((config or {}).get("ocr_workers", OCR_WORKERS))
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+def get_max_raster_bytes(config: Optional[Dict] = None) -> int:
+    """Returns the configured cap on memory used by rasterized pages."""
+    return int(float((config or {}).get("ocr_max_raster_mb", OCR_MAX_RASTER_MB)) * 1024 * 1024)
+
+def estimate_page_raster_bytes(pdf_path: Path, settings: Dict) -> int:
+    """Estimates the memory needed to rasterize one page at the configured DPI and color mode."""
+    from pdf2image import pdfinfo_from_path
+    width_pts, height_pts = DEFAULT_PAGE_SIZE_PTS
+    try:
+        # pdfinfo reports e.g. "612 x 792 pts (letter)" for the first page
+        size_parts = str(pdfinfo_from_path(str(pdf_path)).get("Page size", "")).split()
+        width_pts, height_pts = float(size_parts[0]), float(size_parts[2])
+    except Exception:
+        pass
+    channels = 1 if settings.get("grayscale") else 3
+    width_px = width_pts / 72 * settings["dpi"]
+    height_px = height_pts / 72 * settings["dpi"]
+    return int(width_px * height_px * channels * RASTER_OVERHEAD_FACTOR)
+
+def _raster_window_pages(pdf_path: Path, settings: Dict, max_raster_bytes: int) -> int:
+    """Number of pages that can be rasterized at once without exceeding the memory cap."""
+    return max(1, max_raster_bytes // max(1, estimate_page_raster_bytes(pdf_path, settings)))
 
 def extract_text_from_image(image_path: Path):
     """Perform OCR on an image file."""
+    import pytesseract
+    from PIL import Image
     try:
         with Image.open(image_path) as img:
             text = pytesseract.image_to_string(img)
@@ -18,32 +102,212 @@ def extract_text_from_image(image_path: Path):
         print(f"Error performing OCR on image {image_path.name}: {e}")
         return None # Return None on other image processing errors
 
-def extract_text_from_pdf_pages(pdf_path: Path):
-    """Convert PDF pages to images and perform OCR on each page."""
-    extracted_text = ""
+def _print_page_preview(page_number: int, page_text: str):
+    if page_text.strip():
+        preview = page_text.strip().replace("\n", " ")[:100]
+        print(f"  Preview of OCR text (Page {page_number}): {preview}...")
+    else:
+        print(f"  No text detected on page {page_number}")
+
+def _ocr_page_image(image, settings: Dict) -> Tuple[str, Dict]:
+    """
+    Runs the page filter and preprocessing, then Tesseract unless the page is skipped.
+    Returns (text, page report); skipped pages return "" and OCR time is recorded in the report.
+    """
+    import pytesseract
+    prepared, report = page_preprocessor.prepare_page(image, settings["pages"])
+    if prepared is None:
+        return "", report
+    ocr_start = time.perf_counter()
+    page_text = pytesseract.image_to_string(prepared, lang=settings["lang"]) or ""
+    report["ocr_seconds"] = time.perf_counter() - ocr_start
+    return page_text, report
+
+def _ocr_pdf_page_worker(pdf_path_str: str, page_number: int, settings: Dict) -> Tuple[int, Optional[str], Optional[str], float, Dict]:
+    """
+    Rasterizes and OCRs a single PDF page. Runs in a worker process, so it receives
+    only picklable arguments and rasterizes the page itself instead of receiving an image.
+    Returns (page_number, text, error, elapsed_seconds, page_report); error is "tesseract_missing"
+    if Tesseract is not installed.
+    """
+    import pytesseract
+    from pdf2image import convert_from_path
+    start = time.perf_counter()
     try:
+        images = convert_from_path(pdf_path_str, dpi=settings["dpi"], grayscale=settings["grayscale"], first_page=page_number, last_page=page_number)
+        if not images:
+            return page_number, None, "Page could not be rasterized.", time.perf_counter() - start, {}
+        page_text, report = _ocr_page_image(images[0], settings)
+        return page_number, page_text, None, time.perf_counter() - start, report
+    except pytesseract.TesseractNotFoundError:
+        return page_number, None, "tesseract_missing", time.perf_counter() - start, {}
+    except Exception as e:
+        return page_number, None, str(e), time.perf_counter() - start, {}
+
+def _page_windows(page_numbers: List[int], window_pages: int) -> List[Tuple[int, int]]:
+    """Groups sorted page numbers into contiguous (first_page, last_page) windows of at most window_pages pages."""
+    windows: List[Tuple[int, int]] = []
+    for page_number in sorted(page_numbers):
+        if windows and page_number == windows[-1][1] + 1 and page_number - windows[-1][0] < window_pages:
+            windows[-1] = (windows[-1][0], page_number)
+        else:
+            windows.append((page_number, page_number))
+    return windows
+
+def _ocr_pages_serial(pdf_path: Path, page_numbers: List[int], total_pages: int, settings: Dict, window_pages: int) -> Tuple[Dict[int, Optional[str]], Dict[int, Dict]]:
+    """
+    OCRs the given pages in this process, rasterizing at most window_pages pages at a time
+    so memory stays bounded on large scans. Returns ({page_number: text or None on error},
+    {page_number: page report}).
+    """
+    import pytesseract
+    from pdf2image import convert_from_path
+    page_texts: Dict[int, Optional[str]] = {}
+    page_reports: Dict[int, Dict] = {}
+    for first_page, last_page in _page_windows(page_numbers, window_pages):
         # Check if poppler is installed (pdf2image dependency)
-        images = convert_from_path(str(pdf_path))
-        print(f"Converted {pdf_path.name} to {len(images)} images for OCR.")
-        for i, image in enumerate(images):
-            print(f"Processing page {i+1}/{len(images)} with OCR...")
+        images = convert_from_path(str(pdf_path), dpi=settings["dpi"], grayscale=settings["grayscale"], first_page=first_page, last_page=last_page)
+        print(f"Converted pages {first_page}-{last_page} of {pdf_path.name} to {len(images)} images for OCR.")
+        for page_number, image in zip(range(first_page, last_page + 1), images):
+            print(f"Processing page {page_number}/{total_pages} with OCR...")
+            page_start = time.perf_counter()
             try:
-                # Use pytesseract to do OCR on the image
-                page_text = pytesseract.image_to_string(image) or ""
-                extracted_text += page_text + "\n\n" # Add newline between pages
-                if page_text.strip():
-                    preview = page_text.strip().replace("\n", " ")[:100]
-                    print(f"  Preview of OCR text (Page {i+1}): {preview}...")
+                # Skip blank/photo pages, clean up the rest and OCR it with pytesseract
+                page_text, report = _ocr_page_image(image, settings)
+                page_texts[page_number] = page_text
+                page_reports[page_number] = report
+                telemetry.record("ocr_page", time.perf_counter() - page_start, page=page_number, bytes=len(page_text),
+                                 **({"skipped": report["skipped"]} if report.get("skipped") else {}))
+                if report.get("skipped"):
+                    print(f"  Skipped OCR of page {page_number}: {report['skipped']} page.")
                 else:
-                    print(f"  No text detected on page {i+1}")
+                    _print_page_preview(page_number, page_text)
             except pytesseract.TesseractNotFoundError:
                 print("Error: Tesseract is not installed or not in your PATH. OCR will not function.")
                 raise # Stop execution if Tesseract is missing
             except Exception as page_e:
-                print(f"  Error performing OCR on page {i+1} of {pdf_path.name}: {page_e}")
+                print(f"  Error performing OCR on page {page_number} of {pdf_path.name}: {page_e}")
                 # Continue to the next page even if one page fails
-                extracted_text += f"[OCR Error on Page {i+1}]\n\n"
-                
+                page_texts[page_number] = None
+        # Release the window's images before rasterizing the next one
+        for image in images:
+            image.close()
+        del images
+    return page_texts, page_reports
+
+def _ocr_pages_parallel(pdf_path: Path, page_numbers: List[int], total_pages: int, settings: Dict, workers: int) -> Tuple[Dict[int, Optional[str]], float, Dict[int, Dict]]:
+    """
+    OCRs the given pages across a process pool. Returns ({page_number: text or None on error},
+    sum of per-page OCR seconds, {page_number: page report}); the sum is an estimate of the serial run time.
+    """
+    page_texts: Dict[int, Optional[str]] = {}
+    page_reports: Dict[int, Dict] = {}
+    serial_seconds = 0.0
+    # Workers are spawned rather than forked: the pool may be started from an ingest thread
+    with ProcessPoolExecutor(max_workers=min(workers, len(page_numbers)), mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = [executor.submit(_ocr_pdf_page_worker, str(pdf_path), n, settings) for n in page_numbers]
+        for future in as_completed(futures):
+            page_number, page_text, error, elapsed, report = future.result()
+            serial_seconds += elapsed
+            if error == "tesseract_missing":
+                print("Error: Tesseract is not installed or not in your PATH. OCR will not function.")
+                for pending in futures:
+                    pending.cancel()
+                import pytesseract
+                raise pytesseract.TesseractNotFoundError()
+            print(f"Finished OCR of page {page_number}/{total_pages} ({elapsed:.1f}s).")
+            telemetry.record("ocr_page", elapsed, page=page_number, bytes=len(page_text or ""), **({"error": error} if error else {}),
+                             **({"skipped": report["skipped"]} if report.get("skipped") else {}))
+            if error:
+                print(f"  Error performing OCR on page {page_number} of {pdf_path.name}: {error}")
+                page_texts[page_number] = None
+            else:
+                if report.get("skipped"):
+                    print(f"  Skipped OCR of page {page_number}: {report['skipped']} page.")
+                else:
+                    _print_page_preview(page_number, page_text)
+                page_texts[page_number] = page_text
+                page_reports[page_number] = report
+    return page_texts, serial_seconds, page_reports
+
+def ocr_pdf_pages(pdf_path: Path, page_numbers: Optional[List[int]] = None, config: Optional[Dict] = None, total_pages: Optional[int] = None) -> Dict[int, Optional[str]]:
+    """
+    OCRs the requested pages (1-based; all pages when None) of a PDF, reusing cached pages.
+    Returns {page_number: text}, with None for pages where OCR failed.
+    Raises RuntimeError if Tesseract or Poppler is missing (and pages are not all cached).
+    """
+    settings = get_ocr_settings(config)
+    workers = get_ocr_workers(config)
+    cache = extraction_cache.get_cache(config)
+    file_hash = extraction_cache.file_content_hash(pdf_path)
+    cached_page_count, cached_pages = cache.lookup(file_hash, "ocr", settings)
+    if total_pages is None:
+        total_pages = cached_page_count
+    if total_pages is None:
+        if check_ocr_dependencies(): # pdfinfo is part of Poppler
+            raise RuntimeError("OCR dependencies are missing.")
+        from pdf2image import pdfinfo_from_path
+        total_pages = int(pdfinfo_from_path(str(pdf_path))["Pages"])
+    if page_numbers is None:
+        page_numbers = list(range(1, total_pages + 1))
+
+    pending_pages = [n for n in page_numbers if n not in cached_pages]
+    if not pending_pages:
+        print(f"Using cached OCR text for {len(page_numbers)} page(s) of {pdf_path.name}.")
+        return {n: cached_pages[n] for n in page_numbers}
+    if len(pending_pages) < len(page_numbers):
+        print(f"Using cached OCR text for {len(page_numbers) - len(pending_pages)} page(s) of {pdf_path.name}.")
+    if check_ocr_dependencies():
+        raise RuntimeError("OCR dependencies are missing.")
+
+    if not _ocr_slot.acquire(blocking=False):
+        print(f"Waiting for another file's OCR to finish before OCR of {pdf_path.name}...")
+        _ocr_slot.acquire()
+    try:
+        # Each rasterized page costs memory; bound the window size (serial) or worker count (parallel) by the cap
+        window_pages = _raster_window_pages(pdf_path, settings, get_max_raster_bytes(config))
+        if workers > window_pages:
+            print(f"Limiting OCR to {window_pages} worker processes to stay within the raster memory cap.")
+            workers = window_pages
+
+        if workers > 1 and len(pending_pages) > 1:
+            # Parallel mode: each worker rasterizes and OCRs its own page
+            print(f"Running OCR on {len(pending_pages)} of {total_pages} pages of {pdf_path.name} with {min(workers, len(pending_pages))} worker processes...")
+            wall_start = time.perf_counter()
+            page_texts, serial_seconds, page_reports = _ocr_pages_parallel(pdf_path, pending_pages, total_pages, settings, workers)
+            wall_seconds = time.perf_counter() - wall_start
+            if wall_seconds > 0:
+                print(f"Parallel OCR wall time: {wall_seconds:.1f}s vs. ~{serial_seconds:.1f}s serial ({serial_seconds / wall_seconds:.1f}x speedup).")
+        else:
+            page_texts, page_reports = _ocr_pages_serial(pdf_path, pending_pages, total_pages, settings, window_pages)
+    finally:
+        _ocr_slot.release()
+    summary = page_preprocessor.summarize_reports(pdf_path.name, page_reports)
+    if summary:
+        print(summary)
+
+    results: Dict[int, Optional[str]] = {}
+    for page_number in page_numbers:
+        if page_number in cached_pages:
+            results[page_number] = cached_pages[page_number]
+            continue
+        page_text = page_texts.get(page_number)
+        results[page_number] = page_text
+        if page_text is not None: # Failed pages are not cached
+            cache.put_page(file_hash, "ocr", settings, page_number, page_text, total_pages, pdf_path.name)
+    return results
+
+def extract_text_from_pdf_pages(pdf_path: Path, config: Optional[Dict] = None):
+    """Convert PDF pages to images and perform OCR on each page."""
+    extracted_text = ""
+    try:
+        page_texts = ocr_pdf_pages(pdf_path, config=config)
+        for page_number, page_text in page_texts.items():
+            if page_text is None:
+                extracted_text += f"[OCR Error on Page {page_number}]\n\n"
+            else:
+                extracted_text += page_text + "\n\n" # Add newline between pages
+
         if extracted_text.strip():
             print(f"Successfully extracted text using OCR from {pdf_path.name}")
             return extracted_text
@@ -61,4 +325,4 @@ def extract_text_from_pdf_pages(pdf_path: Path):
              print(f"Suggestion: Check if {pdf_path.name} is a valid, non-corrupted PDF.")
         elif "Password required" in str(e):
              print(f"Suggestion: {pdf_path.name} seems to be password-protected.")
-        return None # Return None if conversion fails 
\ No newline at end of file
+        return None # Return None if conversion fails 
@@ -0,0 +1,182 @@
+"""
+page_preprocessor.py
+Cheap checks and cleanup of rasterized scan pages before they are sent to Tesseract.
+
+Each page is analyzed on a downscaled grayscale copy:
+  * Blank pages (separator sheets, empty backs) have almost no dark pixels: when the ink
+    coverage is below `ocr_blank_ink_coverage`, the page is skipped.
+  * Optionally (`ocr_skip_photo_pages`, off by default), photo pages: a printed page is mostly
+    paper (white, gray or off-white) with some ink, so when more than `ocr_photo_tone_fraction`
+    of the pixels are far from the paper tone (the histogram peak), the page is skipped. This
+    is opt-in because a histogram cannot tell every photo from a page with heavy print.
+The remaining pages are deskewed (the angle that maximizes the variance of the row ink
+profile), binarized with an Otsu threshold and cropped to the inked area plus a small margin,
+which gives Tesseract fewer pixels and cleaner input.
+
+Only Pillow is used, and it is not imported when the module loads, so ocr_service can read
+the settings without loading it.
+"""
+import time
+from typing import Dict, List, Optional, Tuple
+
+OCR_PAGE_FILTER_ENABLED = True
+OCR_SKIP_PHOTO_PAGES = False
+OCR_PREPROCESS_ENABLED = True
+OCR_BLANK_INK_COVERAGE = 0.0002 # Share of dark pixels below which a page counts as blank (one line of text is ~0.0005)
+OCR_PHOTO_TONE_FRACTION = 0.5 # Share of pixels far from the paper tone above which a page counts as a photo
+ANALYSIS_MAX_DIMENSION = 800 # Pages are analyzed at about this size
+INK_LEVEL = 128 # Gray levels below this are ink
+PAPER_TOLERANCE = 48 # Gray levels around the paper tone that still count as paper
+PAPER_PEAK_WINDOW = 8 # The paper tone is the center of the densest +/-8 level window
+DESKEW_MAX_DEGREES = 5.0
+DESKEW_STEP_DEGREES = 0.5
+DESKEW_MIN_DEGREES = 0.5 # Smaller angles are left alone; Tesseract copes with them
+CROP_PADDING_PX = 24 # Margin kept around the inked area, at full resolution
+
+
+def get_page_settings(config: Optional[Dict] = None) -> Dict:
+    """Returns the page filter and preprocessing settings (part of the OCR cache key)."""
+    config = config or {}
+    return {
+        "filter": bool(config.get("ocr_page_filter_enabled", OCR_PAGE_FILTER_ENABLED)),
+        "blank_ink_coverage": float(config.get("ocr_blank_ink_coverage", OCR_BLANK_INK_COVERAGE)),
+        "skip_photos": bool(config.get("ocr_skip_photo_pages", OCR_SKIP_PHOTO_PAGES)),
+        "photo_tone_fraction": float(config.get("ocr_photo_tone_fraction", OCR_PHOTO_TONE_FRACTION)),
+        "preprocess": bool(config.get("ocr_preprocess_enabled", OCR_PREPROCESS_ENABLED)),
+    }
+
+
+def otsu_threshold(histogram: List[int]) -> int:
+    """Gray level that best separates a 256-bin histogram into two classes (Otsu's method)."""
+    total = sum(histogram)
+    if not total:
+        return INK_LEVEL
+    weighted_total = sum(level * count for level, count in enumerate(histogram))
+    background_count, background_sum = 0, 0
+    best_level, best_variance = INK_LEVEL, -1.0
+    for level, count in enumerate(histogram):
+        background_count += count
+        if background_count == 0:
+            continue
+        foreground_count = total - background_count
+        if foreground_count == 0:
+            break
+        background_sum += level * count
+        mean_difference = background_sum / background_count - (weighted_total - background_sum) / foreground_count
+        variance = background_count * foreground_count * mean_difference * mean_difference
+        if variance > best_variance:
+            best_level, best_variance = level, variance
+    return best_level
+
+
+def _analysis_copy(gray):
+    factor = max(1, -(-max(gray.size) // ANALYSIS_MAX_DIMENSION)) # ceil division
+    return gray.reduce(factor) if factor > 1 else gray.copy(), factor
+
+
+def page_stats(small) -> Dict:
+    """Ink coverage, paper tone, share of pixels far from the paper tone, and Otsu threshold of a grayscale image."""
+    histogram = small.histogram()[:256]
+    total = sum(histogram) or 1
+    paper = max(range(256), key=lambda level: sum(histogram[max(0, level - PAPER_PEAK_WINDOW):level + PAPER_PEAK_WINDOW + 1]))
+    return {
+        "ink_coverage": sum(histogram[:INK_LEVEL]) / total,
+        "paper_tone": paper,
+        "off_paper_fraction": sum(count for level, count in enumerate(histogram) if abs(level - paper) > PAPER_TOLERANCE) / total,
+        "threshold": otsu_threshold(histogram),
+    }
+
+
+def _profile_score(ink) -> float:
+    """Variance of the per-row ink means; text lines aligned with the rows give sharp peaks."""
+    from PIL import Image
+    rows = list(ink.resize((1, ink.size[1]), Image.Resampling.BOX).getdata())
+    mean = sum(rows) / len(rows)
+    return sum((value - mean) ** 2 for value in rows) / len(rows)
+
+
+def estimate_skew(small, threshold: int) -> float:
+    """Returns the rotation (degrees, counter-clockwise) that best straightens the text lines."""
+    ink = small.point(lambda value: 255 if value < threshold else 0)
+    steps = int(DESKEW_MAX_DEGREES / DESKEW_STEP_DEGREES)
+    best_angle, best_score = 0.0, _profile_score(ink)
+    for step in range(-steps, steps + 1):
+        angle = step * DESKEW_STEP_DEGREES
+        if angle == 0:
+            continue
+        score = _profile_score(ink.rotate(angle, fillcolor=0))
+        if score > best_score:
+            best_angle, best_score = angle, score
+    return best_angle
+
+
+def prepare_page(image, settings: Dict) -> Tuple[Optional[object], Dict]:
+    """
+    Returns (image to OCR, report). The image is None when the page should be skipped; the
+    report then has "skipped": "blank" or "photo". Otherwise the report lists what was done.
+    """
+    start = time.perf_counter()
+    report: Dict = {"skipped": None}
+    if not settings.get("filter") and not settings.get("preprocess"):
+        return image, report
+    gray = image.convert("L")
+    small, factor = _analysis_copy(gray)
+    stats = page_stats(small)
+    report.update(ink_coverage=round(stats["ink_coverage"], 4), off_paper_fraction=round(stats["off_paper_fraction"], 4))
+
+    if settings.get("filter"):
+        if stats["ink_coverage"] < settings["blank_ink_coverage"]:
+            report["skipped"] = "blank"
+        elif settings.get("skip_photos") and stats["off_paper_fraction"] > settings["photo_tone_fraction"]:
+            report["skipped"] = "photo"
+        if report["skipped"]:
+            report["preprocess_seconds"] = time.perf_counter() - start
+            return None, report
+    if not settings.get("preprocess"):
+        report["preprocess_seconds"] = time.perf_counter() - start
+        return image, report
+
+    threshold = stats["threshold"]
+    angle = estimate_skew(small, threshold)
+    if abs(angle) >= DESKEW_MIN_DEGREES:
+        gray = gray.rotate(angle, expand=True, fillcolor=255)
+        small = small.rotate(angle, expand=True, fillcolor=255)
+        report["deskew_degrees"] = angle
+    binary = gray.point(lambda value: 255 if value >= threshold else 0)
+    bbox = small.point(lambda value: 255 if value < threshold else 0).getbbox()
+    if bbox:
+        left, top, right, bottom = (coordinate * factor for coordinate in bbox)
+        crop = (
+            max(0, left - CROP_PADDING_PX), max(0, top - CROP_PADDING_PX),
+            min(binary.size[0], right + CROP_PADDING_PX), min(binary.size[1], bottom + CROP_PADDING_PX),
+        )
+        if crop != (0, 0) + binary.size:
+            binary = binary.crop(crop)
+            report["cropped_share"] = round(1 - (binary.size[0] * binary.size[1]) / (gray.size[0] * gray.size[1]), 3)
+    report["preprocess_seconds"] = time.perf_counter() - start
+    return binary, report
+
+
+def summarize_reports(file_name: str, reports: Dict[int, Dict]) -> Optional[str]:
+    """One-line summary of skipped and preprocessed pages, with the estimated OCR time saved."""
+    if not reports:
+        return None
+    skipped = {number: report["skipped"] for number, report in reports.items() if report.get("skipped")}
+    ocr_times = [report["ocr_seconds"] for report in reports.values() if not report.get("skipped") and "ocr_seconds" in report]
+    preprocess_seconds = sum(report.get("preprocess_seconds", 0.0) for report in reports.values())
+    deskewed = sum(1 for report in reports.values() if "deskew_degrees" in report)
+    parts = []
+    if skipped:
+        reasons = {reason: sum(1 for r in skipped.values() if r == reason) for reason in ("blank", "photo")}
+        pages = ", ".join(str(number) for number in sorted(skipped))
+        parts.append(f"skipped {len(skipped)} of {len(reports)} pages ({reasons['blank']} blank, {reasons['photo']} photo: {pages})")
+        if ocr_times:
+            saved = len(skipped) * sum(ocr_times) / len(ocr_times) - preprocess_seconds
+            parts.append(f"~{saved:.1f}s of OCR saved after {preprocess_seconds:.1f}s of page analysis")
+        else:
+            parts.append(f"{preprocess_seconds:.1f}s of page analysis")
+    if deskewed:
+        parts.append(f"deskewed {deskewed} page(s)")
+    if not parts:
+        return None
+    return f"Page preprocessing for {file_name}: " + "; ".join(parts) + "."
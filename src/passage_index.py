@@ -0,0 +1,78 @@
+"""
+passage_index.py
+A small in-memory BM25 index over the passages of the consolidated corpus.
+
+The corpus is split into documents, each document into paragraphs, and consecutive paragraphs
+are packed into passages of at most max_chars. search() ranks passages for a list of query
+terms with Okapi BM25; no external search engine or database is needed.
+"""
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.casefold())
+
+
+def split_passages(text: str, max_chars: int, document_separator: str) -> List[str]:
+    """Splits the corpus into passages that never span two documents and stay under max_chars where possible."""
+    passages: List[str] = []
+    for document in text.split(document_separator):
+        current = ""
+        for paragraph in re.split(r"\n\s*\n", document):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            if current and len(current) + 2 + len(paragraph) > max_chars:
+                passages.append(current)
+                current = ""
+            if len(paragraph) > max_chars:
+                # One long paragraph (OCR output often has no blank lines): cut at line breaks
+                lines, current = paragraph.split("\n"), ""
+                for line in lines:
+                    if current and len(current) + 1 + len(line) > max_chars:
+                        passages.append(current)
+                        current = ""
+                    current = f"{current}\n{line}" if current else line
+                continue
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+        if current:
+            passages.append(current)
+    return passages
+
+
+class PassageIndex:
+    def __init__(self, passages: List[str]):
+        self.passages = passages
+        self._term_counts = [Counter(tokenize(passage)) for passage in passages]
+        self._lengths = [sum(counts.values()) for counts in self._term_counts]
+        self._average_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        document_frequency: Counter = Counter()
+        for counts in self._term_counts:
+            document_frequency.update(counts.keys())
+        total = len(passages)
+        self._idf: Dict[str, float] = {
+            term: math.log(1 + (total - frequency + 0.5) / (frequency + 0.5)) for term, frequency in document_frequency.items()
+        }
+
+    def search(self, terms: List[str], top_k: int = 0) -> List[Tuple[int, float]]:
+        """Returns (passage index, score) for passages matching any term, best first (top_k of them if > 0)."""
+        query = [term for term in dict.fromkeys(t.casefold() for t in terms) if term in self._idf]
+        scores = []
+        for index, counts in enumerate(self._term_counts):
+            score = 0.0
+            length_norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[index] / (self._average_length or 1))
+            for term in query:
+                frequency = counts.get(term)
+                if frequency:
+                    score += self._idf[term] * frequency * (BM25_K1 + 1) / (frequency + length_norm)
+            if score > 0:
+                scores.append((index, score))
+        scores.sort(key=lambda item: (-item[1], item[0]))
+        return scores[:top_k] if top_k > 0 else scores
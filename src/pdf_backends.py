@@ -0,0 +1,219 @@
+"""
+pdf_backends.py
+Pluggable backends for extracting the embedded text of PDF pages.
+
+PyPDF2 is always available. PyMuPDF (`pip install pymupdf`) and pdfplumber
+(`pip install pdfplumber`) are used when installed: PyMuPDF is much faster on large PDFs, and
+pdfplumber keeps the line layout of tabular reports (e.g. CRS Property Reports) better.
+The libraries are imported only when a backend extracts text.
+
+The `pdf_backend` setting picks one by name, or "auto" picks the fastest installed backend
+according to the last results of scripts/benchmark_pdf_backends.py (ignoring backends whose
+text yield is well below the best one). Large PDFs can be split into page ranges that are
+extracted in parallel worker processes (`pdf_workers`).
+"""
+import importlib.util
+import json
+import multiprocessing
+import os
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from src import extraction_cache
+
+PDF_BACKEND = "auto"
+DEFAULT_BACKEND = "pypdf2"
+AUTO_PREFERENCE = ("pymupdf", "pypdf2", "pdfplumber") # Used by "auto" when there are no benchmark results
+AUTO_MIN_YIELD_RATIO = 0.9 # "auto" skips backends that extract less than 90% of the best backend's text
+PDF_WORKERS = 1 # 1 = extract in this process; 0 = one worker per CPU core
+PARALLEL_MIN_PAGES = 16 # Pages per worker below which starting a process costs more than it saves
+PDF_BACKEND_RESULTS = ".pdf_backend_benchmark.json"
+
+
+class PdfBackend(ABC):
+    """Extracts the embedded text of PDF pages. Subclasses wrap one library."""
+    name = ""
+    label = "" # Stored in the extraction cache key, so changing backends never reuses another backend's text
+    module = ""
+    package = "" # pip package providing the module
+
+    @classmethod
+    def available(cls) -> bool:
+        return importlib.util.find_spec(cls.module) is not None
+
+    def cache_settings(self) -> Dict:
+        return {"extractor": self.label}
+
+    @abstractmethod
+    def page_count(self, pdf_path: Path) -> int:
+        """Returns the number of pages in the PDF."""
+
+    @abstractmethod
+    def extract_pages(self, pdf_path: Path, first_page: int, last_page: int) -> List[str]:
+        """Returns the text of pages first_page..last_page (1-based, inclusive)."""
+
+
+class PyPDF2Backend(PdfBackend):
+    name = "pypdf2"
+    label = "PyPDF2"
+    module = "PyPDF2"
+    package = "PyPDF2"
+
+    def page_count(self, pdf_path: Path) -> int:
+        from PyPDF2 import PdfReader
+        with open(pdf_path, "rb") as file:
+            return len(PdfReader(file).pages)
+
+    def extract_pages(self, pdf_path: Path, first_page: int, last_page: int) -> List[str]:
+        from PyPDF2 import PdfReader
+        with open(pdf_path, "rb") as file:
+            reader = PdfReader(file)
+            return [reader.pages[i].extract_text() or "" for i in range(first_page - 1, last_page)]
+
+
+class PyMuPDFBackend(PdfBackend):
+    name = "pymupdf"
+    label = "PyMuPDF"
+    module = "fitz"
+    package = "pymupdf"
+
+    def page_count(self, pdf_path: Path) -> int:
+        import fitz
+        with fitz.open(str(pdf_path)) as document:
+            return document.page_count
+
+    def extract_pages(self, pdf_path: Path, first_page: int, last_page: int) -> List[str]:
+        import fitz
+        with fitz.open(str(pdf_path)) as document:
+            return [document[i].get_text() or "" for i in range(first_page - 1, last_page)]
+
+
+class PdfPlumberBackend(PdfBackend):
+    name = "pdfplumber"
+    label = "pdfplumber"
+    module = "pdfplumber"
+    package = "pdfplumber"
+
+    def page_count(self, pdf_path: Path) -> int:
+        import pdfplumber
+        with pdfplumber.open(str(pdf_path)) as pdf:
+            return len(pdf.pages)
+
+    def extract_pages(self, pdf_path: Path, first_page: int, last_page: int) -> List[str]:
+        import pdfplumber
+        with pdfplumber.open(str(pdf_path)) as pdf:
+            return [pdf.pages[i].extract_text() or "" for i in range(first_page - 1, last_page)]
+
+
+BACKENDS = {backend.name: backend for backend in (PyPDF2Backend, PyMuPDFBackend, PdfPlumberBackend)}
+
+_warnings_printed = set()
+_pool_slot = threading.Lock() # One page-parallel pool at a time; concurrent files extract serially meanwhile
+
+
+def _warn_once(message: str):
+    if message not in _warnings_printed:
+        _warnings_printed.add(message)
+        print(message)
+
+
+def available_backends() -> List[str]:
+    return [name for name, backend in BACKENDS.items() if backend.available()]
+
+
+def get_results_path(config: Optional[Dict] = None) -> Path:
+    return extraction_cache.resolve_path((config or {}).get("pdf_backend_results", PDF_BACKEND_RESULTS))
+
+
+def load_benchmark_results(config: Optional[Dict] = None) -> Dict[str, Dict]:
+    """Returns {backend name: {"pages_per_second", "chars_per_page", ...}} from the last benchmark, or {}."""
+    try:
+        with open(get_results_path(config), "r", encoding="utf-8") as f:
+            return json.load(f).get("backends", {})
+    except (FileNotFoundError, json.JSONDecodeError, AttributeError):
+        return {}
+
+
+def save_benchmark_results(results: Dict[str, Dict], config: Optional[Dict] = None, **details) -> Path:
+    path = get_results_path(config)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({**details, "backends": results}, f, indent=2)
+    return path
+
+
+def choose_fastest(results: Dict[str, Dict], candidates: List[str]) -> Optional[str]:
+    """The fastest candidate whose text yield is within AUTO_MIN_YIELD_RATIO of the best, or None."""
+    measured = {name: results[name] for name in candidates if name in results}
+    if not measured:
+        return None
+    best_yield = max(result.get("chars_per_page", 0) for result in measured.values())
+    eligible = [name for name, result in measured.items() if result.get("chars_per_page", 0) >= best_yield * AUTO_MIN_YIELD_RATIO]
+    return max(eligible, key=lambda name: measured[name].get("pages_per_second", 0))
+
+
+def resolve_backend_name(config: Optional[Dict] = None) -> str:
+    """Resolves the pdf_backend setting to the name of an installed backend."""
+    choice = str((config or {}).get("pdf_backend", PDF_BACKEND)).strip().lower()
+    installed = available_backends()
+    if choice == "auto":
+        fastest = choose_fastest(load_benchmark_results(config), installed)
+        return fastest or next(name for name in AUTO_PREFERENCE if name in installed)
+    if choice not in BACKENDS:
+        _warn_once(f"Warning: Unknown pdf_backend '{choice}', using {DEFAULT_BACKEND}. Choices: auto, {', '.join(BACKENDS)}.")
+        return DEFAULT_BACKEND
+    if choice not in installed:
+        _warn_once(f"Warning: pdf_backend '{choice}' is not installed (pip install {BACKENDS[choice].package}); using {DEFAULT_BACKEND}.")
+        return DEFAULT_BACKEND
+    return choice
+
+
+def get_backend(config: Optional[Dict] = None) -> PdfBackend:
+    return BACKENDS[resolve_backend_name(config)]()
+
+
+def get_pdf_workers(config: Optional[Dict] = None) -> int:
+    """Returns the number of worker processes for page-parallel extraction."""
+    workers = int((config or {}).get("pdf_workers", PDF_WORKERS))
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def _page_ranges(page_count: int, parts: int) -> List[Tuple[int, int]]:
+    """Splits pages 1..page_count into `parts` contiguous (first_page, last_page) ranges of near-equal size."""
+    size, extra = divmod(page_count, parts)
+    ranges, first_page = [], 1
+    for part in range(parts):
+        last_page = first_page + size - 1 + (1 if part < extra else 0)
+        ranges.append((first_page, last_page))
+        first_page = last_page + 1
+    return ranges
+
+
+def _extract_range_worker(backend_name: str, pdf_path_str: str, first_page: int, last_page: int) -> List[str]:
+    """Runs in a worker process; each worker opens the PDF itself."""
+    return BACKENDS[backend_name]().extract_pages(Path(pdf_path_str), first_page, last_page)
+
+
+def extract_pdf_pages(pdf_path: Path, backend: PdfBackend, workers: int = 1) -> List[str]:
+    """
+    Extracts the text of every page with the given backend. With workers > 1 and enough pages,
+    the pages are split into contiguous ranges extracted in parallel processes, unless another
+    file is already using the pool (then this one is extracted in the calling thread).
+    """
+    page_count = backend.page_count(pdf_path)
+    parts = min(workers, page_count // PARALLEL_MIN_PAGES)
+    if parts <= 1 or not _pool_slot.acquire(blocking=False):
+        return backend.extract_pages(pdf_path, 1, page_count) if page_count else []
+    try:
+        print(f"Extracting {page_count} pages of {pdf_path.name} with {backend.label} in {parts} worker processes...")
+        # Workers are spawned rather than forked: the pool may be started from an ingest thread
+        with ProcessPoolExecutor(max_workers=parts, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [executor.submit(_extract_range_worker, backend.name, str(pdf_path), first, last) for first, last in _page_ranges(page_count, parts)]
+            return [page_text for future in futures for page_text in future.result()]
+    finally:
+        _pool_slot.release()
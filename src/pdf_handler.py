@@ -1,71 +1,137 @@
 from pathlib import Path
-from PyPDF2 import PdfReader
-from src import ocr_service
+from typing import Dict, List, Optional
+from src import ocr_service, extraction_cache, pdf_backends, telemetry
 
-MIN_TEXT_LENGTH_THRESHOLD = 50 # Minimum characters to consider direct extraction successful
+MIN_TEXT_LENGTH_THRESHOLD = 50 # Minimum characters on a page to consider direct extraction successful for that page
+PAGE_SEPARATOR = "\f" # Between pages in extract_text_from_pdf output; corpus_normalizer uses it to find headers/footers
 
-def extract_text_from_pdf(pdf_path: Path):
-    """Extract text from PDF using direct extraction first, then OCR if needed."""
-    text = None
-    direct_extraction_attempted = False
-    direct_extraction_successful = False
+def _extract_direct_pages(pdf_path: Path, config: Optional[Dict] = None):
+    """Extracts the embedded text of every page, reusing cached pages when the file is unchanged."""
+    backend = pdf_backends.get_backend(config)
+    settings = backend.cache_settings() # Part of the extraction cache key
+    cache = extraction_cache.get_cache(config)
+    file_hash = extraction_cache.file_content_hash(pdf_path)
+    cached_pages = cache.get_document(file_hash, "direct", settings)
+    if cached_pages is not None:
+        print(f"Using cached direct text for {pdf_path.name} ({len(cached_pages)} pages).")
+        return cached_pages
+
+    extracted_parts = pdf_backends.extract_pdf_pages(pdf_path, backend, pdf_backends.get_pdf_workers(config))
+    total_pages = len(extracted_parts)
+    print(f"PDF has {total_pages} pages (text extracted with {backend.label})")
+    for i, page_text in enumerate(extracted_parts):
+        if page_text.strip():
+            preview = page_text.strip().replace("\n", " ")[:100]
+            print(f"  Preview of direct text (Page {i+1}/{total_pages}): {preview}...")
+        else:
+            print(f"  No text directly extracted from page {i+1}/{total_pages}")
+
+    cache.put_document(file_hash, "direct", settings, extracted_parts, pdf_path.name)
+    return extracted_parts
+
+def _format_page_ranges(page_numbers: List[int]) -> str:
+    """Formats [1, 2, 3, 7] as '1-3, 7'."""
+    ranges = []
+    for page_number in page_numbers:
+        if ranges and page_number == ranges[-1][1] + 1:
+            ranges[-1][1] = page_number
+        else:
+            ranges.append([page_number, page_number])
+    return ", ".join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+def _print_page_provenance(pdf_path: Path, pages: List[Dict]):
+    by_method: Dict[str, List[int]] = {}
+    for page in pages:
+        by_method.setdefault(page["method"], []).append(page["page"])
+    summary = "; ".join(f"{method}: pages {_format_page_ranges(numbers)}" for method, numbers in by_method.items())
+    print(f"Page sources for {pdf_path.name}: {summary}")
+
+def extract_pages_from_pdf(pdf_path: Path, config: Optional[Dict] = None) -> Optional[List[Dict]]:
+    """
+    Extracts text page by page: pages with enough embedded text use direct extraction,
+    and only the remaining pages are rasterized and OCR'd.
+    Returns a list of {"page": n, "method": "direct" | "ocr" | "ocr_error" | "empty", "text": str}
+    in page order, or None if the PDF could not be read at all.
+    """
+    direct_pages: Optional[List[str]] = None
 
     # 1. Try direct text extraction first
     try:
         print(f"Attempting direct text extraction from PDF: {pdf_path.name}")
-        with open(pdf_path, 'rb') as file:
-            reader = PdfReader(file)
-            extracted_parts = []
-            total_pages = len(reader.pages)
-            print(f"PDF has {total_pages} pages")
-            
-            for i, page in enumerate(reader.pages):
-                print(f"Directly extracting text from page {i+1}/{total_pages}...")
-                page_text = page.extract_text() or ""
-                extracted_parts.append(page_text)
-                if page_text.strip():
-                    preview = page_text.strip().replace("\n", " ")[:100]
-                    print(f"  Preview of direct text (Page {i+1}): {preview}...")
-                else:
-                    print(f"  No text directly extracted from page {i+1}")
-            
-            text = "\n\n".join(extracted_parts)
-            direct_extraction_attempted = True
-
-            # Check if the extracted text is substantial enough
-            if text and len(text.strip()) > MIN_TEXT_LENGTH_THRESHOLD:
-                print(f"Successfully extracted substantial text directly from {pdf_path.name}")
-                direct_extraction_successful = True
-                return text # Return the directly extracted text
-            else:
-                 print(f"Direct text extraction from {pdf_path.name} yielded minimal or no results.")
-                 text = None # Reset text if not successful
-                 
+        with telemetry.span("pdf_direct", file=pdf_path.name) as span:
+            direct_pages = _extract_direct_pages(pdf_path, config)
+            span.set(pages=len(direct_pages))
+            span.add(bytes=sum(len(page_text) for page_text in direct_pages))
     except Exception as e:
         print(f"Error during direct PDF text extraction for {pdf_path.name}: {str(e)}")
         if "Password required" in str(e):
              print(f"  Suggestion: {pdf_path.name} seems to be password-protected.")
              # Don't attempt OCR on password-protected files unless handled
              return None 
-        # If other error occurred during direct extraction, we might still try OCR
+        # If other error occurred during direct extraction, we might still try OCR on every page
         print("Will attempt OCR as fallback.")
-        direct_extraction_attempted = True # Mark as attempted even if failed
 
-    # 2. If direct extraction failed or yielded minimal text, attempt OCR
-    if not direct_extraction_successful:
-        print(f"Falling back to OCR for {pdf_path.name}...")
+    # 2. Decide per page whether the direct text is substantial enough
+    if direct_pages is not None:
+        ocr_page_numbers = [i + 1 for i, page_text in enumerate(direct_pages) if len(page_text.strip()) <= MIN_TEXT_LENGTH_THRESHOLD]
+        total_pages = len(direct_pages)
+    else:
+        ocr_page_numbers = None # OCR every page
+        total_pages = None
+
+    # 3. OCR only the pages that need it
+    ocr_texts: Dict[int, Optional[str]] = {}
+    if ocr_page_numbers is None or ocr_page_numbers:
+        if ocr_page_numbers:
+            print(f"Direct text is minimal on {len(ocr_page_numbers)} of {total_pages} pages of {pdf_path.name}; running OCR on those pages only.")
+        else:
+            print(f"Falling back to OCR for {pdf_path.name}...")
         try:
-            # Call the dedicated OCR service function
-            text = ocr_service.extract_text_from_pdf_pages(pdf_path)
-            if text:
-                return text # Return OCR text if successful
-            else:
-                print(f"OCR also failed to extract text from {pdf_path.name}")
-                return None # Return None if OCR also fails
+            with telemetry.span("ocr", file=pdf_path.name, pages=len(ocr_page_numbers) if ocr_page_numbers else total_pages) as span:
+                ocr_texts = ocr_service.ocr_pdf_pages(pdf_path, ocr_page_numbers, config, total_pages)
+                span.add(bytes=sum(len(text) for text in ocr_texts.values() if text))
         except Exception as ocr_e:
-            # Errors within ocr_service should be logged there, but catch any unexpected ones here
-            print(f"An unexpected error occurred during OCR fallback for {pdf_path.name}: {ocr_e}")
-            return None
-            
-    # Should not be reachable if logic is correct, but as a safeguard:
-    return text # Returns None if neither method worked 
\ No newline at end of file
+            # Errors within ocr_service are logged there, but catch them here so direct text is kept
+            print(f"An error occurred during OCR for {pdf_path.name}: {ocr_e}")
+            if direct_pages is None:
+                return None
+            ocr_texts = {n: None for n in ocr_page_numbers}
+    else:
+        print(f"Successfully extracted substantial text directly from every page of {pdf_path.name}")
+
+    # 4. Merge in page order, recording which method produced each page
+    if direct_pages is None:
+        total_pages = max(ocr_texts) if ocr_texts else 0
+        direct_pages = [""] * total_pages
+    pages = []
+    for page_number in range(1, total_pages + 1):
+        direct_text = direct_pages[page_number - 1]
+        if page_number not in ocr_texts:
+            pages.append({"page": page_number, "method": "direct", "text": direct_text})
+            continue
+        ocr_text = ocr_texts[page_number]
+        if ocr_text is not None and len(ocr_text.strip()) >= len(direct_text.strip()) and ocr_text.strip():
+            pages.append({"page": page_number, "method": "ocr", "text": ocr_text})
+        elif direct_text.strip():
+            pages.append({"page": page_number, "method": "direct", "text": direct_text})
+        elif ocr_text is None:
+            pages.append({"page": page_number, "method": "ocr_error", "text": f"[OCR Error on Page {page_number}]"})
+        else:
+            pages.append({"page": page_number, "method": "empty", "text": ""})
+    _print_page_provenance(pdf_path, pages)
+    return pages
+
+def extract_text_from_pdf(pdf_path: Path, config: Optional[Dict] = None):
+    """Extract text from PDF, using direct extraction per page and OCR only for pages that need it."""
+    pages = extract_pages_from_pdf(pdf_path, config)
+    if not pages:
+        print(f"Failed to extract text from {pdf_path.name}")
+        return None
+    if not any(page["method"] in ("direct", "ocr") and page["text"].strip() for page in pages):
+        print(f"Neither direct extraction nor OCR produced text for {pdf_path.name}")
+        return None
+    return f"\n{PAGE_SEPARATOR}\n".join(page["text"] for page in pages)
+
+def strip_page_separators(text: str) -> str:
+    """Removes the page separators, leaving the blank line between pages (for text sent to the LLM as-is)."""
+    return text.replace(PAGE_SEPARATOR, "")
@@ -0,0 +1,277 @@
+"""
+proposal_pipeline.py
+The proposal generation workflow shared by the interactive CLI and the headless batch runner:
+template/index loading, folder processing, AI extraction, value filling, date and currency
+calculations, rendering and writing the output file.
+"""
+import json
+import time
+from datetime import datetime, timedelta, date
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from src import data_processor, telemetry, template_engine, template_indexer, variable_extractor
+from src.template_indexer import TEMPLATE_DIR, TEMPLATE_VAR_INDEX_DIR, get_template_var_index_path
+
+# Map menu choice to TXT filenames in the templates/ directory
+TEMPLATE_FILENAMES = {
+    "1": "personal_property_auction_proposal.txt",
+    "2": "real_estate_auction_proposal.txt",
+    "3": "real_estate_and_personal_property_auction_proposal.txt"
+}
+
+MARKETING_KEYS = [
+    "marketing_facebook_cost", "marketing_google_cost", "marketing_direct_mail_cost",
+    "marketing_drone_cost", "marketing_signs_cost", "marketing_website_newsletter_cost"
+]
+
+
+def resolve_template_filename(choice) -> Optional[str]:
+    """Accepts a menu choice ("1"-"3"), a template filename, or a filename without extension."""
+    choice = str(choice).strip()
+    if choice in TEMPLATE_FILENAMES:
+        return TEMPLATE_FILENAMES[choice]
+    filename = choice if choice.endswith(".txt") else choice + ".txt"
+    return filename if filename in TEMPLATE_FILENAMES.values() else None
+
+
+_var_index_cache: Dict[str, tuple] = {}
+
+
+def load_template_var_index(template_filename):
+    """Loads a template's variable index; it is re-read only when the index file changes."""
+    index_path = get_template_var_index_path(template_filename)
+    mtime_ns = index_path.stat().st_mtime_ns
+    cached = _var_index_cache.get(template_filename)
+    if cached is None or cached[0] != mtime_ns:
+        with open(index_path, "r") as f:
+            cached = (mtime_ns, json.load(f))
+        _var_index_cache[template_filename] = cached
+    return [dict(entry) for entry in cached[1]]
+
+
+def render_template(template, values):
+    return template_engine.compile_template(template).render(values)
+
+
+def run_template_indexer(template_filename=None):
+    """Rebuilds the variable indexes of every changed template (in-process; see template_indexer)."""
+    try:
+        template_indexer.index_templates(TEMPLATE_DIR, TEMPLATE_VAR_INDEX_DIR)
+    except Exception as e:
+        print(f"Error: Failed to re-index template variables.\n{e}")
+        return False
+    return True
+
+
+def extract_variables_with_ai(llm, doc_text, variable_index):
+    """
+    Uses the LLM to fill the template's 'extracted' variables from the source text.
+    Large corpora are split into token-budgeted chunks and extracted concurrently (see variable_extractor).
+    """
+    return variable_extractor.extract_variables(llm, doc_text, variable_index, llm.config)
+
+
+# --- Date business rules ---
+def get_next_weekday(base_date, weekday):
+    days_ahead = weekday - base_date.weekday()
+    if days_ahead <= 0:
+        days_ahead += 7
+    return base_date + timedelta(days=days_ahead)
+
+
+def get_second_monday(base_date):
+    first_monday = get_next_weekday(base_date, 0)
+    return first_monday + timedelta(days=7)
+
+
+def get_next_business_day(base_date):
+    if base_date.weekday() == 5:
+        return base_date + timedelta(days=2)
+    elif base_date.weekday() == 6:
+        return base_date + timedelta(days=1)
+    return base_date
+
+
+def get_second_friday(base_date):
+    first_friday = get_next_weekday(base_date, 4)
+    return first_friday + timedelta(days=7)
+
+
+def calculate_dates(weeks: int, today: Optional[date] = None) -> Dict[str, str]:
+    """Returns the calculated proposal dates, formatted as "Month DD, YYYY"."""
+    today = today or date.today()
+
+    # 1. Auction Date: Use weeks collected earlier, set to next Thursday after that
+    auction_base = today + timedelta(weeks=weeks)
+    auction_date = get_next_weekday(auction_base, 3)  # 3=Thursday
+
+    # 2. Proposal Date: always today
+    proposal_date = today
+
+    # 3. Contract Date: second Friday after proposal date
+    contract_date = get_second_friday(proposal_date)
+
+    # 4. Advertising Start Date: Second Monday after proposal date
+    advertising_start_date = get_second_monday(proposal_date)
+
+    # 5. Closing Date: 30 days after auction date, or next business day if weekend
+    closing_date_base = auction_date + timedelta(days=30)
+    closing_date = get_next_business_day(closing_date_base)
+
+    # Format all dates as "Month DD, YYYY"
+    def fmt(dt):
+        return dt.strftime("%B %d, %Y")
+
+    return {
+        "proposal_date": fmt(proposal_date),
+        "document_created_date": fmt(proposal_date),
+        "contract_date": fmt(contract_date),
+        "advertising_start_date": fmt(advertising_start_date),
+        "auction_end_date": fmt(auction_date),
+        "closing_date": fmt(closing_date),
+    }
+
+
+def _parse_amount(value) -> float:
+    try:
+        return float(str(value).replace("$","").replace(",","").strip())
+    except Exception:
+        return 0.0
+
+
+def apply_calculated_fields(values: Dict, template_vars: List[Dict], weeks: int):
+    """Fills calculated dates and totals and formats currency fields (plain numbers, no $) in place."""
+    values.update(calculate_dates(weeks))
+
+    # Marketing total cost
+    total = 0.0
+    for k in MARKETING_KEYS:
+        amount = _parse_amount(values.get(k, "0"))
+        total += amount
+        values[k] = f"{amount:,.2f}"
+    values["marketing_total_cost"] = f"{total:,.2f}"
+
+    # Retainer formatting (now 'retainer', not 'retainer_fee')
+    retainer_amount = _parse_amount(values.get("retainer", values.get("retainer_fee", "0")))
+    values["retainer"] = f"{retainer_amount:,.2f}"
+
+    # Total due at contract
+    values["total_due_at_contract"] = f"{(total + retainer_amount):,.2f}"
+
+    # Currency formatting for all currency fields (plain numbers, no $)
+    for var in template_vars:
+        if var["is_currency"]:
+            k = var["name"]
+            v = values.get(k)
+            if v is not None:
+                try:
+                    amount = float(str(v).replace("$","").replace(",","").strip())
+                    values[k] = f"{amount:,.2f}"
+                except Exception:
+                    pass
+
+
+def write_new_output(folder_path: Path, stem: str, suffix: str, text: str) -> Path:
+    """
+    Writes text to <stem><suffix> in folder_path without overwriting an existing file: concurrent
+    jobs for the same folder in the same second get <stem>_2<suffix>, <stem>_3<suffix>, ...
+    """
+    attempt = 1
+    while True:
+        output_path = folder_path / (f"{stem}{suffix}" if attempt == 1 else f"{stem}_{attempt}{suffix}")
+        try:
+            with open(output_path, "x") as f:
+                f.write(text)
+            return output_path
+        except FileExistsError:
+            attempt += 1
+
+
+def fill_missing_values(values: Dict, template_vars: List[Dict], user_values: Optional[Dict] = None,
+                        prompt: Optional[Callable[[str], str]] = None) -> List[str]:
+    """
+    Fills 'user' and unfilled 'extracted' variables from user_values, then (if given) by prompting.
+    Returns the names of variables that are still missing.
+    """
+    user_values = user_values or {}
+    missing = []
+    for var in template_vars:
+        name = var["name"]
+        source = var["source"]
+        if values.get(name):
+            continue  # Already filled from AI
+        # Calculated fields: skip for now, calculate after interview
+        if source not in ("user", "extracted"):
+            continue
+        if name in user_values:
+            values[name] = str(user_values[name])
+        elif prompt is not None:
+            values[name] = prompt(name)
+        else:
+            missing.append(name)
+    return missing
+
+
+def prompt_for_value(name: str) -> str:
+    return input(f"Enter value for '{name.replace('_',' ').title()}': ")
+
+
+def build_proposal(llm, config: Dict, folder_path: Path, template_filename: str, weeks: int,
+                   user_values: Optional[Dict] = None, prompt: Optional[Callable[[str], str]] = None) -> Dict:
+    """
+    Runs the proposal workflow for one deal folder and writes the proposal into it.
+    Without a prompt callback the run is non-interactive: values not found by the AI or in
+    user_values are reported as missing and rendered as [MISSING:name].
+
+    Returns a dict with output_path, missing_variables, unrendered_variables, error_summary,
+    image_count and elapsed_seconds.
+    """
+    with telemetry.span("proposal", folder=str(folder_path), template=template_filename):
+        return _build_proposal(llm, config, folder_path, template_filename, weeks, user_values, prompt)
+
+
+def _build_proposal(llm, config: Dict, folder_path: Path, template_filename: str, weeks: int,
+                    user_values: Optional[Dict], prompt: Optional[Callable[[str], str]]) -> Dict:
+    start = time.perf_counter()
+    template_path = TEMPLATE_DIR / template_filename
+    template_vars = load_template_var_index(template_filename)
+
+    # data_processor handles iterating, extracting text, and summarizing errors
+    all_extracted_text, error_summary, image_paths = data_processor.process_folder(folder_path, config)
+
+    # --- AI Variable Extraction ---
+    ai_extracted_vars = {}
+    with telemetry.span("extraction") as span:
+        span.add(bytes=len(all_extracted_text))
+        ai_vars = extract_variables_with_ai(llm, all_extracted_text, template_vars)
+        span.set(variables_found=len(ai_vars or {}))
+    if ai_vars:
+        ai_extracted_vars.update({k: v for k, v in ai_vars.items() if v not in (None, "", "null")})
+
+    # --- Interview and Value Filling ---
+    values = dict(ai_extracted_vars) # Start with AI-filled vars
+    missing_variables = fill_missing_values(values, template_vars, user_values, prompt)
+
+    # --- Calculate and Format Calculated Fields ---
+    apply_calculated_fields(values, template_vars, weeks)
+
+    # --- Render Template ---
+    with telemetry.span("render", template=template_filename) as span:
+        proposal_text, unrendered_variables = template_engine.render_file(template_path, values)
+        span.add(bytes=len(proposal_text))
+    if unrendered_variables:
+        print(f"Warning: {len(unrendered_variables)} template variables have no value: {', '.join(unrendered_variables)}")
+
+    # --- Write Proposal Output to Selected Folder with Timestamp ---
+    output_path = write_new_output(folder_path, f"generated_proposal_{datetime.now().strftime('%Y%m%d-%H%M%S')}", ".md", proposal_text)
+    print(f"Proposal generated and saved to {output_path}")
+
+    return {
+        "output_path": str(output_path),
+        "missing_variables": missing_variables,
+        "unrendered_variables": unrendered_variables,
+        "error_summary": error_summary,
+        "image_count": len(image_paths),
+        "elapsed_seconds": round(time.perf_counter() - start, 2),
+    }
@@ -0,0 +1,214 @@
+"""
+proposal_service.py
+Long-running local HTTP service for proposal generation.
+
+Startup work is paid once: the LLMService (client and prompts), the compiled templates and
+the template variable indexes stay loaded for the life of the process. Proposal jobs are
+accepted into a bounded queue and processed by a fixed pool of worker threads; when the queue
+is full, new jobs are rejected with 503 so clients can back off.
+
+Endpoints (JSON):
+    POST /jobs        {"folder": "...", "template": "2", "weeks": 4, "user_values": {...}}
+                      -> 202 {"id", "status", "queue_depth"}; 400 if invalid, 503 if the queue is full
+    GET  /jobs/<id>   -> the job: status (queued, running, done, failed), timestamps and result
+    GET  /jobs        -> all retained jobs without their results
+    GET  /health      -> queue depth and capacity, workers, job counts, uptime
+"""
+import itertools
+import json
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from src import batch_runner, proposal_pipeline, telemetry, template_engine
+
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8780
+SERVICE_WORKERS = 2
+SERVICE_QUEUE_SIZE = 16
+SERVICE_JOB_HISTORY = 1000 # Finished jobs kept for status polling
+RETRY_AFTER_SECONDS = 5
+
+
+class ProposalService:
+    def __init__(self, llm, config: Dict):
+        self.llm = llm
+        self.config = config
+        self.workers = max(1, int(config.get("service_workers", SERVICE_WORKERS)))
+        self.queue: queue.Queue = queue.Queue(maxsize=max(1, int(config.get("service_queue_size", SERVICE_QUEUE_SIZE))))
+        self.job_history = int(config.get("service_job_history", SERVICE_JOB_HISTORY))
+        self.jobs: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._threads = []
+        self.started = time.time()
+
+    def warm_up(self):
+        """Brings the template indexes up to date and loads every template and index into memory."""
+        proposal_pipeline.run_template_indexer()
+        for template_filename in proposal_pipeline.TEMPLATE_FILENAMES.values():
+            template_engine.load_template(proposal_pipeline.TEMPLATE_DIR / template_filename)
+            proposal_pipeline.load_template_var_index(template_filename)
+        print(f"Warmed {len(proposal_pipeline.TEMPLATE_FILENAMES)} templates and their variable indexes.")
+
+    def start(self):
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"proposal-worker-{number + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        for _ in self._threads:
+            self.queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def submit(self, deal: Dict) -> Tuple[int, Dict]:
+        """Validates and enqueues a job. Returns (HTTP status, response body)."""
+        error = self._validate(deal)
+        if error:
+            return 400, {"error": error}
+        job = {
+            "id": f"job-{next(self._ids)}",
+            "status": "queued",
+            "folder": deal["folder"],
+            "submitted_at": datetime.now().isoformat(timespec="milliseconds"),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+        }
+        with self._lock:
+            try:
+                self.queue.put_nowait((job, deal))
+            except queue.Full:
+                return 503, {"error": "The job queue is full; retry later.", "queue_capacity": self.queue.maxsize}
+            self.jobs[job["id"]] = job
+            self._prune()
+        return 202, {"id": job["id"], "status": job["status"], "queue_depth": self.queue.qsize()}
+
+    @staticmethod
+    def _validate(deal) -> Optional[str]:
+        if not isinstance(deal, dict):
+            return "The job must be a JSON object."
+        folder = deal.get("folder")
+        if not isinstance(folder, str) or not folder or not Path(folder).expanduser().is_dir():
+            return f"Not a valid directory: '{folder}'"
+        if not proposal_pipeline.resolve_template_filename(deal.get("template", "")):
+            return f"Unknown template: '{deal.get('template')}'"
+        try:
+            int(deal.get("weeks"))
+        except (TypeError, ValueError):
+            return f"'weeks' must be an integer, got '{deal.get('weeks')}'"
+        if not isinstance(deal.get("user_values", {}), dict):
+            return "'user_values' must be a JSON object."
+        return None
+
+    def _prune(self):
+        """Drops the oldest finished jobs beyond the history limit (queued and running jobs are kept)."""
+        finished = [job_id for job_id, job in self.jobs.items() if job["status"] in ("done", "failed")]
+        for job_id in finished[:max(0, len(finished) - self.job_history)]:
+            del self.jobs[job_id]
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            job, deal = item
+            job["status"] = "running"
+            job["started_at"] = datetime.now().isoformat(timespec="milliseconds")
+            with telemetry.span("service_job", job=job["id"]):
+                result = batch_runner.run_deal(self.llm, self.config, deal)
+            result.pop("traceback", None)
+            job["result"] = result
+            job["finished_at"] = datetime.now().isoformat(timespec="milliseconds")
+            job["status"] = "done" if result["status"] == "ok" else "failed"
+            with self._lock:
+                self._prune()
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list_jobs(self):
+        with self._lock:
+            return [{k: v for k, v in job.items() if k != "result"} for job in self.jobs.values()]
+
+    def health(self) -> Dict:
+        with self._lock:
+            statuses = [job["status"] for job in self.jobs.values()]
+        return {
+            "status": "ok",
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "workers": self.workers,
+            "jobs": {status: statuses.count(status) for status in ("queued", "running", "done", "failed")},
+            "uptime_seconds": round(time.time() - self.started, 1),
+        }
+
+
+def _make_handler(service: ProposalService):
+    class ServiceHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, body, headers: Optional[Dict] = None):
+            payload = json.dumps(body, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            path = self.path.rstrip("/")
+            if path == "/health":
+                self._send(200, service.health())
+            elif path == "/jobs":
+                self._send(200, service.list_jobs())
+            elif path.startswith("/jobs/"):
+                job = service.get_job(path[len("/jobs/"):])
+                if job:
+                    self._send(200, job)
+                else:
+                    self._send(404, {"error": "Unknown job."})
+            else:
+                self._send(404, {"error": "Not found."})
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/jobs":
+                self._send(404, {"error": "Not found."})
+                return
+            try:
+                deal = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            except (ValueError, json.JSONDecodeError):
+                self._send(400, {"error": "The request body must be JSON."})
+                return
+            status, body = service.submit(deal)
+            self._send(status, body, {"Retry-After": str(RETRY_AFTER_SECONDS)} if status == 503 else None)
+
+    return ServiceHandler
+
+
+def start_service(llm, config: Dict, host: Optional[str] = None, port: Optional[int] = None) -> Tuple[ProposalService, ThreadingHTTPServer]:
+    """Warms up the service, starts its workers and serves HTTP in a background thread."""
+    service = ProposalService(llm, config)
+    service.warm_up()
+    service.start()
+    server = ThreadingHTTPServer(
+        (host or config.get("service_host", SERVICE_HOST), int(port if port is not None else config.get("service_port", SERVICE_PORT))),
+        _make_handler(service),
+    )
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="proposal-service-http", daemon=True).start()
+    print(f"Proposal service listening on http://{server.server_address[0]}:{server.server_address[1]} "
+          f"({service.workers} workers, queue capacity {service.queue.maxsize}).")
+    return service, server
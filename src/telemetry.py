@@ -0,0 +1,231 @@
+"""
+telemetry.py
+Nested timing spans with byte, token and cost accounting.
+
+Code under measurement opens spans with `with telemetry.span("name", **attrs) as s:` and adds
+counters (bytes, prompt_tokens, completion_tokens, cached_tokens) with s.add(...). Spans nest
+through a context variable; work submitted to thread pools keeps its parent span when the callable
+is wrapped with telemetry.wrap(). Each finished span is appended to a JSON lines file, and
+print_summary() prints per-stage totals and an estimated cost per model.
+"""
+import contextvars
+import itertools
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from src.extraction_cache import resolve_path
+
+TELEMETRY_ENABLED = True
+TELEMETRY_DIR = ".telemetry"
+TELEMETRY_MAX_RECORDS = 100_000 # Spans kept in memory for the summary (the JSONL file keeps all of them)
+COUNTER_KEYS = ("bytes", "prompt_tokens", "completion_tokens", "cached_tokens")
+# USD per 1M tokens; override or extend with "model_pricing" in config.json
+MODEL_PRICING = {
+    "gpt-4o": {"input": 2.50, "cached_input": 1.25, "output": 10.00},
+    "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+}
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("telemetry_span", default=None)
+_span_ids = itertools.count(1)
+_lock = threading.Lock()
+_state = {"enabled": TELEMETRY_ENABLED, "path": None, "pricing": dict(MODEL_PRICING)}
+_records: deque = deque(maxlen=TELEMETRY_MAX_RECORDS)
+
+
+class Span:
+    def __init__(self, name: str, parent: Optional["Span"], attrs: Dict):
+        self.id = next(_span_ids)
+        self.name = name
+        self.parent_id = parent.id if parent else None
+        self.attrs = attrs
+        self.counters: Dict[str, int] = {}
+        self.start_time = time.time()
+        self.duration_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def add(self, **counters):
+        """Adds to the span's counters (bytes, prompt_tokens, completion_tokens, cached_tokens)."""
+        for key, value in counters.items():
+            if value:
+                self.counters[key] = self.counters.get(key, 0) + int(value)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_record(self) -> Dict:
+        return {
+            "id": self.id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": datetime.fromtimestamp(self.start_time).isoformat(timespec="milliseconds"),
+            "duration_seconds": round(self.duration_seconds or 0.0, 6),
+            **self.counters,
+            **({"attrs": self.attrs} if self.attrs else {}),
+            **({"error": self.error} if self.error else {}),
+        }
+
+
+def configure(config: Optional[Dict] = None):
+    """Starts a telemetry run: spans from now on are exported to <telemetry_dir>/run_<timestamp>.jsonl."""
+    global _records
+    config = config or {}
+    enabled = bool(config.get("telemetry_enabled", TELEMETRY_ENABLED))
+    path = None
+    if enabled:
+        telemetry_dir = resolve_path(config.get("telemetry_dir", TELEMETRY_DIR))
+        telemetry_dir.mkdir(parents=True, exist_ok=True)
+        path = telemetry_dir / f"run_{datetime.now().strftime('%Y%m%d-%H%M%S')}.jsonl"
+    with _lock:
+        _state["enabled"] = enabled
+        _state["path"] = path
+        _state["pricing"] = {**MODEL_PRICING, **config.get("model_pricing", {})}
+        _records = deque(maxlen=int(config.get("telemetry_max_records", TELEMETRY_MAX_RECORDS)))
+
+
+def _finish(span: Span):
+    record = span.to_record()
+    with _lock:
+        if not _state["enabled"]:
+            return
+        _records.append(record)
+        path = _state["path"]
+        if path is not None:
+            try:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, default=str) + "\n")
+            except OSError as e:
+                print(f"Warning: Could not write telemetry to {path}: {e}")
+                _state["path"] = None
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Times a block as a span nested under the current one. Yields the Span for adding counters."""
+    current = Span(name, _current_span.get(), attrs)
+    token = _current_span.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.duration_seconds = time.perf_counter() - start
+        _current_span.reset(token)
+        _finish(current)
+
+
+def record(name: str, duration_seconds: float, **attrs_and_counters):
+    """Records a span measured elsewhere (e.g. in a worker process) under the current span."""
+    counters = {k: attrs_and_counters.pop(k) for k in COUNTER_KEYS if k in attrs_and_counters}
+    measured = Span(name, _current_span.get(), attrs_and_counters)
+    measured.start_time = time.time() - duration_seconds
+    measured.duration_seconds = duration_seconds
+    measured.add(**counters)
+    _finish(measured)
+
+
+def annotate(**attrs):
+    """Sets attributes on the current span, if any."""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attrs)
+
+
+def add(**counters):
+    """Adds counters to the current span, if any."""
+    current = _current_span.get()
+    if current is not None:
+        current.add(**counters)
+
+
+def wrap(fn: Callable) -> Callable:
+    """Binds fn to the current span, so spans it opens in a pool thread nest under the submitter's span."""
+    parent = _current_span.get()
+    def run(*args, **kwargs):
+        token = _current_span.set(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current_span.reset(token)
+    return run
+
+
+def add_usage(current: Span, usage, model: Optional[str] = None):
+    """Adds an OpenAI usage object's token counts to a span."""
+    if model:
+        current.set(model=model)
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    current.add(
+        prompt_tokens=usage.prompt_tokens,
+        completion_tokens=usage.completion_tokens,
+        cached_tokens=getattr(details, "cached_tokens", None) if details else None,
+    )
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> Optional[float]:
+    """Estimated USD cost of a model's usage, or None if the model has no pricing entry."""
+    pricing = _state["pricing"].get(model)
+    if pricing is None:
+        # Dated snapshots (gpt-4o-2024-08-06) are priced like their base model
+        matches = [name for name in _state["pricing"] if model.startswith(name + "-")]
+        pricing = _state["pricing"][max(matches, key=len)] if matches else None
+    if pricing is None:
+        return None
+    uncached = prompt_tokens - cached_tokens
+    return (uncached * pricing["input"] + cached_tokens * pricing.get("cached_input", pricing["input"])
+            + completion_tokens * pricing["output"]) / 1_000_000
+
+
+def records() -> List[Dict]:
+    with _lock:
+        return list(_records)
+
+
+def print_summary():
+    """Prints per-stage totals and token usage with estimated cost per model."""
+    spans = records()
+    if not spans:
+        return
+    stages: Dict[str, Dict] = {}
+    for r in spans:
+        stage = stages.setdefault(r["name"], {"count": 0, "seconds": 0.0, **{k: 0 for k in COUNTER_KEYS}})
+        stage["count"] += 1
+        stage["seconds"] += r["duration_seconds"]
+        for key in COUNTER_KEYS:
+            stage[key] += r.get(key, 0)
+    print("\n--- Run Telemetry ---")
+    print(f"{'Stage':<22} {'Count':>6} {'Total (s)':>10} {'Bytes':>12} {'Prompt tok':>11} {'Output tok':>11}")
+    for name, stage in sorted(stages.items(), key=lambda item: -item[1]["seconds"]):
+        print(f"{name[:22]:<22} {stage['count']:>6} {stage['seconds']:>10.2f} {stage['bytes']:>12,} {stage['prompt_tokens']:>11,} {stage['completion_tokens']:>11,}")
+    print("(Nested stages overlap, and concurrent spans add up beyond wall-clock time.)")
+
+    models: Dict[str, Dict] = {}
+    for r in spans:
+        model = r.get("attrs", {}).get("model")
+        if not model or r.get("attrs", {}).get("cache_hit"):
+            continue
+        usage = models.setdefault(model, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0})
+        usage["calls"] += 1
+        for key in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+            usage[key] += r.get(key, 0)
+    if models:
+        print(f"\n{'Model':<22} {'Calls':>6} {'Prompt tok':>11} {'Cached tok':>11} {'Output tok':>11} {'Est. cost':>10}")
+        for model, usage in sorted(models.items()):
+            cost = estimate_cost(model, usage["prompt_tokens"], usage["completion_tokens"], usage["cached_tokens"])
+            cost_text = f"${cost:.4f}" if cost is not None else "n/a"
+            print(f"{model[:22]:<22} {usage['calls']:>6} {usage['prompt_tokens']:>11,} {usage['cached_tokens']:>11,} {usage['completion_tokens']:>11,} {cost_text:>10}")
+        prompt_tokens = sum(usage["prompt_tokens"] for usage in models.values())
+        cached_tokens = sum(usage["cached_tokens"] for usage in models.values())
+        if prompt_tokens:
+            print(f"Provider prompt cache: {cached_tokens:,} of {prompt_tokens:,} prompt tokens cached ({cached_tokens / prompt_tokens:.0%}).")
+    if _state["path"] is not None:
+        print(f"Telemetry spans written to {_state['path']}")
+    print("---------------------")
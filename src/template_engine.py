@@ -0,0 +1,87 @@
+"""
+template_engine.py
+Compiled, cached rendering of the proposal templates.
+
+Each template is parsed once into a list of literal segments and placeholder slots.
+Rendering fills the slots and joins the list; no regex runs at render time. Compiled
+templates are cached per file and reused while the file's mtime and size are unchanged
+(or, if those changed, while its content hash is unchanged).
+"""
+import hashlib
+import os
+import re
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+PLACEHOLDER_PATTERN = re.compile(r"{{\s*([a-zA-Z0-9_]+)\s*}}")
+MISSING_MARKER = "[MISSING:{name}]"
+
+_compiled_files: Dict[str, Tuple[int, int, str, "CompiledTemplate"]] = {}
+_compiled_files_lock = threading.Lock()
+
+
+class CompiledTemplate:
+    def __init__(self, text: str, content_hash: Optional[str] = None):
+        self.content_hash = content_hash or hashlib.sha256(text.encode("utf-8")).hexdigest()
+        segments: List[str] = []
+        slots: List[Tuple[int, str]] = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(text):
+            segments.append(text[position:match.start()])
+            slots.append((len(segments), match.group(1)))
+            segments.append("") # Filled at render time
+            position = match.end()
+        segments.append(text[position:])
+        self._segments = segments
+        self._slots = slots
+        # Variables in order of first appearance
+        self.variables: List[str] = list(dict.fromkeys(name for _, name in slots))
+        self._missing_markers = {name: MISSING_MARKER.format(name=name) for name in self.variables}
+
+    def render(self, values: Dict) -> str:
+        """Substitutes values into the template; variables without a value render as [MISSING:name]."""
+        parts = self._segments.copy()
+        markers = self._missing_markers
+        for index, name in self._slots:
+            value = values.get(name, markers[name])
+            parts[index] = value if type(value) is str else str(value)
+        return "".join(parts)
+
+    def missing(self, values: Dict) -> List[str]:
+        """Returns the template variables that have no value, without rescanning the text."""
+        return [name for name in self.variables if name not in values]
+
+
+def load_template(template_path: Path) -> CompiledTemplate:
+    """Returns the compiled template for a file, compiling it only when the file has changed."""
+    key = os.path.abspath(template_path) # Path.resolve() would cost more than the render itself
+    stat = os.stat(key)
+    with _compiled_files_lock:
+        cached = _compiled_files.get(key)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[3]
+
+    with open(key, "rb") as f:
+        data = f.read()
+    content_hash = hashlib.sha256(data).hexdigest()
+    if cached and cached[2] == content_hash:
+        compiled = cached[3] # Touched but not modified
+    else:
+        compiled = CompiledTemplate(data.decode("utf-8"), content_hash)
+    with _compiled_files_lock:
+        _compiled_files[key] = (stat.st_mtime_ns, stat.st_size, content_hash, compiled)
+    return compiled
+
+
+@lru_cache(maxsize=32)
+def compile_template(text: str) -> CompiledTemplate:
+    """Compiles template text that does not come from a file (memoized by content)."""
+    return CompiledTemplate(text)
+
+
+def render_file(template_path: Path, values: Dict) -> Tuple[str, List[str]]:
+    """Renders a template file. Returns (text, variables without a value)."""
+    compiled = load_template(template_path)
+    return compiled.render(values), compiled.missing(values)
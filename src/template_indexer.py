@@ -0,0 +1,170 @@
+"""
+template_indexer.py
+Builds the template variable indexes (template_var_indexes/<template>.json) in-process.
+
+All templates are scanned in one pass. An index is rebuilt only when its template's
+content hash differs from the one recorded in template_var_indexes/_hashes.json, so a
+git checkout that only touches mtimes does not trigger re-indexing. When an index is
+rebuilt, the classification of variables already known (from any index) is kept, and
+new variables are classified by naming rules.
+
+Usage:
+    python -m src.template_indexer [--force]
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src import template_engine
+
+TEMPLATE_DIR = Path("templates")
+TEMPLATE_VAR_INDEX_DIR = Path("template_var_indexes")
+HASHES_FILENAME = "_hashes.json"
+DOLLAR_PLACEHOLDER_PATTERN = re.compile(r"\$\s*{{\s*([a-zA-Z0-9_]+)\s*}}")
+
+# Variables computed by proposal_pipeline.apply_calculated_fields
+CALCULATED_VARIABLES = {
+    "proposal_date", "contract_date", "advertising_start_date", "auction_end_date", "closing_date",
+    "marketing_total_cost", "total_due_at_contract", "document_created_date",
+}
+# Business terms (fees, percentages, deadlines) are asked of the user rather than extracted from documents
+USER_VARIABLES = {"retainer", "buyers_premium_percentage"}
+USER_VARIABLE_PREFIXES = ("marketing_",)
+USER_VARIABLE_SUFFIXES = ("_percentage", "_fee", "_amount", "_date")
+CURRENCY_SUFFIXES = ("_cost", "_price", "_fee", "_amount")
+CURRENCY_VARIABLES = {"retainer", "total_due_at_contract"}
+NON_CURRENCY_SUFFIXES = ("_description",) # Free text, even when the template writes a $ before it
+
+
+def get_template_var_index_path(template_filename: str, index_dir: Path = TEMPLATE_VAR_INDEX_DIR) -> Path:
+    # Remove .txt extension if present
+    if template_filename.endswith('.txt'):
+        return index_dir / (template_filename[:-4] + '.json')
+    return index_dir / (template_filename + '.json')
+
+
+def template_content_hash(template_path: Path) -> str:
+    """SHA-256 of the template text with line endings normalized (checkouts may convert them)."""
+    with open(template_path, "rb") as f:
+        return hashlib.sha256(f.read().replace(b"\r\n", b"\n")).hexdigest()
+
+
+def load_hashes(index_dir: Path = TEMPLATE_VAR_INDEX_DIR) -> Dict[str, str]:
+    try:
+        with open(index_dir / HASHES_FILENAME, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _write_json(path: Path, data):
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(data, indent=2) + "\n")
+    os.replace(tmp_path, path)
+
+
+def infer_variable(name: str, dollar_prefixed: bool = False) -> Dict:
+    """
+    Classifies a variable that no existing index knows about, from its name
+    (and whether the template writes a $ right before it).
+    """
+    if name in CALCULATED_VARIABLES:
+        source = "calculated"
+    elif name in USER_VARIABLES or name.startswith(USER_VARIABLE_PREFIXES) or name.endswith(USER_VARIABLE_SUFFIXES):
+        source = "user"
+    else:
+        source = "extracted"
+    return {
+        "name": name,
+        "source": source,
+        "is_currency": not name.endswith(NON_CURRENCY_SUFFIXES) and (
+            dollar_prefixed or name in CURRENCY_VARIABLES or name.endswith(CURRENCY_SUFFIXES)
+        ),
+        "is_date": name.endswith("_date"),
+    }
+
+
+def _known_variables(index_dir: Path) -> Dict[str, Dict]:
+    """Collects the variable entries of every existing index, so manual classifications are preserved."""
+    known: Dict[str, Dict] = {}
+    for index_path in sorted(index_dir.glob("*.json")):
+        if index_path.name == HASHES_FILENAME:
+            continue
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        for entry in entries:
+            known.setdefault(entry["name"], entry)
+    return known
+
+
+def build_index(template_path: Path, known: Optional[Dict[str, Dict]] = None) -> List[Dict]:
+    """Returns the variable index for a template, in order of first appearance."""
+    known = known or {}
+    variables = template_engine.load_template(template_path).variables
+    dollar_prefixed = set(DOLLAR_PLACEHOLDER_PATTERN.findall(Path(template_path).read_text(encoding="utf-8")))
+    return [dict(known[name]) if name in known else infer_variable(name, name in dollar_prefixed) for name in variables]
+
+
+def has_template_changed(template_path: Path, template_var_index_path: Path) -> bool:
+    """True if the index is missing or was built from different template content."""
+    if not template_var_index_path.exists():
+        return True
+    recorded = load_hashes(template_var_index_path.parent).get(Path(template_path).name)
+    return recorded != template_content_hash(template_path)
+
+
+def index_templates(template_dir: Path = TEMPLATE_DIR, index_dir: Path = TEMPLATE_VAR_INDEX_DIR,
+                    force: bool = False, reclassify: bool = False) -> Dict[str, List[str]]:
+    """
+    Scans every template with placeholders and rebuilds the indexes whose template content changed
+    (every index with force). With reclassify, existing classifications are discarded and every
+    variable is classified by the naming rules. Returns {"rebuilt": [...], "unchanged": [...]} template filenames.
+    """
+    force = force or reclassify
+    index_dir.mkdir(parents=True, exist_ok=True)
+    hashes = load_hashes(index_dir)
+    known = None
+    result = {"rebuilt": [], "unchanged": []}
+    for template_path in sorted(template_dir.glob("*.txt")):
+        if not template_engine.load_template(template_path).variables:
+            continue # Included text such as the bios
+        content_hash = template_content_hash(template_path)
+        index_path = get_template_var_index_path(template_path.name, index_dir)
+        if not force and index_path.exists() and hashes.get(template_path.name) == content_hash:
+            result["unchanged"].append(template_path.name)
+            continue
+        if known is None:
+            known = {} if reclassify else _known_variables(index_dir)
+        index = build_index(template_path, known)
+        _write_json(index_path, index)
+        hashes[template_path.name] = content_hash
+        new_names = [entry["name"] for entry in index if entry["name"] not in known]
+        for entry in index:
+            known.setdefault(entry["name"], entry)
+        detail = f" (new variables: {', '.join(new_names)})" if new_names else ""
+        print(f"Indexed {len(index)} variables for {template_path.name}{detail}")
+        result["rebuilt"].append(template_path.name)
+    if result["rebuilt"]:
+        _write_json(index_dir / HASHES_FILENAME, dict(sorted(hashes.items())))
+    print(f"Template indexes: {len(result['rebuilt'])} rebuilt, {len(result['unchanged'])} unchanged.")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the template variable indexes for every template.")
+    parser.add_argument("--force", action="store_true", help="Rebuild every index even if its template is unchanged.")
+    parser.add_argument("--reclassify", action="store_true", help="Rebuild every index, classifying all variables by the naming rules (discards manual edits).")
+    args = parser.parse_args()
+    index_templates(force=args.force, reclassify=args.reclassify)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+"""
+variable_extractor.py
+LLM-based extraction of template variables from the consolidated source text.
+
+Small corpora are sent in a single prompt. Corpora larger than the token budget are
+split into budget-sized chunks (at document, then paragraph boundaries), each chunk is
+queried concurrently, and the per-chunk answers are merged with a deterministic rule:
+the most frequent non-empty value wins, ties going to the value seen in the earliest chunk.
+
+Responses are constrained by a JSON schema built from the variable list, with a value and a
+confidence per field. Fields that come back empty or below the confidence threshold are
+re-queried once with a short prompt over only the passages that mention them.
+
+With extraction_mode "retrieval", the corpus is indexed locally (see passage_index) and each
+group of related variables is extracted from only its top-ranked passages.
+
+Prompts put the static content (instructions, variable list) first and the document text last,
+so the provider's prompt cache can reuse the shared prefix across chunks and deals.
+"""
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from src import llm_cache, passage_index, telemetry
+
+DOCUMENT_SEPARATOR = "\n\n==== End of Document ====\n\n"
+EXTRACTION_MODE = "auto" # "single", "chunked", "retrieval", or "auto" (chunk only when the corpus exceeds the budget)
+EXTRACTION_CHUNK_MAX_TOKENS = 12000
+EXTRACTION_WORKERS = 4
+CHARS_PER_TOKEN = 4 # Heuristic used when tiktoken is not installed
+EMPTY_VALUES = (None, "", "null", "[Information Not Found]")
+STRUCTURED_EXTRACTION = True # JSON-schema constrained responses with per-field confidence
+CONFIDENCE_THRESHOLD = 0.7 # Fields below this confidence (or empty) are re-queried
+REQUERY_EXCERPT_TOKENS = 3000 # Budget for the passages sent with the follow-up prompt
+EXTRACTION_SYSTEM_PROMPT = "You are an expert at reading real estate documents."
+FIELD_INSTRUCTIONS = (
+    "For every variable return an object with \"value\" (the value as stated in the documents, or null if it is not stated; "
+    "do not guess) and \"confidence\" (a number from 0 to 1: how certain you are that the value is correct and stated in the documents)."
+)
+# Name parts too generic to locate a field's passages
+GENERIC_NAME_TOKENS = {"name", "client", "date", "description", "percentage", "cost", "fee", "amount", "the"}
+RETRIEVAL_PASSAGE_TOKENS = 250 # Size of the indexed passages
+RETRIEVAL_MAX_TOKENS = 1500 # Passages sent per variable group
+# Words that locate a variable group's passages, beyond the variable names themselves
+QUERY_SYNONYMS = {
+    "owner": ["owner", "owners", "etux", "vir", "grantee", "mailing", "address", "company", "llc", "trust", "city", "state", "zip"],
+    "description": ["property", "acres", "acreage", "residence", "house", "home", "bedrooms", "bathrooms", "barn", "land",
+                    "improvements", "features", "inventory", "furniture", "equipment", "tools", "items"],
+    "escrow": ["escrow", "title", "closing", "attorney", "agent"],
+    "auction": ["auction", "site", "location", "onsite", "online", "held"],
+}
+
+@lru_cache(maxsize=None)
+def _get_encoding():
+    """Loads the tiktoken encoding on first use (it may download its BPE tables); None when unavailable."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception: # tiktoken is optional
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimates the token count of text locally (tiktoken if installed, else ~4 chars per token)."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _split_oversized(text: str, max_tokens: int) -> List[str]:
+    """Splits a single block that exceeds the budget at paragraph, then line, then character boundaries."""
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+    for separator in ("\n\n", "\n"):
+        parts = text.split(separator)
+        if len(parts) > 1:
+            return _pack(parts, max_tokens, separator)
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    return [text[i:i + max_chars] for i in range(0, len(text), max_chars)]
+
+
+def _pack(parts: List[str], max_tokens: int, separator: str) -> List[str]:
+    """Greedily packs consecutive parts into chunks that fit the token budget."""
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    separator_tokens = estimate_tokens(separator)
+    for part in parts:
+        part_tokens = estimate_tokens(part)
+        if part_tokens > max_tokens:
+            if current:
+                chunks.append(separator.join(current))
+                current, current_tokens = [], 0
+            chunks.extend(_split_oversized(part, max_tokens))
+            continue
+        if current and current_tokens + separator_tokens + part_tokens > max_tokens:
+            chunks.append(separator.join(current))
+            current, current_tokens = [], 0
+        current.append(part)
+        current_tokens += part_tokens + (separator_tokens if len(current) > 1 else 0)
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+
+def split_into_chunks(text: str, max_tokens: int) -> List[str]:
+    """Splits the consolidated corpus into chunks of at most max_tokens, keeping documents together where possible."""
+    return _pack(text.split(DOCUMENT_SEPARATOR), max_tokens, DOCUMENT_SEPARATOR)
+
+
+def _parse_json_object(response: str) -> Optional[Dict]:
+    json_start = response.find('{')
+    json_end = response.rfind('}') + 1
+    return json.loads(response[json_start:json_end])
+
+
+def extract_from_text(llm, doc_text: str, extract_vars: List[str]) -> Dict:
+    """Runs one extraction prompt over doc_text. Returns {variable: value} (empty on failure)."""
+    system_prompt = (
+        "You are an expert at reading real estate documents. Given the following document, extract values for these variables: "
+        f"{extract_vars}. Return your answer as a JSON object mapping variable names to values. If a variable is not present, use null or ''."
+    )
+    # Static prefix first, document last, so the provider can cache the prefix across deals
+    user_prompt = f"Extract these variables: {extract_vars}\nReturn as JSON.\n\nDocument:\n{doc_text}"
+    try:
+        response, _ = llm._call_openai_api(system_prompt, user_prompt, llm.config.get("openai_model", "gpt-4o"))
+        if response:
+            try:
+                return _parse_json_object(response)
+            except Exception:
+                print("Warning: Could not parse JSON from LLM response.\nResponse was:\n", response)
+        return {}
+    except llm_cache.LLMCacheMiss:
+        raise
+    except Exception as e:
+        print(f"Error during LLM extraction: {e}")
+        return {}
+
+
+def _is_empty(value) -> bool:
+    return value in EMPTY_VALUES or (isinstance(value, str) and not value.strip())
+
+
+def build_response_format(variable_names: List[str]) -> Dict:
+    """Returns the response_format constraining the reply to {variable: {"value", "confidence"}} for each variable."""
+    field_schema = {
+        "type": "object",
+        "properties": {
+            "value": {"type": ["string", "null"]},
+            "confidence": {"type": "number"},
+        },
+        "required": ["value", "confidence"],
+        "additionalProperties": False,
+    }
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "template_variables",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {name: field_schema for name in variable_names},
+                "required": list(variable_names),
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+def parse_fields(response: str, variable_names: List[str]) -> Dict[str, Dict]:
+    """
+    Parses a structured response into {variable: {"value", "confidence"}}. Plain {variable: value}
+    answers (from models without schema support) are accepted with full confidence for non-empty values.
+    Variables absent from the response are returned empty, so they are re-queried.
+    """
+    try:
+        data = json.loads(response)
+    except (TypeError, json.JSONDecodeError):
+        try:
+            data = _parse_json_object(response or "")
+        except json.JSONDecodeError:
+            print("Warning: Could not parse JSON from LLM response.\nResponse was:\n", response)
+            data = {}
+    if not isinstance(data, dict):
+        data = {}
+    fields = {}
+    for name in variable_names:
+        item = data.get(name)
+        if isinstance(item, dict):
+            value, confidence = item.get("value"), item.get("confidence", 0.0)
+        else:
+            value, confidence = item, 1.0
+        if _is_empty(value):
+            value, confidence = None, 0.0
+        try:
+            confidence = min(1.0, max(0.0, float(confidence)))
+        except (TypeError, ValueError):
+            confidence = 0.0
+        fields[name] = {"value": value, "confidence": confidence}
+    return fields
+
+
+def build_user_prompt(doc_text: str, extract_vars: List[str], instructions: str = "") -> str:
+    """
+    Builds the extraction prompt as a byte-stable prefix (instructions, then the variable list)
+    followed by the deal's document text, so repeated calls share a cacheable prompt prefix.
+    """
+    prefix = f"{instructions}\n\n" if instructions else ""
+    return f"{prefix}{FIELD_INSTRUCTIONS}\n\nExtract these variables: {extract_vars}\n\nDocument:\n{doc_text}"
+
+
+def extract_fields_from_text(llm, doc_text: str, extract_vars: List[str], system_prompt: str = EXTRACTION_SYSTEM_PROMPT,
+                             instructions: str = "") -> Dict[str, Dict]:
+    """Runs one schema-constrained extraction over doc_text. Returns {variable: {"value", "confidence"}}."""
+    user_prompt = build_user_prompt(doc_text, extract_vars, instructions)
+    response = None
+    try:
+        response, _ = llm._call_openai_api(
+            system_prompt, user_prompt, llm.config.get("openai_model", "gpt-4o"),
+            response_format=build_response_format(extract_vars)
+        )
+    except llm_cache.LLMCacheMiss:
+        raise
+    except Exception as e:
+        print(f"Error during LLM extraction: {e}")
+    return parse_fields(response, extract_vars) if response else parse_fields("{}", extract_vars)
+
+
+def fields_to_requery(fields: Dict[str, Dict], variable_names: List[str], threshold: float = CONFIDENCE_THRESHOLD) -> List[str]:
+    """Returns the variables that are missing or below the confidence threshold."""
+    return [
+        name for name in variable_names
+        if name not in fields or fields[name]["value"] is None or fields[name]["confidence"] < threshold
+    ]
+
+
+def select_excerpt(doc_text: str, variable_names: List[str], max_tokens: int = REQUERY_EXCERPT_TOKENS) -> str:
+    """
+    Picks the paragraphs that mention the variables' name keywords, best matches first, up to
+    max_tokens, and returns them in document order.
+    """
+    keywords = {
+        token for name in variable_names for token in name.lower().split("_")
+        if len(token) > 2 and token not in GENERIC_NAME_TOKENS
+    }
+    if not keywords:
+        return ""
+    pattern = re.compile(r"\b(" + "|".join(sorted(map(re.escape, keywords))) + r")", re.IGNORECASE)
+    paragraphs = [p for p in re.split(r"\n\s*\n", doc_text) if p.strip()]
+    scored = [(len(pattern.findall(p)), index) for index, p in enumerate(paragraphs)]
+    selected = []
+    budget = max_tokens
+    for score, index in sorted(scored, key=lambda item: (-item[0], item[1])):
+        if score == 0 or budget <= 0:
+            break
+        paragraph = paragraphs[index]
+        tokens = estimate_tokens(paragraph)
+        if tokens > budget:
+            paragraph = paragraph[:budget * CHARS_PER_TOKEN]
+            tokens = budget
+        selected.append((index, paragraph))
+        budget -= tokens
+    return "\n\n".join(paragraph for _, paragraph in sorted(selected))
+
+
+def requery_low_confidence(llm, doc_text: str, fields: Dict[str, Dict], variable_names: List[str], config: Optional[Dict] = None,
+                           system_prompt: str = EXTRACTION_SYSTEM_PROMPT, instructions: str = "") -> Dict[str, Dict]:
+    """
+    Re-queries missing and low-confidence fields once, with a follow-up prompt over only the
+    passages that mention them. A new answer replaces the old one if it is at least as confident.
+    """
+    config = config or {}
+    threshold = float(config.get("extraction_confidence_threshold", CONFIDENCE_THRESHOLD))
+    targets = fields_to_requery(fields, variable_names, threshold)
+    if not targets:
+        return fields
+    excerpt = select_excerpt(doc_text, targets, int(config.get("requery_excerpt_tokens", REQUERY_EXCERPT_TOKENS)))
+    if not excerpt:
+        print(f"No passages mention the {len(targets)} missing or low-confidence fields; skipping the follow-up query.")
+        return fields
+    print(f"Re-querying {len(targets)} missing or low-confidence fields with a ~{estimate_tokens(excerpt)}-token excerpt: {', '.join(targets)}")
+    retried = extract_fields_from_text(llm, excerpt, targets, system_prompt, instructions)
+    merged = dict(fields)
+    for name in targets:
+        new, old = retried[name], fields.get(name)
+        if new["value"] is not None and (old is None or old["value"] is None or new["confidence"] >= old["confidence"]):
+            merged[name] = new
+    return merged
+
+
+def merge_chunk_fields(chunk_fields: List[Dict[str, Dict]], extract_vars: List[str]) -> Dict[str, Dict]:
+    """Merges per-chunk structured answers with merge_chunk_results; a field's confidence is the best among agreeing chunks."""
+    values = merge_chunk_results([{n: f["value"] for n, f in fields.items()} for fields in chunk_fields], extract_vars)
+    merged = {}
+    for name in extract_vars:
+        value = values.get(name)
+        if value is None:
+            merged[name] = {"value": None, "confidence": 0.0}
+            continue
+        key = _normalize_value(value)
+        confidence = max(
+            fields[name]["confidence"] for fields in chunk_fields
+            if fields.get(name, {}).get("value") is not None and _normalize_value(fields[name]["value"]) == key
+        )
+        merged[name] = {"value": value, "confidence": confidence}
+    return merged
+
+
+def _normalize_value(value) -> str:
+    return re.sub(r"\s+", " ", str(value)).strip().casefold()
+
+
+def merge_chunk_results(chunk_results: List[Dict], extract_vars: List[str]) -> Dict:
+    """
+    Merges per-chunk answers. For each variable the most frequent non-empty value
+    (compared case- and whitespace-insensitively) wins; ties go to the earliest chunk.
+    """
+    merged = {}
+    for name in extract_vars:
+        counts: Dict[str, int] = {}
+        first_seen: Dict[str, int] = {}
+        original: Dict[str, object] = {}
+        for chunk_index, result in enumerate(chunk_results):
+            if not isinstance(result, dict):
+                continue
+            value = result.get(name)
+            if _is_empty(value):
+                continue
+            key = _normalize_value(value)
+            counts[key] = counts.get(key, 0) + 1
+            if key not in first_seen:
+                first_seen[key] = chunk_index
+                original[key] = value
+        if counts:
+            best = min(counts, key=lambda k: (-counts[k], first_seen[k]))
+            merged[name] = original[best]
+            if len(counts) > 1:
+                print(f"  Resolved conflicting values for '{name}' ({len(counts)} candidates) -> chunk {first_seen[best] + 1}")
+    return merged
+
+
+def group_variables(variable_names: List[str]) -> Dict[str, List[str]]:
+    """Groups related variables that are usually found in the same passages (owner/client fields, descriptions, ...)."""
+    groups: Dict[str, List[str]] = {}
+    for name in variable_names:
+        if name.startswith(("owner_", "client_")):
+            key = "owner"
+        elif name.endswith("_description"):
+            key = "description"
+        else:
+            key = name.split("_")[0]
+        groups.setdefault(key, []).append(name)
+    return groups
+
+
+def group_query(group: str, variable_names: List[str]) -> List[str]:
+    terms = [token for name in variable_names for token in name.split("_") if token not in GENERIC_NAME_TOKENS]
+    return list(dict.fromkeys(terms + QUERY_SYNONYMS.get(group, [])))
+
+
+def retrieve_excerpt(index: passage_index.PassageIndex, terms: List[str], max_tokens: int = RETRIEVAL_MAX_TOKENS) -> str:
+    """
+    Returns the best-ranked passages for the query terms, up to max_tokens, in corpus order.
+    If nothing matches, the opening passages are used (owner and property details usually come first).
+    """
+    ranked = [passage for passage, _ in index.search(terms)] or list(range(len(index.passages)))
+    selected = []
+    budget = max_tokens
+    for passage in ranked:
+        tokens = estimate_tokens(index.passages[passage])
+        if tokens > budget:
+            if selected:
+                continue
+            selected.append((passage, index.passages[passage][:budget * CHARS_PER_TOKEN]))
+            break
+        selected.append((passage, index.passages[passage]))
+        budget -= tokens
+    return "\n\n".join(text for _, text in sorted(selected))
+
+
+def extract_with_retrieval(llm, doc_text: str, extract_vars: List[str], extract, config: Optional[Dict] = None):
+    """Extracts each variable group from only its top-ranked passages, querying the groups concurrently."""
+    config = config or {}
+    passage_chars = int(config.get("retrieval_passage_tokens", RETRIEVAL_PASSAGE_TOKENS)) * CHARS_PER_TOKEN
+    max_tokens = int(config.get("retrieval_max_tokens", RETRIEVAL_MAX_TOKENS))
+    with telemetry.span("passage_index") as span:
+        index = passage_index.PassageIndex(passage_index.split_passages(doc_text, passage_chars, DOCUMENT_SEPARATOR))
+        span.set(passages=len(index.passages))
+    groups = list(group_variables(extract_vars).items())
+    excerpts = [retrieve_excerpt(index, group_query(group, names), max_tokens) for group, names in groups]
+    sent_tokens = sum(estimate_tokens(excerpt) for excerpt in excerpts)
+    print(f"Retrieval: {len(index.passages)} passages indexed; {len(groups)} variable groups get ~{sent_tokens} tokens "
+          f"of passages in total instead of ~{estimate_tokens(doc_text)} tokens each.")
+    workers = max(1, min(int(config.get("extraction_workers", EXTRACTION_WORKERS)), len(groups)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(
+            telemetry.wrap(lambda item: extract(llm, item[1], item[0][1])), zip(groups, excerpts)
+        ))
+    merged = {}
+    for result in results:
+        merged.update(result)
+    return merged
+
+
+def extract_variables(llm, doc_text: str, variable_index: List[Dict], config: Optional[Dict] = None) -> Dict:
+    """
+    Extracts all 'extracted' variables of the template index from doc_text,
+    switching to chunked map-reduce extraction when the corpus exceeds the token budget
+    (or, in "retrieval" mode, sending each variable group only its top-ranked passages).
+    With structured extraction, missing and low-confidence fields are then re-queried once.
+    """
+    config = config or {}
+    extract_vars = [v['name'] for v in variable_index if v['source'] == 'extracted']
+    if not extract_vars:
+        return {}
+
+    structured = bool(config.get("structured_extraction", STRUCTURED_EXTRACTION))
+    extract = extract_fields_from_text if structured else extract_from_text
+    mode = config.get("extraction_mode", EXTRACTION_MODE)
+    max_tokens = int(config.get("extraction_chunk_max_tokens", EXTRACTION_CHUNK_MAX_TOKENS))
+    corpus_tokens = estimate_tokens(doc_text)
+    if mode == "retrieval":
+        result = extract_with_retrieval(llm, doc_text, extract_vars, extract, config)
+    elif mode == "single" or (mode == "auto" and corpus_tokens <= max_tokens):
+        result = extract(llm, doc_text, extract_vars)
+    else:
+        chunks = split_into_chunks(doc_text, max_tokens)
+        workers = max(1, min(int(config.get("extraction_workers", EXTRACTION_WORKERS)), len(chunks)))
+        print(f"Corpus is ~{corpus_tokens} tokens; extracting variables from {len(chunks)} chunks of <= {max_tokens} tokens with {workers} workers...")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # map() keeps chunk order, which the merge rule relies on for tie-breaking
+            chunk_results = list(executor.map(telemetry.wrap(lambda chunk: extract(llm, chunk, extract_vars)), chunks))
+        result = (merge_chunk_fields if structured else merge_chunk_results)(chunk_results, extract_vars)
+    if not structured:
+        return result
+
+    fields = requery_low_confidence(llm, doc_text, result, extract_vars, config)
+    return {name: field["value"] for name, field in fields.items() if field["value"] is not None}